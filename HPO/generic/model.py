@@ -9,6 +9,9 @@ from nni.retiarii.evaluator.pytorch.lightning import DataLoader
 from nni.retiarii.strategy import DARTS as DartsStrategy
 
 import torch
+import os
+import json
+import hashlib
 
 # import sys to import from different directory
 import sys
@@ -44,12 +47,29 @@ print(params)
 resolution = 64
 noise_type = 'gaussian'
 noise_level = '0.09'
-phantom =       np.load(f'/home/joe/nas-for-dip/phantoms/ground_truth/{resolution}/{45}.npy')
-phantom_noisy = np.load(f'/home/joe/nas-for-dip/phantoms/{noise_type}/res_{resolution}/nl_{noise_level}/p_{45}.npy')
+phantom_id = 45
+phantom =       np.load(f'/home/joe/nas-for-dip/phantoms/ground_truth/{resolution}/{phantom_id}.npy')
+phantom_noisy = np.load(f'/home/joe/nas-for-dip/phantoms/{noise_type}/res_{resolution}/nl_{noise_level}/p_{phantom_id}.npy')
 
 show_every = 1000
 report_every = 250
 
+# 25000 iterations per trial, checkpoint so a preempted trial of the same parameters and image picks up where it stopped
+# one directory per experiment next to this script, SGLDES removes the checkpoint once the trial completes
+checkpoint_key = json.dumps({
+    'params': params,
+    'phantom': phantom_id,
+    'resolution': resolution,
+    'noise_type': noise_type,
+    'noise_level': noise_level,
+}, sort_keys=True)
+checkpoint_dir = os.path.join(
+    os.path.dirname(os.path.abspath(__file__)),
+    'checkpoints',
+    nni.get_experiment_id(),
+    f"generic_{hashlib.sha1(checkpoint_key.encode()).hexdigest()[:12]}",
+)
+
 # Create the lightning module
 module = SGLDES(
                 phantom=phantom, 
@@ -65,7 +85,9 @@ module = SGLDES(
                 HPO=True,
                 NAS=True,
                 OneShot=True,
-                SGLD_regularize=False
+                SGLD_regularize=False,
+                checkpoint_dir=checkpoint_dir,
+                checkpoint_every=1000
                 )
 
 # Create a PyTorch Lightning trainer
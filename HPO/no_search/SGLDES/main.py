@@ -1,8 +1,13 @@
 
-from nni.experiment import Experiment
+import os
+from nni.experiment import Experiment, CustomAlgorithmConfig
 import torch
 torch.cuda.empty_cache()
 
+REPO_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..', '..'))
+# intermediate results of a full trial: max_iterations / report_every of model.py
+MAX_STEP = 1500 // 25
+
 search_space = {
     'learning_rate': {'_type': 'uniform', '_value': [0.01, 0.15]},
     'buffer_size': {'_type': 'choice', '_value': [300, 400, 500, 600, 700, 800, 900]},
@@ -12,7 +17,10 @@ search_space = {
 
 experiment = Experiment('local')
 
-experiment.config.trial_command = 'python model.py'
+TRIAL_CONCURRENCY = 6
+
+# each trial gets its own share of the cores (threads and affinity), see search_eval/utils/trial_launcher.py
+experiment.config.trial_command = f'python {REPO_ROOT}/search_eval/utils/trial_launcher.py --slots {TRIAL_CONCURRENCY} -- python model.py'
 experiment.config.trial_code_directory = '.'
 experiment.config.search_space = search_space
 
@@ -20,11 +28,20 @@ experiment.config.tuner.name = 'TPE'
 experiment.config.tuner.class_args['optimize_mode'] = 'maximize'
 
 # experiment.config.max_trial_number = 10
-experiment.config.trial_concurrency = 6
-experiment.config.assessor.name = 'Medianstop'
-experiment.config.assessor.class_args = {
-            'start_step': 20
-}
+experiment.config.trial_concurrency = TRIAL_CONCURRENCY
+# experiment.config.assessor.name = 'Medianstop'
+# experiment.config.assessor.class_args = {
+#             'start_step': 20
+# }
+# fits the rise-peak-decay of the PSNR curves and stops the trials that can't beat the best peak
+experiment.config.assessor = CustomAlgorithmConfig(
+    class_name='search_eval.assessor.DIPCurveAssessor',
+    code_directory=REPO_ROOT,
+    class_args={
+            'start_step': 20,
+            'max_step': MAX_STEP,
+    },
+)
 experiment.config.tuner.class_args = {
             'optimize_mode': 'maximize',
             # 'start_step': 5
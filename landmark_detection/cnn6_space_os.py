@@ -1,10 +1,15 @@
-from collections import OrderedDict
+import os
+import sys
 import torch
 import nni.retiarii.nn.pytorch as nn
 from nni import trace
 from nni.retiarii import model_wrapper
 from nni.retiarii.nn.pytorch import Cell
 
+# the candidate op registry lives in the search_space package at the repo root
+sys.path.insert(1, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from search_space.lazy_ops import LazyOps
+
 @trace
 def conv_2d(C_in, C_out, kernel_size=3, dilation=1, padding=1, activation=None):
     return nn.Sequential(
@@ -41,13 +46,13 @@ def attention_channel(channel, reduction=16):
 
 def pools():
     # these are your pooling layer choices
-    pool_dict = OrderedDict([
-        ("MaxPool2d", nn.MaxPool2d(kernel_size=2, stride=2, padding=0)),
-        ("AvgPool2d", nn.AvgPool2d(kernel_size=2, stride=2, padding=0)),
-        # ("MaxPool2d_3x3", nn.MaxPool2d(kernel_size=3, stride=2, padding=1)),
-        # ("AvgPool2d_3x3", nn.AvgPool2d(kernel_size=3, stride=2, padding=1)),
-        # ("MaxPool2d_5x5", nn.MaxPool2d(kernel_size=5, stride=2, padding=2)),
-        # ("AvgPool2d_5x5", nn.AvgPool2d(kernel_size=5, stride=2, padding=2)),
+    pool_dict = LazyOps([
+        ("MaxPool2d", lambda: nn.MaxPool2d(kernel_size=2, stride=2, padding=0)),
+        ("AvgPool2d", lambda: nn.AvgPool2d(kernel_size=2, stride=2, padding=0)),
+        # ("MaxPool2d_3x3", lambda: nn.MaxPool2d(kernel_size=3, stride=2, padding=1)),
+        # ("AvgPool2d_3x3", lambda: nn.AvgPool2d(kernel_size=3, stride=2, padding=1)),
+        # ("MaxPool2d_5x5", lambda: nn.MaxPool2d(kernel_size=5, stride=2, padding=2)),
+        # ("AvgPool2d_5x5", lambda: nn.AvgPool2d(kernel_size=5, stride=2, padding=2)),
     ])
     return pool_dict
 
@@ -57,41 +62,41 @@ def convs(C_in, C_out):
 
     # all padding should follow this formula:
     # pd = (ks - 1) * dl // 2
-    conv_dict = OrderedDict([
-        # ("Identity", nn.Identity()),
-
-        ("conv2d_1x1_Relu", conv_2d(C_in, C_out, kernel_size=1, padding=0)),
-        # ("conv2d_1x1_SiLU", conv_2d(C_in, C_out, kernel_size=1, padding=0, activation=nn.SiLU())),
-        # ("conv2d_1x1_Sigmoid", conv_2d(C_in, C_out, kernel_size=1, padding=0, activation=nn.Sigmoid())),
-
-        ("conv2d_3x3_Relu", conv_2d(C_in, C_out, kernel_size=3, padding=1)),
-        # ("conv2d_3x3_SiLU", conv_2d(C_in, C_out, kernel_size=3, padding=1, activation=nn.SiLU())),
-        # ("conv2d_3x3_Sigmoid", conv_2d(C_in, C_out, kernel_size=3, padding=1, activation=nn.Sigmoid())),
-        # ("conv2d_3x3_Relu_1dil", conv_2d(C_in, C_out, kernel_size=3, padding=2, dilation=2)),
-
-        ("conv2d_5x5_Relu", conv_2d(C_in, C_out, kernel_size=5, padding=2)),
-        # ("conv2d_5x5_SiLU", conv_2d(C_in, C_out, kernel_size=5, padding=2, activation=nn.SiLU())),
-        # ("conv2d_5x5_Sigmoid", conv_2d(C_in, C_out, kernel_size=5, padding=2, activation=nn.Sigmoid())),
-        # ("conv2d_5x5_Relu_1dil", conv_2d(C_in, C_out, kernel_size=5, padding=4, dilation=2, activation=nn.SiLU())),
-
-        ("conv2d_7x7_Relu", conv_2d(C_in, C_out, kernel_size=7, padding=3)),
-        # ("conv2d_7x7_SiLU", conv_2d(C_in, C_out, kernel_size=7, padding=3, activation=nn.SiLU())),
-        # ("conv2d_7x7_Sigmoid", conv_2d(C_in, C_out, kernel_size=7, padding=3, activation=nn.Sigmoid())),
-        # ("conv2d_7x7_Relu_1dil", conv_2d(C_in, C_out, kernel_size=7, padding=6, dilation=2, activation=nn.SiLU())),
-
-        ("convDS_1x1_Relu", depthwise_separable_conv(C_in, C_out)),
-        # ("convDS_1x1_SiLU", depthwise_separable_conv(C_in, C_out, activation=nn.SiLU())),
-        # ("convDS_1x1_Sigmoid", depthwise_separable_conv(C_in, C_out, activation=nn.Sigmoid())),
-
-        ("convDS_3x3_Relu", depthwise_separable_conv(C_in, C_out, kernel_size=3, padding=1)),
-        # ("convDS_3x3_SiLU", depthwise_separable_conv(C_in, C_out, kernel_size=3, padding=1, activation=nn.SiLU())),
-        # ("convDS_3x3_Sigmoid", depthwise_separable_conv(C_in, C_out, kernel_size=3, padding=1, activation=nn.Sigmoid())),
-        # ("convDS_3x3_Relu_1dil", depthwise_separable_conv(C_in, C_out, kernel_size=3, padding=2, dilation=2)),
-
-        ("convDS_5x5_Relu", depthwise_separable_conv(C_in, C_out, kernel_size=5, padding=2)),
-        # ("convDS_5x5_SiLU", depthwise_separable_conv(C_in, C_out, kernel_size=5, padding=2, activation=nn.SiLU())),
-        # ("convDS_5x5_Sigmoid", depthwise_separable_conv(C_in, C_out, kernel_size=5, padding=2, activation=nn.Sigmoid())),
-        # ("convDS_5x5_Relu_1dil", depthwise_separable_conv(C_in, C_out, kernel_size=5, padding=4, dilation=2, activation=nn.SiLU())),
+    conv_dict = LazyOps([
+        # ("Identity", lambda: nn.Identity()),
+
+        ("conv2d_1x1_Relu", lambda: conv_2d(C_in, C_out, kernel_size=1, padding=0)),
+        # ("conv2d_1x1_SiLU", lambda: conv_2d(C_in, C_out, kernel_size=1, padding=0, activation=nn.SiLU())),
+        # ("conv2d_1x1_Sigmoid", lambda: conv_2d(C_in, C_out, kernel_size=1, padding=0, activation=nn.Sigmoid())),
+
+        ("conv2d_3x3_Relu", lambda: conv_2d(C_in, C_out, kernel_size=3, padding=1)),
+        # ("conv2d_3x3_SiLU", lambda: conv_2d(C_in, C_out, kernel_size=3, padding=1, activation=nn.SiLU())),
+        # ("conv2d_3x3_Sigmoid", lambda: conv_2d(C_in, C_out, kernel_size=3, padding=1, activation=nn.Sigmoid())),
+        # ("conv2d_3x3_Relu_1dil", lambda: conv_2d(C_in, C_out, kernel_size=3, padding=2, dilation=2)),
+
+        ("conv2d_5x5_Relu", lambda: conv_2d(C_in, C_out, kernel_size=5, padding=2)),
+        # ("conv2d_5x5_SiLU", lambda: conv_2d(C_in, C_out, kernel_size=5, padding=2, activation=nn.SiLU())),
+        # ("conv2d_5x5_Sigmoid", lambda: conv_2d(C_in, C_out, kernel_size=5, padding=2, activation=nn.Sigmoid())),
+        # ("conv2d_5x5_Relu_1dil", lambda: conv_2d(C_in, C_out, kernel_size=5, padding=4, dilation=2, activation=nn.SiLU())),
+
+        ("conv2d_7x7_Relu", lambda: conv_2d(C_in, C_out, kernel_size=7, padding=3)),
+        # ("conv2d_7x7_SiLU", lambda: conv_2d(C_in, C_out, kernel_size=7, padding=3, activation=nn.SiLU())),
+        # ("conv2d_7x7_Sigmoid", lambda: conv_2d(C_in, C_out, kernel_size=7, padding=3, activation=nn.Sigmoid())),
+        # ("conv2d_7x7_Relu_1dil", lambda: conv_2d(C_in, C_out, kernel_size=7, padding=6, dilation=2, activation=nn.SiLU())),
+
+        ("convDS_1x1_Relu", lambda: depthwise_separable_conv(C_in, C_out)),
+        # ("convDS_1x1_SiLU", lambda: depthwise_separable_conv(C_in, C_out, activation=nn.SiLU())),
+        # ("convDS_1x1_Sigmoid", lambda: depthwise_separable_conv(C_in, C_out, activation=nn.Sigmoid())),
+
+        ("convDS_3x3_Relu", lambda: depthwise_separable_conv(C_in, C_out, kernel_size=3, padding=1)),
+        # ("convDS_3x3_SiLU", lambda: depthwise_separable_conv(C_in, C_out, kernel_size=3, padding=1, activation=nn.SiLU())),
+        # ("convDS_3x3_Sigmoid", lambda: depthwise_separable_conv(C_in, C_out, kernel_size=3, padding=1, activation=nn.Sigmoid())),
+        # ("convDS_3x3_Relu_1dil", lambda: depthwise_separable_conv(C_in, C_out, kernel_size=3, padding=2, dilation=2)),
+
+        ("convDS_5x5_Relu", lambda: depthwise_separable_conv(C_in, C_out, kernel_size=5, padding=2)),
+        # ("convDS_5x5_SiLU", lambda: depthwise_separable_conv(C_in, C_out, kernel_size=5, padding=2, activation=nn.SiLU())),
+        # ("convDS_5x5_Sigmoid", lambda: depthwise_separable_conv(C_in, C_out, kernel_size=5, padding=2, activation=nn.Sigmoid())),
+        # ("convDS_5x5_Relu_1dil", lambda: depthwise_separable_conv(C_in, C_out, kernel_size=5, padding=4, dilation=2, activation=nn.SiLU())),
     ])
     return conv_dict
 
@@ -143,7 +148,7 @@ class CNN_Space_OS(nn.Module):
             # here is the cell documentation: https://nni.readthedocs.io/en/stable/reference/nas/search_space.html#cell
             conv_candidates = convs(in_channels, in_channels)
             self.convs.append(Cell(
-                    op_candidates=conv_candidates, 
+                    op_candidates=conv_candidates.build(), 
                     num_nodes=self.nodes, 
                     num_ops_per_node=1,
                     num_predecessors=1,
@@ -1,5 +1,9 @@
 import cnn6
 import CERDataset
+import os
+import sys
+sys.path.insert(1, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from search_eval.utils.recorder import RecordingMixin
 
 import matplotlib.pyplot as plt
 import numpy as np
@@ -21,7 +25,7 @@ torch.backends.cudnn.benchmark =True
 dtype = torch.cuda.FloatTensor
 
 
-class EvalLandmark(LightningModule):
+class EvalLandmark(RecordingMixin, LightningModule):
     def __init__(
                  self, 
                  learning_rate=0.001,
@@ -31,8 +35,8 @@ class EvalLandmark(LightningModule):
                 ):
         super().__init__()
         self.loss = nn.MSELoss()
-        self.validation_loss_list = []
-        self.train_loss_list = []
+        # losses go to disk in chunks instead of growing lists, see record() (utils/recorder.py)
+        self.recorder = None
         self.log_every = log_every
         self.learning_rate = learning_rate
 
@@ -43,6 +47,7 @@ class EvalLandmark(LightningModule):
             self.train_loss_name = '1pretrain_train_loss.npy'
             self.validation_loss_name = '1pretrain_val_loss.npy'
             self.figure_name = '1pretrain_loss.png'
+            self.metrics_root = '1pretrain_loss_metrics'
         elif mode == 'pretrain2':
             self.landmarkdir = 'TrainingLabels1'
             self.imagedir = 'TrainingImages2'
@@ -50,6 +55,7 @@ class EvalLandmark(LightningModule):
             self.train_loss_name = '2pretrain_train_loss.npy'
             self.validation_loss_name = '2pretrain_val_loss.npy'
             self.figure_name = '2pretrain_loss.png'
+            self.metrics_root = '2pretrain_loss_metrics'
 
 
     def configure_optimizers(self) -> Optimizer:
@@ -72,8 +78,8 @@ class EvalLandmark(LightningModule):
         # Eval Loss
         self.train_loss = self.loss(pred, batch['landmarks'])
 
-        # append for plotting
-        self.train_loss_list.append(self.train_loss.item())
+        # recorded for plotting
+        self.record(train_loss=self.train_loss)
 
         # logging for lightning and nni
         self.log('train_loss', self.train_loss)
@@ -87,8 +93,8 @@ class EvalLandmark(LightningModule):
         # Eval Loss
         self.validation_loss = self.loss(pred, batch['landmarks'])
 
-        # append for plotting
-        self.validation_loss_list.append(self.validation_loss.item())
+        # recorded for plotting
+        self.record(validation_loss=self.validation_loss)
 
         # logging for lightning and nni
         self.log('validation_loss', self.validation_loss, prog_bar=False)
@@ -110,9 +116,12 @@ class EvalLandmark(LightningModule):
             'train_loss': self.train_loss.item(),
             'val_loss': self.validation_loss.item(),
             })
+        metrics = self.read_recorded()
+        train_loss = metrics['train_loss'][~np.isnan(metrics['train_loss'])]
+        validation_loss = metrics['validation_loss'][~np.isnan(metrics['validation_loss'])]
         self.plot_loss(
-            self.train_loss_list, 
-            self.validation_loss_list, 
+            train_loss, 
+            validation_loss, 
             self.train_loss_name, 
             self.validation_loss_name, 
             self.figure_name
@@ -1,5 +1,9 @@
 import cnn6
 import CERDataset
+import os
+import sys
+sys.path.insert(1, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from search_eval.utils.recorder import RecordingMixin
 
 import matplotlib.pyplot as plt
 import numpy as np
@@ -27,7 +31,7 @@ dtype = torch.cuda.FloatTensor
 ###
 
 
-class EvalLandmarkMT(LightningModule):
+class EvalLandmarkMT(RecordingMixin, LightningModule):
     def __init__(
                  self, 
                  learning_rate=0.001,
@@ -37,8 +41,8 @@ class EvalLandmarkMT(LightningModule):
                 ):
         super().__init__()
         self.loss = nn.MSELoss()
-        self.validation_loss_list = []
-        self.train_loss_list = []
+        # losses go to disk in chunks instead of growing lists, see record() (utils/recorder.py)
+        self.recorder = None
         self.log_every = log_every
         self.learning_rate = learning_rate
 
@@ -49,6 +53,7 @@ class EvalLandmarkMT(LightningModule):
             self.train_loss_name = '1pretrain_train_loss.npy'
             self.validation_loss_name = '1pretrain_val_loss.npy'
             self.figure_name = '1pretrain_loss.png'
+            self.metrics_root = '1pretrain_loss_metrics'
         elif mode == 'pretrain2':
             self.landmarkdir = 'TrainingLabels1'
             self.imagedir = 'TrainingImages2'
@@ -56,6 +61,7 @@ class EvalLandmarkMT(LightningModule):
             self.train_loss_name = '2pretrain_train_loss.npy'
             self.validation_loss_name = '2pretrain_val_loss.npy'
             self.figure_name = '2pretrain_loss.png'
+            self.metrics_root = '2pretrain_loss_metrics'
 
     def set_model(self, model_cls):
         self.model = model_cls()
@@ -80,8 +86,8 @@ class EvalLandmarkMT(LightningModule):
         # Eval Loss
         self.train_loss = self.loss(pred, batch['landmarks'])
 
-        # append for plotting
-        self.train_loss_list.append(self.train_loss.item())
+        # recorded for plotting
+        self.record(train_loss=self.train_loss)
 
         # logging for lightning and nni
         self.log('train_loss', self.train_loss)
@@ -95,8 +101,8 @@ class EvalLandmarkMT(LightningModule):
         # Eval Loss
         self.validation_loss = self.loss(pred, batch['landmarks'])
 
-        # append for plotting
-        self.validation_loss_list.append(self.validation_loss.item())
+        # recorded for plotting
+        self.record(validation_loss=self.validation_loss)
 
         # logging for lightning and nni
         self.log('validation_loss', self.validation_loss, prog_bar=False)
@@ -116,9 +122,12 @@ class EvalLandmarkMT(LightningModule):
             # 'train_loss': self.train_loss.item(),
             'val_loss': self.validation_loss.item(),
             })
+        metrics = self.read_recorded()
+        train_loss = metrics['train_loss'][~np.isnan(metrics['train_loss'])]
+        validation_loss = metrics['validation_loss'][~np.isnan(metrics['validation_loss'])]
         self.plot_loss(
-            self.train_loss_list, 
-            self.validation_loss_list, 
+            train_loss, 
+            validation_loss, 
             self.train_loss_name, 
             self.validation_loss_name, 
             self.figure_name
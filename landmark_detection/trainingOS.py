@@ -1,5 +1,9 @@
 import matplotlib.pyplot as plt
 import numpy as np
+import os
+import sys
+sys.path.insert(1, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from search_eval.utils.recorder import RecordingMixin
 
 from nni import report_intermediate_result, report_final_result
 from nni.retiarii.evaluator.pytorch import LightningModule
@@ -18,7 +22,7 @@ dtype = torch.cuda.FloatTensor
 ###
 
 
-class EvalLandmarkOS(LightningModule):
+class EvalLandmarkOS(RecordingMixin, LightningModule):
     def __init__(
                  self, 
                  learning_rate=0.001,
@@ -30,8 +34,8 @@ class EvalLandmarkOS(LightningModule):
         super().__init__()
         self.automatic_optimization = True
         self.loss = torch.nn.MSELoss().type(dtype)
-        self.validation_loss_list = []
-        self.train_loss_list = []
+        # losses go to disk in chunks instead of growing lists, see record() (utils/recorder.py)
+        self.recorder = None
         self.log_every = log_every
         self.learning_rate = learning_rate
         self.model_cls = model_cls
@@ -43,6 +47,7 @@ class EvalLandmarkOS(LightningModule):
             self.train_loss_name = '1pretrain_train_loss.npy'
             self.validation_loss_name = '1pretrain_val_loss.npy'
             self.figure_name = '1pretrain_loss.png'
+            self.metrics_root = '1pretrain_loss_metrics'
         elif mode == 'pretrain2':
             self.landmarkdir = 'TrainingLabels1'
             self.imagedir = 'TrainingImages2'
@@ -50,6 +55,7 @@ class EvalLandmarkOS(LightningModule):
             self.train_loss_name = '2pretrain_train_loss.npy'
             self.validation_loss_name = '2pretrain_val_loss.npy'
             self.figure_name = '2pretrain_loss.png'
+            self.metrics_root = '2pretrain_loss_metrics'
 
     def set_model(self, model):
         if self.model_cls is not None:
@@ -76,8 +82,8 @@ class EvalLandmarkOS(LightningModule):
         # Eval Loss
         self.train_loss = self.loss(pred, batch['landmarks'])
 
-        # append for plotting
-        self.train_loss_list.append(self.train_loss.item())
+        # recorded for plotting
+        self.record(train_loss=self.train_loss)
 
         # logging for lightning and nni
         self.log('train_loss', self.train_loss)
@@ -91,8 +97,8 @@ class EvalLandmarkOS(LightningModule):
         # Eval Loss
         self.validation_loss = self.loss(pred, batch['landmarks'])
 
-        # append for plotting
-        self.validation_loss_list.append(self.validation_loss.item())
+        # recorded for plotting
+        self.record(validation_loss=self.validation_loss)
 
         # logging for lightning and nni
         self.log('validation_loss', self.validation_loss, prog_bar=False) # this acts up if you use a jupyter notebook, if you use a python script it works fine
@@ -111,9 +117,12 @@ class EvalLandmarkOS(LightningModule):
             'train_loss': self.train_loss.item(),
             'val_loss': self.validation_loss.item(),
             })
+        metrics = self.read_recorded()
+        train_loss = metrics['train_loss'][~np.isnan(metrics['train_loss'])]
+        validation_loss = metrics['validation_loss'][~np.isnan(metrics['validation_loss'])]
         self.plot_loss(
-            self.train_loss_list, 
-            self.validation_loss_list, 
+            train_loss, 
+            validation_loss, 
             self.train_loss_name, 
             self.validation_loss_name, 
             self.figure_name
@@ -0,0 +1,268 @@
+"""
+Builds the phantom benchmark set: ground truths plus every noise type and level
+
+Each (resolution, noise type, noise level) is written as one contiguous (N, 1, H, W) .npy
+array next to an index.json, so trials open it with mmap_mode='r' and slice the phantom
+they need without copying, instead of reading thousands of small files.
+
+    out_dir/
+        index.json
+        ground_truth_res64.npy
+        gaussian_res64_nl0.09.npy
+        ...
+
+Every phantom and every noisy image gets its own seed derived from (seed, resolution, id,
+noise type, level), so the result doesn't depend on the number of workers or the order
+the pool runs the items in.
+
+usage (from the repo root):
+    python -m phantoms.build_dataset --out phantoms/dataset --num-phantoms 50 --workers 8
+"""
+
+import os
+import json
+import zlib
+import argparse
+import multiprocessing as mp
+
+import numpy as np
+import torch
+from numpy.lib.format import open_memmap
+
+try:
+    from .phantom import generate_phantom
+    from .noises import NOISE_FUNCTIONS
+except ImportError:
+    # run as a script from the phantoms folder, like generate.ipynb
+    from phantom import generate_phantom
+    from noises import NOISE_FUNCTIONS
+
+NOISE_LEVELS = [0.05, 0.09, 0.15, 0.2]
+RESOLUTIONS = [64, 128, 256, 512]
+NOISE_TABLE = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'noise_analysis.csv')
+
+def ground_truth_key(resolution):
+    return f'ground_truth_res{resolution}'
+
+def noisy_key(noise_type, resolution, noise_level):
+    return f'{noise_type}_res{resolution}_nl{noise_level}'
+
+def item_seed(seed, resolution, phantom_id, noise_type=None, noise_level=None):
+    """
+    Deterministic 32 bit seed of one phantom (noise_type None) or one noisy image
+    """
+    entropy = [seed, resolution, phantom_id]
+    if noise_type is not None:
+        entropy += [zlib.crc32(noise_type.encode()), int(round(noise_level * 10000))]
+    return int(np.random.SeedSequence(entropy).generate_state(1)[0])
+
+def load_noise_table(path=NOISE_TABLE):
+    """
+    {(noise_type, resolution, noise_level): noise_factor} from the noise_analysis csv of generate.ipynb
+    """
+    table = {}
+    with open(path) as f:
+        header = f.readline().strip().split(',')
+        for line in f:
+            row = dict(zip(header, line.strip().split(',')))
+            if not row.get('NF1'):
+                continue
+            table[(row['Noise_Type'], int(row['Resolution']), float(row['NL']))] = float(row['NF1'])
+    return table
+
+def noise_factor(table, noise_type, resolution, noise_level):
+    """
+    Noise factor matching a gaussian noise level, resolutions that weren't calibrated
+    use the closest calibrated one (generate.ipynb used the 64 factors for every resolution)
+    """
+    candidates = [key for key in table if key[0] == noise_type and np.isclose(key[2], noise_level)]
+    if not candidates:
+        raise ValueError(f"No noise factor for {noise_type} at noise level {noise_level} in the noise table")
+    closest = min(candidates, key=lambda key: (abs(np.log2(key[1]) - np.log2(resolution)), key[1]))
+    return table[closest]
+
+def dataset_plan(resolutions, noise_types, noise_levels, num_phantoms, table):
+    """
+    Index describing every array of the dataset
+    """
+    arrays = {}
+    for resolution in resolutions:
+        shape = [num_phantoms, 1, resolution, resolution]
+        arrays[ground_truth_key(resolution)] = {
+            'file': f'{ground_truth_key(resolution)}.npy',
+            'shape': shape,
+            'resolution': resolution,
+        }
+        for noise_type in noise_types:
+            for noise_level in noise_levels:
+                key = noisy_key(noise_type, resolution, noise_level)
+                arrays[key] = {
+                    'file': f'{key}.npy',
+                    'shape': shape,
+                    'resolution': resolution,
+                    'noise_type': noise_type,
+                    'noise_level': noise_level,
+                    'noise_factor': noise_factor(table, noise_type, resolution, noise_level),
+                }
+    return arrays
+
+# memmaps opened by a worker process, kept open for all the items it builds
+_worker_state = {}
+
+def _init_worker(out_dir, index):
+    _worker_state['out_dir'] = out_dir
+    _worker_state['index'] = index
+    _worker_state['arrays'] = {}
+    # one pool process per core, keep torch from spawning its own threads on top
+    torch.set_num_threads(1)
+
+def _worker_array(key):
+    arrays = _worker_state['arrays']
+    if key not in arrays:
+        entry = _worker_state['index']['arrays'][key]
+        arrays[key] = open_memmap(os.path.join(_worker_state['out_dir'], entry['file']), mode='r+')
+    return arrays[key]
+
+def _build_item(item):
+    """
+    Ground truth and all noisy versions of one phantom, written straight into the memmaps
+    """
+    resolution, phantom_id = item
+    index = _worker_state['index']
+    seed = index['seed']
+
+    np.random.seed(item_seed(seed, resolution, phantom_id))
+    phantom = generate_phantom(int(np.log2(resolution)))
+    _worker_array(ground_truth_key(resolution))[phantom_id] = phantom
+
+    img_torch = torch.tensor(phantom, dtype=torch.float32)
+    for noise_type in index['noise_types']:
+        for noise_level in index['noise_levels']:
+            key = noisy_key(noise_type, resolution, noise_level)
+            generator = torch.Generator().manual_seed(item_seed(seed, resolution, phantom_id, noise_type, noise_level))
+            noisy = NOISE_FUNCTIONS[noise_type](img_torch, noise_factor=index['arrays'][key]['noise_factor'], generator=generator)
+            _worker_array(key)[phantom_id] = noisy.numpy()
+    return item
+
+def build_dataset(out_dir,
+                  num_phantoms=50,
+                  resolutions=RESOLUTIONS,
+                  noise_types=None,
+                  noise_levels=NOISE_LEVELS,
+                  seed=0,
+                  workers=None,
+                  noise_table=NOISE_TABLE,
+                  dtype='float32',
+                 ):
+    """
+    Generate the dataset into `out_dir`, returns the index
+
+    Args:
+        out_dir: output directory, created if needed
+        num_phantoms: phantoms per resolution
+        resolutions: image sizes (powers of 2)
+        noise_types: keys of NOISE_FUNCTIONS, all of them by default
+        noise_levels: gaussian-equivalent noise levels of the noise table
+        seed: base seed of the per item seeds
+        workers: pool size, os.cpu_count() by default
+        noise_table: csv mapping (noise type, resolution, level) to a noise factor
+    """
+    if noise_types is None:
+        noise_types = list(NOISE_FUNCTIONS.keys())
+    unknown = [noise_type for noise_type in noise_types if noise_type not in NOISE_FUNCTIONS]
+    if unknown:
+        raise ValueError(f"Unknown noise types: {unknown}")
+    for resolution in resolutions:
+        if resolution & (resolution - 1):
+            raise ValueError(f"Resolutions must be powers of 2, got {resolution}")
+
+    os.makedirs(out_dir, exist_ok=True)
+    index = {
+        'num_phantoms': num_phantoms,
+        'resolutions': list(resolutions),
+        'noise_types': list(noise_types),
+        'noise_levels': list(noise_levels),
+        'seed': seed,
+        'dtype': dtype,
+        'arrays': dataset_plan(resolutions, noise_types, noise_levels, num_phantoms, load_noise_table(noise_table)),
+    }
+
+    # preallocate every array so the workers only ever write their own rows
+    for entry in index['arrays'].values():
+        array = open_memmap(os.path.join(out_dir, entry['file']), mode='w+', dtype=dtype, shape=tuple(entry['shape']))
+        array.flush()
+        del array
+
+    items = [(resolution, phantom_id) for resolution in resolutions for phantom_id in range(num_phantoms)]
+    # the big resolutions first so the pool doesn't end on a long tail
+    items.sort(key=lambda item: -item[0])
+
+    workers = workers or os.cpu_count()
+    if workers == 1:
+        _init_worker(out_dir, index)
+        for item in items:
+            _build_item(item)
+    else:
+        with mp.get_context('spawn').Pool(workers, initializer=_init_worker, initargs=(out_dir, index)) as pool:
+            for done, _ in enumerate(pool.imap_unordered(_build_item, items), 1):
+                if done % 50 == 0 or done == len(items):
+                    print(f'{done}/{len(items)} phantoms done')
+
+    # written last, a dataset without index.json is incomplete
+    with open(os.path.join(out_dir, 'index.json'), 'w') as f:
+        json.dump(index, f, indent=2)
+    return index
+
+########################################
+### Loaders for the trials ############
+########################################
+
+def load_index(root):
+    with open(os.path.join(root, 'index.json')) as f:
+        return json.load(f)
+
+def open_array(root, key, mmap_mode='r'):
+    """
+    (N, 1, H, W) memmap of one array of the dataset, slicing it doesn't copy
+    """
+    entry = load_index(root)['arrays'].get(key)
+    if entry is None:
+        raise ValueError(f"{key} is not part of the dataset in {root}")
+    return np.load(os.path.join(root, entry['file']), mmap_mode=mmap_mode)
+
+def load_ground_truth(root, resolution, mmap_mode='r'):
+    return open_array(root, ground_truth_key(resolution), mmap_mode)
+
+def load_noisy(root, noise_type, resolution, noise_level, mmap_mode='r'):
+    return open_array(root, noisy_key(noise_type, resolution, float(noise_level)), mmap_mode)
+
+def load_pair(root, noise_type, resolution, noise_level, phantom_id):
+    """
+    (phantom, phantom_noisy) of shape (1, H, W), the same layout as the per file .npy tree
+    """
+    phantom = load_ground_truth(root, resolution)[phantom_id]
+    phantom_noisy = load_noisy(root, noise_type, resolution, noise_level)[phantom_id]
+    return phantom, phantom_noisy
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Build the phantom + noise benchmark set')
+    parser.add_argument('--out', required=True, help='output directory')
+    parser.add_argument('--num-phantoms', type=int, default=50)
+    parser.add_argument('--resolutions', type=int, nargs='+', default=RESOLUTIONS)
+    parser.add_argument('--noise-types', nargs='+', default=None)
+    parser.add_argument('--noise-levels', type=float, nargs='+', default=NOISE_LEVELS)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--workers', type=int, default=None)
+    parser.add_argument('--noise-table', default=NOISE_TABLE)
+    args = parser.parse_args()
+
+    build_dataset(
+        args.out,
+        num_phantoms=args.num_phantoms,
+        resolutions=args.resolutions,
+        noise_types=args.noise_types,
+        noise_levels=args.noise_levels,
+        seed=args.seed,
+        workers=args.workers,
+        noise_table=args.noise_table,
+    )
@@ -59,97 +59,118 @@
     #                      `-`-,.-.-`
 
 import torch
-import numpy as np
 
-def add_gaussian_noise(img, noise_factor=25/255.):
+# Every noise takes a (C, H, W) image or a (N, C, H, W) batch on any device and draws its
+# noise natively in torch, in place (no numpy round trip, no host copy)
+#     generator: optional torch.Generator on the image's device, for reproducible batches
+#     out: optional output tensor, can be `img` itself to add the noise in place
+# results are clamped to [0, 1]
+
+def _noise_buffer(img, out):
+    # draw the noise straight into `out` unless it aliases the input
+    if out is not None and out.data_ptr() != img.data_ptr():
+        return out
+    return torch.empty_like(img)
+
+def _target(noise, out):
+    return out if out is not None else noise
+
+def add_gaussian_noise(img, noise_factor=25/255., generator=None, out=None):
     """
     https://en.wikipedia.org/wiki/Gaussian_noise
     """
-    img_copy = img.clone()
-    noise = torch.randn_like(img_copy) * noise_factor
-    noisy_img = img_copy + noise
-    return torch.clamp(noisy_img, 0., 1.)
+    noise = _noise_buffer(img, out).normal_(0., noise_factor, generator=generator)
+    return torch.add(img, noise, out=_target(noise, out)).clamp_(0., 1.)
 
-def add_speckle_noise(img, noise_factor=0.5):
+def add_speckle_noise(img, noise_factor=0.5, generator=None, out=None):
     """
     https://en.wikipedia.org/wiki/Speckle_(interference)
     """
-    img_copy = img.clone()
-    noise = torch.randn_like(img_copy) * noise_factor
-    noisy_img = img_copy + img_copy * noise
-    return torch.clamp(noisy_img, 0., 1.)
+    noise = _noise_buffer(img, out).normal_(0., noise_factor, generator=generator)
+    noise.mul_(img)
+    return torch.add(img, noise, out=_target(noise, out)).clamp_(0., 1.)
 
-def add_uniform_noise(img, noise_factor=0.5):
+def add_uniform_noise(img, noise_factor=0.5, generator=None, out=None):
     """
 
     """
-    img_copy = img.clone()
-    noise = torch.rand_like(img_copy) * noise_factor
-    noisy_img = img_copy + noise
-    return torch.clamp(noisy_img, 0., 1.)
+    noise = _noise_buffer(img, out).uniform_(0., noise_factor, generator=generator)
+    return torch.add(img, noise, out=_target(noise, out)).clamp_(0., 1.)
 
-def add_exponential_noise(img, noise_factor=0.1):
+def add_exponential_noise(img, noise_factor=0.1, generator=None, out=None):
     """
-    
+    Exponential with scale noise_factor (np.random.exponential convention)
     """
-    img_copy = img.clone()
-    noise = torch.from_numpy(np.random.exponential(noise_factor, img_copy.shape)).float()
-    noisy_img = img_copy + noise
-    return torch.clamp(noisy_img, 0., 1.)
+    noise = _noise_buffer(img, out).exponential_(1. / noise_factor, generator=generator)
+    return torch.add(img, noise, out=_target(noise, out)).clamp_(0., 1.)
 
-def add_rayleigh_noise(img, noise_factor=0.1):
+def add_rayleigh_noise(img, noise_factor=0.1, generator=None, out=None):
     """
+    Rayleigh with scale noise_factor, inverse CDF: sigma * sqrt(-2 ln U)
     """
-    img_copy = img.clone()
-    noise = torch.from_numpy(np.random.rayleigh(noise_factor, img_copy.shape)).float()
-    noisy_img = img_copy + noise
-    return torch.clamp(noisy_img, 0., 1.)
+    noise = _noise_buffer(img, out).uniform_(generator=generator)
+    # U in (0, 1] so the log stays finite
+    noise.neg_().add_(1.).log_().mul_(-2.).sqrt_().mul_(noise_factor)
+    return torch.add(img, noise, out=_target(noise, out)).clamp_(0., 1.)
 
-def add_erlang_noise(img, shape=2.0, noise_factor=0.1):
+def add_erlang_noise(img, shape=2.0, noise_factor=0.1, generator=None, out=None):
     """
+    Gamma(shape, scale=noise_factor), for an integer shape (Erlang) it is the sum of
+    `shape` exponentials and honours `generator`, other shapes fall back to torch's
+    gamma sampler which only draws from the default generator, so they can't take one
     """
-    img_copy = img.clone()
-    noise = torch.from_numpy(np.random.gamma(shape, noise_factor, img_copy.shape)).float()
-    noisy_img = img_copy + noise
-    return torch.clamp(noisy_img, 0., 1.)
+    integer = float(shape).is_integer() and shape >= 1
+    if generator is not None and not integer:
+        raise ValueError(f"a generator needs an integer shape >= 1, torch's gamma sampler ignores it, got shape {shape}")
+    noise = _noise_buffer(img, out)
+    if integer:
+        noise.exponential_(1. / noise_factor, generator=generator)
+        if shape > 1:
+            scratch = torch.empty_like(img)
+            for _ in range(int(shape) - 1):
+                noise.add_(scratch.exponential_(1. / noise_factor, generator=generator))
+    else:
+        noise.copy_(torch.distributions.Gamma(torch.full_like(img, shape), 1. / noise_factor).sample())
+    return torch.add(img, noise, out=_target(noise, out)).clamp_(0., 1.)
 
-def add_brownian_noise(img, noise_factor=0.5):
+def add_brownian_noise(img, noise_factor=0.5, generator=None, out=None):
     """
+    2D random walk (cumsum over rows then columns of white noise), normalized to
+    [0, noise_factor] over each image (all its channels), so every sample of a batch
+    looks like the single image version
     """
-    img_copy = img.clone()
-    brownian_noise = np.zeros_like(img_copy.numpy())
-    
-    for channel in range(img_copy.shape[0]):
-        brownian_noise[channel] = np.cumsum(np.cumsum(np.random.randn(*img_copy.shape[1:]), axis=0), axis=1)
-    
+    noise = _noise_buffer(img, out).normal_(generator=generator)
+    noise.cumsum_(-2).cumsum_(-1)
+
     # Normalize and adjust by noise factor
-    brownian_noise = brownian_noise - brownian_noise.min()
-    brownian_noise = (brownian_noise / brownian_noise.max()) * noise_factor
-    
-    noisy_img = img_copy + torch.tensor(brownian_noise).float()
-    return torch.clamp(noisy_img, 0., 1.)
+    noise.sub_(noise.amin(dim=(-3, -2, -1), keepdim=True))
+    noise.mul_(noise_factor / noise.amax(dim=(-3, -2, -1), keepdim=True))
 
-def add_stripe_noise(img, vertical=True, noise_factor=0.5):
+    return torch.add(img, noise, out=_target(noise, out)).clamp_(0., 1.)
+
+def add_stripe_noise(img, vertical=True, noise_factor=0.5, generator=None, out=None):
     """
     """
-    img_copy = img.clone()
+    batch, (channels, height, width) = img.shape[:-3], img.shape[-3:]
     if vertical:
-        noise = torch.randn(img_copy.shape[0], 1, img_copy.shape[2]) * noise_factor
-        noise = noise.expand_as(img_copy)
+        # one value per column and channel
+        shape = (*batch, channels, 1, width)
     else:  # horizontal
-        noise = torch.randn(1, img_copy.shape[1], img_copy.shape[2]) * noise_factor
-        noise = noise.expand_as(img_copy)
-    noisy_img = img_copy + noise
-    return torch.clamp(noisy_img, 0., 1.)
+        # one value per pixel shared by the channels, what this noise has always drawn
+        shape = (*batch, 1, height, width)
+    noise = torch.randn(shape, generator=generator, dtype=img.dtype, device=img.device).mul_(noise_factor)
+    if out is None:
+        out = img + noise
+    else:
+        torch.add(img, noise, out=out)
+    return out.clamp_(0., 1.)
 
-def add_multiplicative_noise(img, noise_factor=0.5):
+def add_multiplicative_noise(img, noise_factor=0.5, generator=None, out=None):
     """
     https://en.wikipedia.org/wiki/Multiplicative_noise
     """
-    img_copy = img.clone()
-    noise = 1 + torch.randn_like(img_copy) * noise_factor
-    noisy_img = img_copy * noise
-    return torch.clamp(noisy_img, 0., 1.)
+    noise = _noise_buffer(img, out).normal_(1., noise_factor, generator=generator)
+    return torch.mul(img, noise, out=_target(noise, out)).clamp_(0., 1.)
 
 NOISE_FUNCTIONS = {
     'gaussian': add_gaussian_noise,
@@ -167,6 +188,9 @@ NOISE_FUNCTIONS = {
 }
 
 def add_selected_noise(img, noise_type='gaussian', **kwargs):
+    """
+    kwargs go to the noise function, e.g. noise_factor, generator, out
+    """
     if noise_type in NOISE_FUNCTIONS:
         return NOISE_FUNCTIONS[noise_type](img, **kwargs)
     else:
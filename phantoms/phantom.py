@@ -1,7 +1,6 @@
 import numpy as np
 import torch
 import matplotlib.pyplot as plt
-from numba import jit
 
 def get_random_configuration(center_area=0.1, size_low=0, size_high=1, shapes=["rectangle", "ellipse"]):
     
@@ -24,78 +23,71 @@ def get_random_configuration(center_area=0.1, size_low=0, size_high=1, shapes=["
     
     return x_center, y_center, x_size, y_size, rotation_angle, shape, graylevel
 
-@jit(nopython=True)
-def rotation(vector, alpha):
+def rotation_matrices(alpha):
+    """
+    (S, 2, 2) rotation matrices for S angles in degrees
+    """
     cosd = np.cos( np.deg2rad(alpha) )
     sind = np.sin( np.deg2rad(alpha) )
-    rotation_mat = np.array([[cosd, -sind],
-                             [sind,  cosd]] )
-    vec_rotation = rotation_mat @ vector
-    return vec_rotation
-
-@jit(nopython=True)
-def calc_pixel_center_rotation(pixel_size, x_center, y_center, rotation_angle, ii, jj):
-    # Calculate pixel center
-    x = -1 + pixel_size * jj + pixel_size / 2
-    y = -1 + pixel_size * ii + pixel_size / 2
-    vector = np.array([x, y])
-
-    # Calculate rotated vector
-    v_rot = rotation(vector - np.array([x_center, y_center]) , -rotation_angle) + np.array([x_center, y_center])
-    return vector, v_rot
-
-@jit(nopython=True)
-def pixel_condition_rectangle(image_size, pixel_size, x_center, y_center, x_size, y_size, rotation_angle, graylevel):
-    
-    x_size_by_2 = x_size / 2
-    y_size_by_2 = y_size / 2
-    
-    # Temporary phantom for rectangle
-    phantom_temp = np.zeros((image_size, image_size))
-    
-    for ii in range(image_size):
-        for jj in range(image_size):
-            vector, v_rot = calc_pixel_center_rotation(pixel_size, x_center, y_center, rotation_angle, ii, jj)
+    return np.stack([np.stack([cosd, -sind], -1),
+                     np.stack([sind,  cosd], -1)], -2)
 
-            if (x_center - x_size_by_2 <= v_rot[0])\
-            and (v_rot[0] <= x_center + x_size_by_2)\
-            and (y_center - y_size_by_2 <= v_rot[1])\
-            and (v_rot[1] <= y_center + y_size_by_2):
-                phantom_temp[ii, jj] = graylevel
+def pixel_centers(image_size, pixel_size):
+    """
+    (2, image_size**2) pixel centers of the [-1, 1]^2 grid
+    row 0 is x (follows the column index jj), row 1 is y (follows the row index ii)
+    """
+    coords = -1 + pixel_size * np.arange(image_size) + pixel_size / 2
+    x, y = np.meshgrid(coords, coords)
+    return np.stack([x.ravel(), y.ravel()])
 
-    return phantom_temp
+def configuration_arrays(configurations):
+    """
+    Stacks S configurations from get_random_configuration into the arrays used by shape_masks
+    """
+    x_center, y_center, x_size, y_size, rotation_angle, shape, graylevel = zip(*configurations)
+    center = np.stack([x_center, y_center], -1)
+    half_size = np.stack([x_size, y_size], -1) / 2
+    # pixels are rotated by -rotation_angle around the center of the shape
+    rotation_mat = rotation_matrices(-np.asarray(rotation_angle, dtype=np.float64))
+    is_rectangle = np.asarray(shape) == "rectangle"
+    return center, half_size, rotation_mat, is_rectangle, np.asarray(graylevel, dtype=np.float64)
+
+def shape_masks(center, half_size, rotation_mat, is_rectangle, grid):
+    """
+    Which pixels fall inside each of S shapes, (S, P) boolean
 
-@jit(nopython=True)
-def pixel_condition_ellipse(image_size, pixel_size, x_center, y_center, x_size, y_size, rotation_angle, graylevel):
-    
-    x_size_by_2 = x_size / 2
-    y_size_by_2 = y_size / 2
-    
-    x_size_by_2_squared = x_size_by_2**2
-    y_size_by_2_squared = y_size_by_2**2
-    
-    # Temporary phantom for rectangle
-    phantom_temp = np.zeros((image_size, image_size))
-    
-    for ii in range(image_size):
-        for jj in range(image_size):
-            vector, v_rot = calc_pixel_center_rotation(pixel_size, x_center, y_center, rotation_angle, ii, jj)
+    All pixel centers of all shapes are rotated with one batched matmul.
+    Works on numpy arrays or on torch tensors (all on the same device)
+
+    Args:
+        center: (S, 2) shape centers
+        half_size: (S, 2) half of the x and y sizes
+        rotation_mat: (S, 2, 2) from rotation_matrices(-rotation_angle)
+        is_rectangle: (S,) boolean, ellipse otherwise
+        grid: (2, P) pixel centers from pixel_centers
+    """
+    center = center[:, :, None]
+    half_size = half_size[:, :, None]
+    # v_rot = R(-angle) (v - c) + c for every shape and pixel
+    v_rot = rotation_mat @ (grid[None] - center) + center
 
-            if (v_rot[0] - x_center)**2 / x_size_by_2_squared + (v_rot[1] - y_center)**2/ y_size_by_2_squared <= 1:
-                    phantom_temp[ii, jj] = graylevel
+    inside_rectangle = ((center - half_size <= v_rot) & (v_rot <= center + half_size)).all(1)
+    inside_ellipse = (((v_rot - center) ** 2 / half_size ** 2).sum(1) <= 1)
 
-    return phantom_temp
+    is_rectangle = is_rectangle[:, None]
+    return (is_rectangle & inside_rectangle) | (~is_rectangle & inside_ellipse)
+
+def pixel_condition_rectangle(image_size, pixel_size, x_center, y_center, x_size, y_size, rotation_angle, graylevel):
+    return phantom_shape(image_size, pixel_size, x_center, y_center, x_size, y_size, rotation_angle, graylevel, "rectangle")
+
+def pixel_condition_ellipse(image_size, pixel_size, x_center, y_center, x_size, y_size, rotation_angle, graylevel):
+    return phantom_shape(image_size, pixel_size, x_center, y_center, x_size, y_size, rotation_angle, graylevel, "ellipse")
 
-@jit(nopython=True)
 def phantom_shape(image_size, pixel_size, x_center, y_center, x_size, y_size, rotation_angle, graylevel, shape):
-    
-    if shape == "rectangle":
-        phantom_temp = pixel_condition_rectangle(image_size, pixel_size, x_center, y_center, x_size, y_size, rotation_angle, graylevel)
-        
-    elif shape  == "ellipse":
-        phantom_temp = pixel_condition_ellipse(image_size, pixel_size, x_center, y_center, x_size, y_size, rotation_angle, graylevel)
-                
-    return phantom_temp
+    center, half_size, rotation_mat, is_rectangle, _ = configuration_arrays([(x_center, y_center, x_size, y_size, rotation_angle, shape, graylevel)])
+    mask = shape_masks(center, half_size, rotation_mat, is_rectangle, pixel_centers(image_size, pixel_size))
+    return graylevel * mask.reshape(image_size, image_size)
 
 def generate_phantom(resolution=6, number_features=20, x_center=0, y_center=0, x_size=1, y_size=2, rotation_angle=45, graylevel=.5, shape="ellipse"):
     """
@@ -151,34 +143,27 @@ def generate_phantom(resolution=6, number_features=20, x_center=0, y_center=0, x
     image_size = 2 ** resolution
     pixel_size = 2 /  (image_size)
 
-    # Create basic phantom
-    x_center, y_center, x_size, y_size, rotation_angle, shape, graylevel = get_random_configuration(center_area=0.1, size_low=0.9, size_high=1.4, shapes=["rectangle", "ellipse"])
-    basic_phantom = phantom_shape(image_size, pixel_size, x_center, y_center, x_size, y_size, rotation_angle, graylevel, shape)
+    # random configurations of the basic shape and of the features, drawn in the same order
+    # as the former per shape rasterizer so a given np.random seed gives the same phantom
+    configurations = [get_random_configuration(center_area=0.1, size_low=0.9, size_high=1.4, shapes=["rectangle", "ellipse"])]
+    for ii in range(number_features):
+        configurations.append(get_random_configuration(center_area=0.2, size_low=0.05, size_high=0.1, shapes=["rectangle", "ellipse"]))
 
-    # Initial filter with only ones (all pixels allowed)
-    filter = np.ones((image_size, image_size))
+    # rasterize all the shapes in one pass, (1 + number_features, H, W)
+    center, half_size, rotation_mat, is_rectangle, graylevels = configuration_arrays(configurations)
+    masks = shape_masks(center, half_size, rotation_mat, is_rectangle, pixel_centers(image_size, pixel_size))
+    masks = masks.reshape(-1, image_size, image_size)
 
-    # Initial collection of feature objects (only zeros->no objects)
-    feature_objects = np.zeros((image_size, image_size))
+    # Create basic phantom
+    basic_phantom = graylevels[0] * masks[0]
 
-    # iterate over the number of features that will be added
-    for ii in range(number_features):
-        
-        # get random configuration
-        x_center, y_center, x_size, y_size, rotation_angle, shape, graylevel = get_random_configuration(center_area=0.2, size_low=0.05, size_high=0.1, shapes=["rectangle", "ellipse"])
-        
-        # create a phantom feature according to that configuration
-        phantom_feature = phantom_shape(image_size, pixel_size, x_center, y_center, x_size, y_size, rotation_angle, graylevel, shape)
-        # io.imshow(phantom_feature)
-        # io.show()   
-        # add the current phantom_feature to the feature object in the pixels, that are not already taken (where filter is 1)
-        feature_objects += np.multiply(filter, phantom_feature)  
-        
-        # get new filter based on new feature_objects.
-        # (False * -1) + 1 = 1
-        # (True * -1) + 1 = 0
-        # So this new filter is 0 precisely in these pixels which are already taken.
-        filter = ((feature_objects > 0) * -1) + 1
+    # composite the features, a pixel keeps the graylevel of the first feature that covers it
+    feature_masks = masks[1:]
+    feature_objects = np.zeros((image_size, image_size))
+    if number_features > 0:
+        taken = feature_masks.any(0)
+        first = feature_masks.argmax(0)
+        feature_objects = np.where(taken, graylevels[1:][first], 0.)
 
     # Phantom filter
     phantom_filter = (basic_phantom > 0)
@@ -191,6 +176,77 @@ def generate_phantom(resolution=6, number_features=20, x_center=0, y_center=0, x
 
     return phantom[None, :, :]
 
+def generate_phantoms_torch(number_phantoms, resolution=6, number_features=20, device="cpu", dtype=torch.float64, chunk_size=None):
+    """
+    Batch of phantoms rasterized with torch, e.g. on the GPU
+
+    The configurations come from np.random in the same order as `number_phantoms` calls
+    of generate_phantom, so for the same np.random seed both give the same phantoms
+
+    Parameters
+    ----------
+    number_phantoms : int
+        Number of phantoms.
+    resolution : int, optional
+        image size = 2 ** resolution. The default is 6.
+    number_features : int, optional
+        Number of features in each phantom. The default is 20.
+    device : str or torch.device, optional
+        Device the rasterization runs on. The default is "cpu".
+    dtype : torch.dtype, optional
+        Precision of the pixel coordinates, float64 matches generate_phantom on the shape borders.
+    chunk_size : int, optional
+        Phantoms rasterized at once, by default sized to keep the masks around 64M elements.
+
+    Returns
+    -------
+    phantoms : torch tensor
+        (number_phantoms, 1, H, W) phantoms on `device`.
+
+    """
+    image_size = 2 ** resolution
+    pixel_size = 2 / (image_size)
+    shapes_per_phantom = 1 + number_features
+    if chunk_size is None:
+        chunk_size = max(1, 2 ** 26 // (shapes_per_phantom * image_size ** 2))
+
+    configurations = []
+    for _ in range(number_phantoms):
+        configurations.append(get_random_configuration(center_area=0.1, size_low=0.9, size_high=1.4, shapes=["rectangle", "ellipse"]))
+        for ii in range(number_features):
+            configurations.append(get_random_configuration(center_area=0.2, size_low=0.05, size_high=0.1, shapes=["rectangle", "ellipse"]))
+
+    grid = torch.as_tensor(pixel_centers(image_size, pixel_size), dtype=dtype, device=device)
+    phantoms = torch.empty((number_phantoms, 1, image_size, image_size), dtype=dtype, device=device)
+
+    for start in range(0, number_phantoms, chunk_size):
+        stop = min(start + chunk_size, number_phantoms)
+        n = stop - start
+        arrays = configuration_arrays(configurations[start * shapes_per_phantom:stop * shapes_per_phantom])
+        center, half_size, rotation_mat, is_rectangle, graylevels = [torch.as_tensor(a, device=device) for a in arrays]
+
+        masks = shape_masks(center.to(dtype), half_size.to(dtype), rotation_mat.to(dtype), is_rectangle, grid)
+        masks = masks.view(n, shapes_per_phantom, image_size, image_size)
+        graylevels = graylevels.to(dtype).view(n, shapes_per_phantom)
+
+        basic_phantom = graylevels[:, 0, None, None] * masks[:, 0]
+
+        feature_objects = torch.zeros_like(basic_phantom)
+        if number_features > 0:
+            feature_masks = masks[:, 1:]
+            taken = feature_masks.any(1)
+            # argmax returns the first maximal index, bool argmax isn't implemented so go through uint8
+            first = feature_masks.to(torch.uint8).argmax(1)
+            feature_objects = torch.gather(graylevels[:, 1:], 1, first.view(n, -1)).view_as(basic_phantom) * taken
+
+        phantom = basic_phantom + (basic_phantom > 0) * feature_objects
+
+        phantom_min = phantom.amin(dim=(1, 2), keepdim=True)
+        phantom_max = phantom.amax(dim=(1, 2), keepdim=True)
+        phantoms[start:stop, 0] = (phantom - phantom_min) / (phantom_max - phantom_min)
+
+    return phantoms
+
 def phantom_to_torch(img_numpy):
     """
     Converts a numpy image to a PyTorch tensor and adjusts channels.
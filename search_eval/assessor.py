@@ -0,0 +1,125 @@
+"""
+NNI assessor for DIP PSNR curves
+
+DIP curves rise while the network fits the image, peak, then decay as it starts fitting
+the noise (the SGLD mean flattens the decay). Medianstop only compares running averages,
+this assessor fits
+
+    f(t) = c + a * (1 - exp(-k1 t)) - b * (1 - exp(-k2 t))      a, b >= 0, k2 < k1
+
+to the partial history (rise at rate k1, decay at rate k2) and stops a trial when even an
+optimistic prediction of its peak over the remaining steps can't beat the best peak of the
+finished trials. The rates are searched on a log grid and (c, a, b) solved by least squares,
+numpy only, so it runs in the NNI dispatcher without extra dependencies.
+
+Works with what the evaluators report: floats (HPO=True) or dicts ('default', 'psnr' or 'psnr_gt').
+
+usage in an HPO main.py:
+    experiment.config.assessor = CustomAlgorithmConfig(
+        class_name='search_eval.assessor.DIPCurveAssessor',
+        code_directory='<repo root>',
+        class_args={'start_step': 20, 'max_step': 60},
+    )
+"""
+
+import logging
+
+import numpy as np
+from nni.assessor import Assessor, AssessResult
+
+logger = logging.getLogger('dip_curve_assessor')
+
+def history_values(trial_history):
+    """
+    PSNR values of the intermediate results, dicts use 'default', then 'psnr', then 'psnr_gt'
+    """
+    values = []
+    for result in trial_history:
+        if isinstance(result, dict):
+            for key in ('default', 'psnr', 'psnr_gt'):
+                if key in result:
+                    result = result[key]
+                    break
+            else:
+                continue
+        values.append(float(result))
+    return np.array(values, dtype=np.float64)
+
+def fit_curve(values, rates=np.logspace(-3, 0, 25)):
+    """
+    Least squares fit of the rise-peak-decay model to values[t], t = 0, 1, ...
+    Returns (predict, residual_std) with predict(t) the fitted curve
+    """
+    t = np.arange(len(values), dtype=np.float64)
+    best = None
+    for i, k1 in enumerate(rates):
+        rise = 1. - np.exp(-k1 * t)
+        # no decay term, then every slower decay
+        for k2 in [None] + list(rates[:i]):
+            columns = [np.ones_like(t), rise] if k2 is None else [np.ones_like(t), rise, -(1. - np.exp(-k2 * t))]
+            design = np.stack(columns, axis=1)
+            coef, *_ = np.linalg.lstsq(design, values, rcond=None)
+            if np.any(coef[1:] < 0):
+                continue
+            sse = np.sum((design @ coef - values) ** 2)
+            if best is None or sse < best[0]:
+                best = (sse, k1, k2, coef)
+
+    if best is None:
+        # nothing rises, a constant
+        mean = values.mean()
+        return (lambda s: np.full(np.shape(s), mean)), values.std()
+
+    sse, k1, k2, coef = best
+    def predict(s):
+        s = np.asarray(s, dtype=np.float64)
+        out = coef[0] + coef[1] * (1. - np.exp(-k1 * s))
+        if k2 is not None:
+            out = out - coef[2] * (1. - np.exp(-k2 * s))
+        return out
+    return predict, np.sqrt(sse / max(1, len(values) - len(coef)))
+
+
+class DIPCurveAssessor(Assessor):
+    """
+    Args:
+        start_step: intermediate results needed before a trial is judged
+        max_step: number of intermediate results of a complete trial (max_epochs / report_every),
+                  None extrapolates to twice the current history
+        margin: dB added to the predicted peak, on top of 2 residual std, before comparing
+        optimize_mode: only 'maximize' (PSNR) is supported
+    """
+    def __init__(self, start_step=20, max_step=None, margin=0.5, optimize_mode='maximize'):
+        if optimize_mode != 'maximize':
+            raise ValueError(f"DIPCurveAssessor maximizes PSNR, got optimize_mode={optimize_mode}")
+        self.start_step = start_step
+        self.max_step = max_step
+        self.margin = margin
+        self.histories = {}
+        self.best_peak = None
+
+    def predicted_peak(self, values):
+        predict, residual_std = fit_curve(values)
+        horizon = self.max_step if self.max_step is not None else 2 * len(values)
+        future = np.arange(len(values), max(horizon, len(values) + 1))
+        peak = max(values.max(), predict(future).max())
+        return peak + 2 * residual_std + self.margin
+
+    def assess_trial(self, trial_job_id, trial_history):
+        values = history_values(trial_history)
+        self.histories[trial_job_id] = values
+        if self.best_peak is None or len(values) < self.start_step:
+            return AssessResult.Good
+
+        peak = self.predicted_peak(values)
+        if peak < self.best_peak:
+            logger.info('Stopping trial %s, predicted peak %.3f < best %.3f', trial_job_id, peak, self.best_peak)
+            return AssessResult.Bad
+        return AssessResult.Good
+
+    def trial_end(self, trial_job_id, success):
+        values = self.histories.pop(trial_job_id, None)
+        if success and values is not None and len(values) > 0:
+            peak = values.max()
+            if self.best_peak is None or peak > self.best_peak:
+                self.best_peak = peak
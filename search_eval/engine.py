@@ -0,0 +1,1196 @@
+"""
+DIP engine shared by the evaluators
+
+Every evaluator used to carry its own copy of the DIP iteration (input noise, forward, loss,
+PSNR, burn-in check, SGLD mean, reporting, parameter noise, plotting). DIPEngine runs that
+iteration once for all of them, with the variable parts as pluggable stages:
+
+    burn-in detector    FixedBurnin (Eval_SGLD) or ESBurnin (ES-WMV, the others)
+    SGLD sampler        SGLDSampler, SGLD means and per-pixel posterior variance (Welford, see
+                        utils/posterior.py) of the outputs and the Langevin parameter noise
+    chains              ChainSampler (optional), more SGLD chains from the burn-in point, stops the
+                        sampling once R-hat / ESS say it converged (utils/convergence.py)
+    sample sink         SampleSink (optional), thinned samples to a memory-mapped store (utils/samples.py)
+    reporter            Reporter, NNI intermediate results and utils/recorder.py metrics
+    snapshotter         Snapshotter, progress panels and checkpoints
+
+BatchedEngine runs the same iteration over N independent problems of one batched network
+(utils/batched.py) with the Batched* stages, for Eval_Batched and the denoising service.
+
+The per-iteration step only does in-place work on buffers allocated once (DIPEngine.to): the input
+noise is drawn into a reused buffer, the SGLD means accumulate in place and the PSNRs go through
+a scratch image. Metrics stay 0-d device tensors, the host only syncs at report boundaries.
+
+The evaluators are thin NNI / Lightning adapters (EngineAdapter + their own hooks), so the
+engine's throughput, measured once with `benchmark`, is the throughput of all of them:
+    python -m search_eval.engine --resolution 256 --steps 200
+"""
+
+import math
+import time
+
+import numpy as np
+import torch
+import torch.nn.functional as F
+from nni import report_intermediate_result
+from nni.retiarii.evaluator.pytorch.lightning import DataLoader
+
+from .utils.common_utils import get_noise
+from .utils.precision import check_precision, autocast
+from .utils.recorder import MetricsRecorder, trial_metrics_path
+from .utils.progress import ProgressRenderer, show_panels, show_rows, to_host
+from .utils.metrics import batch_psnr
+from .utils.checkpoint import AsyncCheckpointer
+from .utils.posterior import Welford, save_posterior
+from .utils.samples import SampleStore, DTYPES
+from .utils.convergence import pixel_rhat, split_rhat, ess
+from .utils.batched import batch_models, batch_optimizer_state
+from .optimizer.SingleImageDataset import SingleImageDataset
+from .optimizer.param_noise import ParamNoise
+from .optimizer.SGLD import SGLD
+
+# engine state saved in the evaluators' checkpoints
+STATE_ATTRS = (
+    'i', 'sample_count', 'burnin_iter', 'burnin_over', 'burnin_epoch', 'cur_var',
+    'sgld_mean', 'sgld_mean_each', 'sgld_mean_psnr', 'sgld_mean_psnr_each',
+    'psnr_gt', 'latest_loss', 'last_out', 'net_input_saved', 'net_input',
+    'posterior', 'posterior_each',
+)
+# saved through their state_dict
+WELFORD_ATTRS = ('posterior', 'posterior_each')
+
+
+class DIPEngine:
+    """
+    Args:
+        phantom: ground truth image (H, W) or (C, H, W), only used for the PSNR
+        phantom_noisy: the image the network is fitted to
+        stages: Stage instances, their hooks run in this order
+        input_depth: channels of the network input
+        reg_noise_std: std of the noise added to the network input every iteration
+        precision: 32 or 'bf16', see utils/precision.py
+    """
+    def __init__(self, phantom, phantom_noisy, stages=(), input_depth=1, reg_noise_std=1./30., precision=32):
+        self.stages = list(stages)
+        self.input_depth = input_depth
+        self.reg_noise_std = float(reg_noise_std)
+        self.precision = check_precision(precision)
+        self.model = None
+        self.device = torch.device('cpu')
+
+        # move to float 32 instead of float 64
+        self.img_np = np.float32(phantom)
+        self.img_noisy_np = np.float32(phantom_noisy)
+        self.img_torch = torch.tensor(self.img_np, dtype=torch.float32)
+        self.img_noisy_torch = torch.tensor(self.img_noisy_np, dtype=torch.float32).unsqueeze(0)
+        self.net_input = get_noise(input_depth, 'noise', (self.img_np.shape[-2:][1], self.img_np.shape[-2:][0])).float().detach()
+        self.net_input_saved = self.net_input
+        self.scratch = None
+        self.reset()
+
+    def reset(self):
+        self.i = 0
+        self.total_loss = None
+        self.latest_loss = None
+        self.last_out = None
+        self.psnr_gt = None
+        self.burnin_over = False
+        # iteration the burn-in ended at, None while it runs
+        self.burnin_epoch = None
+        self.cur_var = None
+        # SGLD: sgld_mean over every MCMC_iter-th output, sgld_mean_each over all of them since the burn-in
+        self.sample_count = 0
+        self.burnin_iter = 0
+        self.sgld_mean = None
+        self.sgld_mean_each = None
+        self.sgld_mean_psnr = None
+        self.sgld_mean_psnr_each = None
+        # per-pixel mean and variance of the same samples, constant memory
+        self.posterior = Welford()
+        self.posterior_each = Welford()
+        # set by the stages, e.g. ChainSampler once converged; the evaluators stop the trainer
+        self.should_stop = False
+        self.diagnostics = {}
+        # chains pooled into sgld_mean / posterior, set by the ChainSampler
+        self.chains = 1
+
+    def to(self, model, device):
+        """
+        Move the model and the images to `device` and allocate the per-iteration buffers
+        """
+        self.model = model.to(device)
+        self.device = torch.device(device)
+        if self.img_torch is not None:
+            self.img_torch = self.img_torch.to(device)
+        self.img_noisy_torch = self.img_noisy_torch.to(device)
+        self.net_input = self.net_input.to(device)
+        self.net_input_saved = self.net_input.clone()
+        self.noise = torch.empty_like(self.net_input_saved)
+        self.perturbed = torch.empty_like(self.net_input_saved)
+        # shape of the output broadcast with the ground truth, allocated with the first PSNR
+        self.scratch = None
+        return self
+
+    def start(self):
+        self.reset()
+        for stage in self.stages:
+            stage.start(self)
+
+    def end(self):
+        for stage in self.stages:
+            stage.end(self)
+
+    def run_model(self, net_input):
+        # only the network runs under autocast, the output is back in fp32 for the loss and metrics
+        with autocast(self.precision, self.device):
+            out = self.model(net_input)
+        return out.float()
+
+    def forward(self):
+        if self.reg_noise_std > 0:
+            # the perturbed input reuses one buffer, the previous graph is gone by the next forward
+            torch.add(self.net_input_saved, self.noise.normal_(), alpha=self.reg_noise_std, out=self.perturbed)
+            return self.run_model(self.perturbed)
+        return self.run_model(self.net_input_saved)
+
+    def psnr(self, img, scale=1.):
+        """
+        PSNR of scale * img against the ground truth as a 0-d device tensor (data_range 1, as utils/metrics.psnr),
+        through the scratch image
+        """
+        if self.scratch is None:
+            self.scratch = torch.empty(torch.broadcast_shapes(img.shape, self.img_torch.shape), device=img.device)
+        torch.mul(img, scale, out=self.scratch)
+        self.scratch.sub_(self.img_torch)
+        return -10 * torch.log10(self.scratch.pow_(2).mean())
+
+    def psnr_noisy(self, img):
+        """
+        PSNR of img against the noisy image as a 0-d device tensor
+        """
+        return -10 * torch.log10(F.mse_loss(img, self.img_noisy_torch[0]))
+
+    def closure(self):
+        """
+        One DIP iteration up to the loss, the caller does backward and the optimizer step
+        """
+        out = self.measure(self.forward())
+
+        for stage in self.stages:
+            stage.closure(self, out)
+
+        self.i += 1
+        return self.total_loss
+
+    def measure(self, out):
+        """
+        Loss and PSNR of the network output, returns the detached output the stages get
+        """
+        self.total_loss = F.mse_loss(out, self.img_noisy_torch)
+        self.latest_loss = self.total_loss.detach()
+        out = out.detach()[0]
+        self.last_out = out
+        self.psnr_gt = self.psnr(out)
+        return out
+
+    def step(self, optimizer):
+        """
+        Bookkeeping after the optimizer step of the iteration
+        """
+        for stage in self.stages:
+            stage.step(self, optimizer)
+
+    def denoised(self):
+        """
+        (label, image) of the current reconstruction: the SGLD mean once sampling, else the latest output
+        """
+        if self.burnin_iter > 0:
+            return "SGLD Mean", self.sgld_mean_each / self.burnin_iter
+        if self.last_out is None:
+            with torch.no_grad():
+                self.last_out = self.forward().detach()[0]
+        return "Denoised Image", self.last_out
+
+    def uncertainty(self):
+        """
+        Per-pixel posterior std of the samples since the burn-in, None before the second one
+        """
+        if self.posterior_each.count() < 2:
+            return None
+        return self.posterior_each.std()
+
+    def state_dict(self):
+        state = {name: getattr(self, name) for name in STATE_ATTRS}
+        for name in WELFORD_ATTRS:
+            state[name] = state[name].state_dict()
+        return state
+
+    def load_state_dict(self, state):
+        for name, value in state.items():
+            if name in WELFORD_ATTRS:
+                getattr(self, name).load_state_dict(value, self.device)
+                continue
+            # checkpoints of the evaluators before the engine start the means at 0
+            if name in ('sgld_mean', 'sgld_mean_each') and not torch.is_tensor(value):
+                value = None
+            setattr(self, name, value.to(self.device) if torch.is_tensor(value) else value)
+
+
+class Stage:
+    """
+    Pluggable part of the DIP iteration, every hook is optional
+        start(engine)               after the tensors are on the device, before the first iteration
+        closure(engine, out)        after the loss and PSNR of iteration engine.i (out: detached (C, H, W) output)
+        step(engine, optimizer)     after the optimizer step, engine.i already counts the iteration
+        end(engine)                 after the last iteration
+    """
+    def start(self, engine):
+        pass
+
+    def closure(self, engine, out):
+        pass
+
+    def step(self, engine, optimizer):
+        pass
+
+    def end(self, engine):
+        pass
+
+
+class FixedBurnin(Stage):
+    """
+    Burn-in over after a fixed number of iterations
+    """
+    def __init__(self, burnin_iter):
+        self.burnin_iter = burnin_iter
+
+    def closure(self, engine, out):
+        if not engine.burnin_over and engine.i > self.burnin_iter:
+            engine.burnin_over = True
+            engine.burnin_epoch = engine.i
+
+
+class ESBurnin(Stage):
+    """
+    Burn-in over when the ES-WMV windowed variance stops improving, see optimizer/early_stopper.py
+    """
+    def __init__(self, early_stopper):
+        self.early_stopper = early_stopper
+
+    def closure(self, engine, out):
+        if not engine.burnin_over:
+            engine.burnin_over = self.early_stopper.update_stop(out, engine.i)
+            engine.cur_var = self.early_stopper.cur_var
+            if engine.burnin_over:
+                engine.burnin_epoch = engine.i
+
+    def end(self, engine):
+        self.early_stopper.flush()
+
+
+class SGLDSampler(Stage):
+    """
+    SGLD means and posterior variance of the outputs after the burn-in and the Langevin noise on the parameters
+
+    Args:
+        MCMC_iter: every MCMC_iter-th output goes into sgld_mean / posterior, all of them into
+                   sgld_mean_each / posterior_each
+        learning_rate: the noise std is param_noise_sigma * learning_rate
+        param_noise_sigma: see above
+        param_noise: ParamNoise, a fresh unseeded one by default
+        posterior_dir: the posterior mean, std and credible interval maps are written to
+                       posterior_dir/<trial id>.npz at the end (utils/posterior.py), None disables it
+        level: of the credible intervals
+    Only the parameters of Adam runs get noise here, the SGLD optimizer draws its own.
+    `enabled` switches the whole stage, e.g. SGLDES before its `switch` iteration.
+    """
+    def __init__(self, MCMC_iter=50, learning_rate=0.01, param_noise_sigma=2, param_noise=None, enabled=True,
+                 posterior_dir=None, level=0.95):
+        self.MCMC_iter = MCMC_iter
+        self.learning_rate = learning_rate
+        self.param_noise_sigma = param_noise_sigma
+        self.param_noise = ParamNoise() if param_noise is None else param_noise
+        self.enabled = enabled
+        self.posterior_dir = posterior_dir
+        self.level = level
+
+    def closure(self, engine, out):
+        if not (self.enabled and engine.burnin_over):
+            return
+        if engine.sgld_mean_each is None:
+            engine.sgld_mean = torch.zeros_like(out)
+            engine.sgld_mean_each = torch.zeros_like(out)
+
+        if engine.i % self.MCMC_iter == 0:
+            engine.sgld_mean.add_(out)
+            engine.sample_count += 1
+            engine.sgld_mean_psnr = engine.psnr(engine.sgld_mean, 1. / engine.sample_count)
+            engine.posterior.update(out)
+
+        engine.burnin_iter += 1
+        engine.sgld_mean_each.add_(out)
+        engine.sgld_mean_psnr_each = engine.psnr(engine.sgld_mean_each, 1. / engine.burnin_iter)
+        engine.posterior_each.update(out)
+
+    def step(self, engine, optimizer):
+        if self.enabled and isinstance(optimizer, torch.optim.Adam):
+            self.param_noise(engine.model.parameters(), self.param_noise_sigma * self.learning_rate)
+
+    def end(self, engine):
+        if self.posterior_dir is not None and engine.posterior_each.count() > 0:
+            filename = save_posterior(trial_metrics_path(self.posterior_dir), engine.posterior, engine.posterior_each, self.level)
+            print(f'Posterior maps ({engine.posterior_each.count()} samples) written to {filename}')
+
+
+class ChainSampler(Stage):
+    """
+    More SGLD chains from the evaluator's burn-in point and a convergence based end of the sampling
+
+    With the sampler's first sample the network is copied `chains - 1` times into one batched
+    network (utils/batched.py), so a single forward, backward and optimizer step per iteration
+    advances all the extra chains, each with its own input and parameter noise. Every MCMC_iter-th
+    output of every chain (the evaluator's network is chain 0) goes into the engine's SGLD mean and
+    posterior, pooled, and into per-chain statistics. Every `check_every` of those samples per chain:
+        rhat        `rhat_quantile` quantile over the pixels of the per-pixel R-hat
+        rhat_psnr   split R-hat of the chains' PSNR of the noisy image (a proxy, no ground truth needed)
+        ess         effective sample size of that PSNR over all chains
+    and engine.should_stop is set once both R-hats are at most rhat_threshold and ess at least ess_threshold.
+
+    Args:
+        sampler: the SGLDSampler, for MCMC_iter, `enabled` and the parameter noise
+        chains: number of chains, the evaluator's own included
+        rhat_threshold: see above
+        ess_threshold: see above
+        min_samples: samples per chain before the first check
+        check_every: samples per chain between checks (a host sync each)
+        rhat_quantile: see above, 1 for the worst pixel
+    Goes after the SGLDSampler. The chains only run the sampling phase, before it they cost nothing.
+    The Reporter's 'psnr' is then the pooled SGLD mean's, the final result, and 'psnr_chain0' chain 0's running mean.
+    """
+    def __init__(self, sampler, chains=4, rhat_threshold=1.05, ess_threshold=100, min_samples=20, check_every=10,
+                 rhat_quantile=0.99):
+        if chains < 2:
+            raise ValueError(f"chains must be at least 2, got {chains}")
+        if min_samples < 4:
+            raise ValueError(f"min_samples must be at least 4 for the split R-hat, got {min_samples}")
+        self.sampler = sampler
+        self.chains = chains
+        self.rhat_threshold = rhat_threshold
+        self.ess_threshold = ess_threshold
+        self.min_samples = min_samples
+        self.check_every = check_every
+        self.rhat_quantile = rhat_quantile
+        self.pending = None
+        self.reset()
+
+    def reset(self):
+        self.model = None
+        self.optimizer = None
+        self.param_noise = ParamNoise()
+        # (chains, C, H, W) statistics of the thinned samples and the PSNR proxy of each of them
+        self.stats = Welford()
+        self.traces = []
+        self.converged = False
+
+    def start(self, engine):
+        self.reset()
+        self.pending = None
+        engine.chains = self.chains
+
+    def spawn(self, engine, optimizer):
+        """
+        Batched copies of the evaluator's network and an optimizer of the same kind for them,
+        with the evaluator optimizer's current hyperparameters and state
+        """
+        optimizer = getattr(optimizer, 'optimizer', optimizer)
+        self.model = batch_models([engine.model] * (self.chains - 1)).to(engine.device)
+        defaults = {key: value for key, value in optimizer.param_groups[0].items() if key != 'params'}
+        if 'num_burn_in_steps' in defaults:
+            # the chains start sampling right away
+            defaults['num_burn_in_steps'] = 0
+        self.optimizer = type(optimizer)(self.model.parameters(), **defaults)
+        # Adam's moments / SGLD's preconditioner of chain 0, a fresh state would make the first steps of the others far too large
+        for p, state in zip(self.model.parameters(), batch_optimizer_state(engine.model, optimizer, self.chains - 1)):
+            if state:
+                self.optimizer.state[p] = state
+
+        inputs = engine.net_input_saved.expand(self.chains - 1, *engine.net_input_saved.shape[1:])
+        self.inputs = inputs
+        self.noise = torch.empty_like(inputs)
+        self.perturbed = torch.empty_like(inputs)
+        self.samples = torch.empty((self.chains,) + tuple(engine.last_out.shape), device=engine.device)
+
+        if self.pending is not None:
+            self.model.load_state_dict(self.pending['model'])
+            self.optimizer.load_state_dict(self.pending['optimizer'])
+            self.param_noise.load_state_dict(self.pending['param_noise'])
+            self.pending = None
+
+    def advance(self, engine):
+        """
+        One SGLD iteration of the extra chains, returns their detached outputs and MSEs
+        """
+        inputs = self.inputs
+        if engine.reg_noise_std > 0:
+            torch.add(inputs, self.noise.normal_(), alpha=engine.reg_noise_std, out=self.perturbed)
+            inputs = self.perturbed
+        with torch.enable_grad():
+            with autocast(engine.precision, engine.device):
+                out = self.model(inputs)
+            out = out.float()
+            # sum of the per chain MSEs, each chain only gets the gradient of its own
+            mse = (out - engine.img_noisy_torch).pow(2).flatten(1).mean(1)
+            self.optimizer.zero_grad(set_to_none=True)
+            mse.sum().backward()
+        self.optimizer.step()
+        if isinstance(self.optimizer, torch.optim.Adam):
+            self.param_noise(self.model.parameters(), self.sampler.param_noise_sigma * self.sampler.learning_rate)
+        return out.detach(), mse.detach()
+
+    def step(self, engine, optimizer):
+        if not self.sampler.enabled or engine.burnin_iter == 0:
+            return
+        if self.model is None:
+            self.spawn(engine, optimizer)
+        out, mse = self.advance(engine)
+        # engine.i already counts the iteration, the sampler took its sample at engine.i - 1
+        if (engine.i - 1) % self.sampler.MCMC_iter == 0:
+            self.collect(engine, out, mse)
+
+    def collect(self, engine, out, mse):
+        self.samples[0] = engine.last_out
+        self.samples[1:] = out
+        self.stats.update(self.samples)
+        self.traces.append(torch.cat([engine.latest_loss.view(1), mse]).log10_().mul_(-10))
+
+        # the sampler already added chain 0's sample
+        engine.sgld_mean.add_(out.sum(0))
+        for sample in out:
+            engine.posterior.update(sample)
+        engine.sample_count += self.chains - 1
+        engine.sgld_mean_psnr = engine.psnr(engine.sgld_mean, 1. / engine.sample_count)
+
+        n = self.stats.count()
+        if n >= self.min_samples and (n - self.min_samples) % self.check_every == 0:
+            self.check(engine)
+
+    def diagnose(self):
+        """
+        {'rhat', 'rhat_psnr', 'ess'} of the samples so far
+        """
+        rhat = pixel_rhat(self.stats).flatten()
+        rhat = rhat.kthvalue(max(1, math.ceil(self.rhat_quantile * rhat.numel()))).values.item()
+        # one transfer for the whole (chains, n) trace
+        traces = torch.stack(self.traces, 1).cpu().numpy()
+        return {'rhat': rhat, 'rhat_psnr': split_rhat(traces), 'ess': ess(traces)}
+
+    def check(self, engine):
+        diagnostics = self.diagnose()
+        engine.diagnostics = {'rhat': round(diagnostics['rhat'],5), 'rhat_psnr': round(diagnostics['rhat_psnr'],5), 'ess': round(diagnostics['ess'],1)}
+        if (diagnostics['rhat'] <= self.rhat_threshold and diagnostics['rhat_psnr'] <= self.rhat_threshold
+                and diagnostics['ess'] >= self.ess_threshold):
+            self.converged = True
+            engine.should_stop = True
+            print(f'SGLD chains converged after {engine.i} iterations ({self.stats.count()} samples per chain): {engine.diagnostics}')
+
+    def end(self, engine):
+        if self.stats.count() >= 4:
+            diagnostics = self.diagnose()
+            print(f'{self.chains} SGLD chains, {self.stats.count()} samples each, effective sample size {diagnostics["ess"]:.1f}, '
+                  f'R-hat {diagnostics["rhat"]:.4f} (pixels), {diagnostics["rhat_psnr"]:.4f} (PSNR)')
+
+    def state_dict(self):
+        return {
+            'model': None if self.model is None else self.model.state_dict(),
+            'optimizer': None if self.optimizer is None else self.optimizer.state_dict(),
+            'param_noise': self.param_noise.state_dict(),
+            'stats': self.stats.state_dict(),
+            'traces': self.traces,
+            'converged': self.converged,
+        }
+
+    def load_state_dict(self, state, device=None):
+        # the batched network is built from the restored evaluator network with the next step
+        self.model = None
+        self.pending = state if state['model'] is not None else None
+        self.stats.load_state_dict(state['stats'], device)
+        self.traces = [trace.to(device) for trace in state['traces']]
+        self.converged = state['converged']
+
+
+class SampleSink(Stage):
+    """
+    Every `thin`-th output of the sampling phase to sample_dir/<trial id>.samples, written by a
+    background thread (utils/samples.py), read back with utils.samples.read_samples
+
+    Args:
+        sample_dir: directory of the stores
+        thin: iterations between stored samples
+        capacity: most samples stored, the file is preallocated for all of them
+        dtype: 'float16' or 'float32' on disk
+    Goes after the SGLDSampler, it stores the iterations the sampler collects.
+    `resumed` (set when a checkpoint is loaded) keeps the samples stored before the checkpoint.
+    """
+    def __init__(self, sample_dir, thin=50, capacity=1000, dtype='float16'):
+        if dtype not in DTYPES:
+            raise ValueError(f"sample dtype must be one of {DTYPES}, got {dtype}")
+        self.path = trial_metrics_path(sample_dir) + '.samples'
+        self.thin = thin
+        self.capacity = capacity
+        self.dtype = dtype
+        self.torch_dtype = {'float16': torch.float16, 'float32': torch.float32}[dtype]
+        self.resumed = False
+        self.store = None
+
+    def start(self, engine):
+        self.resumed = False
+        self.store = None
+
+    def closure(self, engine, out):
+        if engine.burnin_iter == 0 or engine.i % self.thin != 0:
+            return
+        # opened with the first sample, the iteration of a resumed run is known by then
+        if self.store is None:
+            keep_before = engine.i if self.resumed else None
+            self.store = SampleStore(self.path, tuple(out.shape), self.capacity, self.dtype, keep_before=keep_before)
+        # cast on the device, half the transfer for float16
+        self.store.put(engine.i, out.to(self.torch_dtype).to('cpu', copy=True).numpy())
+
+    def end(self, engine):
+        if self.store is not None:
+            self.store.close()
+            print(f'{self.store.count} SGLD samples stored in {self.path}')
+
+
+class Reporter(Stage):
+    """
+    NNI intermediate results every `report_every` iterations and one metrics row per iteration
+
+    Args:
+        report_every: iterations between intermediate results (host syncs, besides the rare ES-WMV patience checks)
+        HPO: report the PSNR alone instead of a dict
+        report: called with each result, report_intermediate_result by default
+        metrics_dir: per iteration metrics under metrics_dir/<trial id> (utils/recorder.py), None disables them
+        hpo_every: iterations between the HPO results, sent after the iteration, None sends them
+                   every report_every with the others
+        hpo_metric: 'psnr_gt' reports the PSNR of the latest output for the whole run, 'sgld_mean'
+                    switches to the SGLD mean's once there are samples (SGLD-ES, MultiTrial and
+                    OneShot did), the curve then jumps at the end of the burn-in
+    """
+    def __init__(self, report_every=25, HPO=False, report=None, metrics_dir=None, hpo_every=None, hpo_metric='psnr_gt'):
+        if hpo_metric not in ('psnr_gt', 'sgld_mean'):
+            raise ValueError(f"hpo_metric must be 'psnr_gt' or 'sgld_mean', got {hpo_metric}")
+        self.report_every = report_every
+        self.HPO = HPO
+        self.hpo_metric = hpo_metric
+        self.report = report_intermediate_result if report is None else report
+        self.metrics_dir = metrics_dir
+        self.hpo_every = hpo_every
+        self.recorder = None
+
+    def start(self, engine):
+        if self.metrics_dir is not None:
+            self.recorder = MetricsRecorder(trial_metrics_path(self.metrics_dir))
+
+    def closure(self, engine, out):
+        # one row per iteration, the tensors stay on the device until the chunk is full
+        if self.recorder is not None:
+            self.recorder.record(
+                engine.i,
+                loss=engine.latest_loss,
+                psnr_gt=engine.psnr_gt,
+                var=engine.cur_var,
+                psnr_sgld=engine.sgld_mean_psnr_each,
+                )
+
+        if engine.i % self.report_every != 0:
+            return
+        if self.HPO:
+            if self.hpo_every is None:
+                self.report(round(self.hpo_result(engine).item(),5))
+            return
+        self.report(self.result(engine))
+
+    def step(self, engine, optimizer):
+        if self.HPO and self.hpo_every is not None and engine.i % self.hpo_every == 0:
+            psnr = self.hpo_result(engine)
+            if psnr is not None:
+                self.report(round(psnr.item(),5))
+
+    def hpo_result(self, engine):
+        """
+        The PSNR reported under HPO, None to skip the report
+        """
+        if self.hpo_metric == 'sgld_mean' and engine.sample_count > 0:
+            return engine.sgld_mean_psnr
+        return engine.psnr_gt
+
+    def result(self, engine):
+        result = {
+            'iteration': engine.i,
+            'loss': round(engine.latest_loss.item(),5),
+            'psnr_gt': round(engine.psnr_gt.item(),5),
+        }
+        if engine.burnin_iter > 0:
+            if engine.chains > 1:
+                # the pooled SGLD mean of the final result, chain 0's running mean apart
+                if engine.sample_count > 0:
+                    result['psnr'] = round(engine.sgld_mean_psnr.item(),5)
+                result['psnr_chain0'] = round(engine.sgld_mean_psnr_each.item(),5)
+            else:
+                result['psnr'] = round(engine.sgld_mean_psnr_each.item(),5)
+            # mean per-pixel posterior std, the width of the error bars
+            if engine.posterior_each.count() > 1:
+                result['std'] = round(engine.uncertainty().mean().item(),5)
+            # R-hat and effective sample size of the latest ChainSampler check
+            result.update(engine.diagnostics)
+        elif engine.cur_var is not None:
+            result['var'] = round(float(engine.cur_var),5)
+        return result
+
+    def end(self, engine):
+        if self.recorder is not None:
+            self.recorder.close()
+
+
+class FixedBurninReporter(Reporter):
+    """
+    Eval_SGLD's results: before the burn-in {'iteration', 'loss', 'psnr_noisy', 'psnr_gt'}, after it
+    {'iteration', 'loss', 'sample count', 'psnr_sgld_last', 'psnr_gt'}; under HPO the PSNR of the latest
+    output before the burn-in and the SGLD mean's once it has samples, every hpo_every iterations
+
+    Args:
+        burnin_iter: the FixedBurnin's
+        others as Reporter
+    """
+    def __init__(self, report_every=100, HPO=False, burnin_iter=1800, report=None, metrics_dir=None, hpo_every=None):
+        super().__init__(report_every, HPO, report=report, metrics_dir=metrics_dir, hpo_every=hpo_every)
+        self.burnin_iter = burnin_iter
+
+    def hpo_result(self, engine):
+        if engine.i < self.burnin_iter:
+            return engine.psnr_gt
+        if engine.i > self.burnin_iter and engine.sample_count > 0:
+            return engine.sgld_mean_psnr
+        return None
+
+    def result(self, engine):
+        if engine.burnin_iter > 0:
+            return {
+                'iteration': engine.i,
+                'loss': round(engine.latest_loss.item(),5),
+                'sample count': engine.burnin_iter,
+                'psnr_sgld_last': round(engine.sgld_mean_psnr_each.item(),5),
+                'psnr_gt': round(engine.psnr_gt.item(),5),
+            }
+        return {
+            'iteration': engine.i,
+            'loss': round(engine.latest_loss.item(),5),
+            'psnr_noisy': round(engine.psnr_noisy(engine.last_out).item(),5),
+            'psnr_gt': round(engine.psnr_gt.item(),5),
+        }
+
+
+class Snapshotter(Stage):
+    """
+    Progress panels every `show_every` iterations and checkpoints every `checkpoint_every`
+
+    Args:
+        show_every: iterations between progress panels
+        sample_show_every: iterations between panels once the burn-in is over, show_every if None
+        progress_dir: PNGs rendered by a background thread (utils/progress.py), None draws inline
+        HPO: no inline panels (the PNGs of progress_dir are still written)
+        plotting: False disables the panels
+        checkpoint_path: file of the background checkpoints (utils/checkpoint.py), None disables them
+        checkpoint_every: iterations between checkpoints
+        checkpoint_state: called for the state to save
+        inner_steps: checkpoints only between lightning steps of that many iterations
+    """
+    def __init__(self, show_every=200, sample_show_every=None, progress_dir=None, HPO=False, plotting=True,
+                 checkpoint_path=None, checkpoint_every=1000, checkpoint_state=None, inner_steps=1):
+        self.show_every = show_every
+        self.sample_show_every = sample_show_every
+        self.progress_dir = progress_dir
+        self.HPO = HPO
+        self.plotting = plotting
+        self.progress = None
+        self.checkpoint_path = checkpoint_path
+        self.checkpoint_every = checkpoint_every
+        self.checkpoint_state = checkpoint_state
+        self.inner_steps = inner_steps
+        self.checkpointer = None
+
+    def start(self, engine):
+        if self.progress_dir is not None:
+            self.progress = ProgressRenderer(self.progress_dir)
+        if self.checkpoint_path is not None:
+            self.checkpointer = AsyncCheckpointer(self.checkpoint_path)
+
+    def step(self, engine, optimizer):
+        show_every = self.show_every
+        if engine.burnin_over and self.sample_show_every is not None:
+            show_every = self.sample_show_every
+        if engine.i % show_every == 0:
+            self.plot(engine)
+
+        # only between lightning steps, a resumed run starts with a fresh step
+        if self.checkpointer is not None and engine.i % self.checkpoint_every == 0 and engine.i % self.inner_steps == 0:
+            self.checkpointer.save(self.checkpoint_state())
+
+    def plot(self, engine):
+        # nothing to show inline under HPO, with progress_dir the PNGs are still written
+        if not self.plotting or (self.HPO and self.progress is None):
+            return
+        label, denoised_img = engine.denoised()
+        panels = [
+            ("Original Image", engine.img_np),
+            (label, denoised_img),
+            ("Noisy Image", engine.img_noisy_np),
+        ]
+        uncertainty = engine.uncertainty()
+        if uncertainty is not None:
+            panels.append(("Posterior Std", uncertainty))
+        if self.progress is not None:
+            self.progress.push(engine.i, panels)
+        else:
+            show_panels(panels)
+
+    def end(self, engine):
+        self.plot(engine)
+        if self.progress is not None:
+            self.progress.close()
+        if self.checkpointer is not None:
+            self.checkpointer.close()
+
+
+class BatchedEngine(DIPEngine):
+    """
+    DIPEngine over N independent problems of one batched network (utils/batched.py), images and
+    outputs are (N, C, H, W) and the per-problem state is kept over N
+        burnin_over, burnin_epoch, cur_var          lists, set by BatchedESBurnin
+        burnin_mask                                 (N, 1, 1, 1), 1 while a problem collects samples
+        burnin_iter, sample_count, latest_loss,
+        psnr_gt, sgld_mean_psnr(_each)              (N,) device tensors
+
+    Args:
+        phantom: (N, C, H, W) ground truths, None without any (no PSNR, e.g. the service)
+        phantom_noisy: (N, C, H, W) images the networks are fitted to
+        generators: N torch.Generators the network inputs are drawn from, the global RNG if None
+        others as DIPEngine
+    """
+    def __init__(self, phantom, phantom_noisy, stages=(), input_depth=1, reg_noise_std=1./30., precision=32, generators=None):
+        self.stages = list(stages)
+        self.input_depth = input_depth
+        self.reg_noise_std = float(reg_noise_std)
+        self.precision = check_precision(precision)
+        self.model = None
+        self.device = torch.device('cpu')
+
+        self.img_np = None if phantom is None else np.float32(phantom)
+        self.img_noisy_np = np.float32(phantom_noisy)
+        self.img_torch = None if phantom is None else torch.tensor(self.img_np, dtype=torch.float32)
+        self.img_noisy_torch = torch.tensor(self.img_noisy_np, dtype=torch.float32)
+        self.num_problems = len(self.img_noisy_np)
+        if generators is None:
+            generators = [None] * self.num_problems
+        if len(generators) != self.num_problems:
+            raise ValueError(f"got {len(generators)} generators for {self.num_problems} problems")
+        # get_noise takes the spatial size as (H, W)
+        size = tuple(self.img_noisy_np.shape[-2:])
+        self.net_input = torch.cat([get_noise(input_depth, 'noise', size, generator=generator) for generator in generators]).float().detach()
+        self.net_input_saved = self.net_input
+        self.scratch = None
+        self.reset()
+
+    def reset(self):
+        n = self.num_problems
+        self.i = 0
+        self.total_loss = None
+        self.sample_loss = None
+        self.latest_loss = None
+        self.last_out = None
+        self.psnr_gt = None
+        self.burnin_over = [False] * n
+        self.burnin_epoch = [None] * n
+        self.cur_var = [None] * n
+        # per problem SGLD accumulators, problems still in burn-in are masked out
+        self.burnin_mask = torch.zeros(n, 1, 1, 1, device=self.device)
+        self.burnin_iter = torch.zeros(n, device=self.device)
+        self.sample_count = torch.zeros(n, device=self.device)
+        self.sgld_mean = None
+        self.sgld_mean_each = None
+        self.sgld_mean_psnr = None
+        self.sgld_mean_psnr_each = None
+        # per-pixel posterior of the MCMC_iter-th samples, per problem through the mask
+        self.posterior = Welford()
+        self.posterior_each = Welford()
+        self.should_stop = False
+        self.diagnostics = {}
+
+    def measure(self, out):
+        # sum of the per problem MSEs, each network only gets the gradient of its own problem
+        self.sample_loss = torch.mean((out - self.img_noisy_torch).flatten(1) ** 2, dim=1)
+        self.total_loss = self.sample_loss.sum()
+        self.latest_loss = self.sample_loss.detach()
+        out = out.detach()
+        self.last_out = out
+        if self.img_torch is not None:
+            self.psnr_gt = batch_psnr(self.img_torch, out)
+        return out
+
+    def psnr(self, img, scale=1.):
+        """
+        (N,) PSNRs of scale * img against the ground truths, None without them
+        """
+        if self.img_torch is None:
+            return None
+        return batch_psnr(self.img_torch, img * scale)
+
+    @staticmethod
+    def per_problem(count):
+        """
+        1 / count as an (N, 1, 1, 1) scale, 1 where the count is still 0
+        """
+        return 1. / count.clamp(min=1).view(-1, 1, 1, 1)
+
+    def current_psnr(self):
+        """
+        SGLD mean PSNR for the problems that collected samples, PSNR of the latest output for the rest
+        """
+        if self.sgld_mean_psnr is None:
+            return self.psnr_gt
+        return torch.where(self.sample_count > 0, self.sgld_mean_psnr, self.psnr_gt)
+
+    def denoised(self):
+        """
+        ([label per problem], (N, C, H, W) images): the SGLD means of the problems sampling, else the latest outputs
+        """
+        if self.last_out is None:
+            with torch.no_grad():
+                self.last_out = self.forward().detach()
+        denoised = self.last_out
+        has_mean = self.burnin_iter > 0
+        if has_mean.any():
+            sgld_mean = self.sgld_mean_each * self.per_problem(self.burnin_iter)
+            denoised = torch.where(has_mean.view(-1, 1, 1, 1), sgld_mean, denoised)
+        return ["SGLD Mean" if mean else "Denoised Image" for mean in has_mean.tolist()], denoised
+
+    def uncertainty(self):
+        """
+        (N, C, H, W) posterior std of the MCMC_iter-th samples, None before every problem has two
+        """
+        if self.posterior.count() < 2:
+            return None
+        return self.posterior.std()
+
+
+class BatchedESBurnin(Stage):
+    """
+    ESBurnin per problem of a BatchedEngine, the windowed variances stay on the device and each
+    stopper only syncs when its patience may have run out
+
+    Args:
+        early_stoppers: one optimizer/early_stopper.ES per problem
+    """
+    def __init__(self, early_stoppers):
+        self.early_stoppers = early_stoppers
+
+    def closure(self, engine, out):
+        active = [k for k in range(engine.num_problems) if not engine.burnin_over[k]]
+        if not active:
+            return
+        for k in active:
+            self.early_stoppers[k].update_img_collection(out[k].reshape(-1))
+
+        # every active problem has seen the same number of images
+        first = self.early_stoppers[active[0]]
+        if first.n_imgs < first.buffer_size:
+            return
+
+        for k in active:
+            early_stopper = self.early_stoppers[k]
+            early_stopper.cur_var = early_stopper.windowed_variance()
+            early_stopper.pending.append(early_stopper.cur_var)
+            early_stopper.check_stop(early_stopper.cur_var, engine.i)
+            engine.cur_var[k] = early_stopper.cur_var
+            if early_stopper.burnin_over:
+                engine.burnin_over[k] = True
+                engine.burnin_epoch[k] = engine.i
+                engine.burnin_mask[k] = 1.
+
+    def end(self, engine):
+        for early_stopper in self.early_stoppers:
+            early_stopper.flush()
+
+
+class BatchedSGLDSampler(Stage):
+    """
+    SGLDSampler of a BatchedEngine, the problems still burning in are masked out of the SGLD means
+    and the posterior
+
+    Args:
+        MCMC_iter, learning_rate, param_noise_sigma, param_noise: as SGLDSampler
+        num_samples: a problem stops collecting after this many MCMC_iter-th samples and the engine
+                     asks to stop once all of them have theirs, None collects until the end
+    The noise is iid over the batched weights, so every problem gets its own draw.
+    """
+    def __init__(self, MCMC_iter=50, learning_rate=0.01, param_noise_sigma=2, param_noise=None, num_samples=None):
+        self.MCMC_iter = MCMC_iter
+        self.learning_rate = learning_rate
+        self.param_noise_sigma = param_noise_sigma
+        self.param_noise = ParamNoise() if param_noise is None else param_noise
+        self.num_samples = num_samples
+
+    def closure(self, engine, out):
+        if not any(engine.burnin_over):
+            return
+        if engine.sgld_mean is None:
+            engine.sgld_mean = torch.zeros_like(out)
+            engine.sgld_mean_each = torch.zeros_like(out)
+
+        mask = engine.burnin_mask
+        thinned = engine.i % self.MCMC_iter == 0
+        if thinned:
+            engine.sgld_mean.addcmul_(out, mask)
+            engine.posterior.update(out, mask)
+            engine.sample_count += mask.view(-1)
+            engine.sgld_mean_psnr = engine.psnr(engine.sgld_mean, engine.per_problem(engine.sample_count))
+
+        engine.burnin_iter += mask.view(-1)
+        engine.sgld_mean_each.addcmul_(out, mask)
+        engine.sgld_mean_psnr_each = engine.psnr(engine.sgld_mean_each, engine.per_problem(engine.burnin_iter))
+
+        if thinned and self.num_samples is not None:
+            mask[engine.sample_count >= self.num_samples] = 0.
+            # every problem burned in and has its samples
+            if engine.sample_count.min().item() >= self.num_samples:
+                engine.should_stop = True
+
+    def step(self, engine, optimizer):
+        if isinstance(optimizer, torch.optim.Adam):
+            self.param_noise(engine.model.parameters(), self.param_noise_sigma * self.learning_rate)
+
+
+class BatchedReporter(Stage):
+    """
+    Eval_Batched's NNI intermediate results every `report_every` iterations, lists over the problems
+    with their mean PSNR as 'default', the mean PSNR alone (after the iteration) under HPO
+
+    Args:
+        report_every, HPO, report: as Reporter
+    """
+    def __init__(self, report_every=25, HPO=False, report=None):
+        self.report_every = report_every
+        self.HPO = HPO
+        self.report = report_intermediate_result if report is None else report
+
+    def closure(self, engine, out):
+        if self.HPO or engine.i % self.report_every != 0:
+            return
+        psnr = engine.current_psnr()
+        self.report({
+            'default': round(psnr.mean().item(),5),
+            'iteration': engine.i,
+            'loss': [round(x,5) for x in engine.latest_loss.tolist()],
+            'psnr_gt': [round(x,5) for x in engine.psnr_gt.tolist()],
+            'psnr': [round(x,5) for x in psnr.tolist()],
+            'var': [None if v is None else round(float(v),5) for v in engine.cur_var],
+            'burnin_iter': engine.burnin_epoch,
+            })
+
+    def step(self, engine, optimizer):
+        if self.HPO and engine.i % self.report_every == 0:
+            self.report(round(engine.current_psnr().mean().item(),5))
+
+
+class BatchedSnapshotter(Stage):
+    """
+    Progress panels of a BatchedEngine every `show_every` iterations, one row per problem
+
+    Args:
+        show_every: iterations between progress panels
+        progress_dir: PNGs rendered by a background thread, tagged p<problem>, None draws inline
+        HPO: no inline panels (the PNGs of progress_dir are still written)
+    """
+    def __init__(self, show_every=200, progress_dir=None, HPO=False):
+        self.show_every = show_every
+        self.progress_dir = progress_dir
+        self.HPO = HPO
+        self.progress = None
+
+    def start(self, engine):
+        if self.progress_dir is not None:
+            self.progress = ProgressRenderer(self.progress_dir, max_queue=max(8, 2 * engine.num_problems))
+
+    def step(self, engine, optimizer):
+        if engine.i % self.show_every == 0:
+            self.plot(engine)
+
+    def plot(self, engine):
+        if self.HPO and self.progress is None:
+            return
+        labels, denoised = engine.denoised()
+        # one device to host copy for the whole batch
+        denoised = to_host(denoised, self.progress.max_size if self.progress is not None else None)
+        rows = [[
+            ("Original Image", engine.img_np[k]),
+            (labels[k], denoised[k]),
+            ("Noisy Image", engine.img_noisy_np[k]),
+            ] for k in range(engine.num_problems)]
+
+        if self.progress is not None:
+            for k, panels in enumerate(rows):
+                self.progress.push(engine.i, panels, tag=f'p{k}')
+            return
+        show_rows(rows)
+
+    def end(self, engine):
+        self.plot(engine)
+        if self.progress is not None:
+            self.progress.close()
+
+
+def engine_view(name):
+    return property(lambda self: getattr(self.engine, name))
+
+
+class EngineAdapter:
+    """
+    Lightning side shared by the evaluators, mixed into a LightningModule that sets
+        self.engine         DIPEngine
+        self.snapshotter    its Snapshotter
+        self.phantom, self.learning_rate, self.weight_decay, self.optimizer_name
+    The engine's state reads under the evaluators' usual names (self.i, self.psnr_gt, ...)
+    """
+    i = engine_view('i')
+    total_loss = engine_view('total_loss')
+    latest_loss = engine_view('latest_loss')
+    last_out = engine_view('last_out')
+    psnr_gt = engine_view('psnr_gt')
+    burnin_over = engine_view('burnin_over')
+    cur_var = engine_view('cur_var')
+    sample_count = engine_view('sample_count')
+    sgld_mean = engine_view('sgld_mean')
+    sgld_mean_each = engine_view('sgld_mean_each')
+    sgld_mean_psnr = engine_view('sgld_mean_psnr')
+    sgld_mean_psnr_each = engine_view('sgld_mean_psnr_each')
+    img_np = engine_view('img_np')
+    img_noisy_np = engine_view('img_noisy_np')
+    img_torch = engine_view('img_torch')
+    img_noisy_torch = engine_view('img_noisy_torch')
+    net_input = engine_view('net_input')
+    posterior = engine_view('posterior')
+    posterior_each = engine_view('posterior_each')
+
+    def sgld_burn_in_steps(self):
+        # iterations without Langevin noise for optimizer='sgld'
+        return 0
+
+    def configure_optimizers(self):
+        """
+        optimizer='adam': Adam with the SGLD noise added by the engine's SGLDSampler
+        optimizer='sgld': the preconditioned SGLD optimizer of optimizer/SGLD.py
+            - https://pysgmcmc.readthedocs.io/en/pytorch/_modules/pysgmcmc/optimizers/sgld.html
+        """
+        if self.optimizer_name == 'sgld':
+            # the Langevin noise is part of the SGLD step, so the sampler adds none
+            return SGLD(self.model.parameters(), lr=self.learning_rate, weight_decay=self.weight_decay, num_burn_in_steps=self.sgld_burn_in_steps())
+        return torch.optim.Adam(self.model.parameters(), lr=self.learning_rate, weight_decay=self.weight_decay)
+
+    def forward(self, net_input=None):
+        if net_input is None:
+            return self.engine.forward()
+        return self.engine.run_model(net_input)
+
+    def run_model(self, net_input):
+        return self.engine.run_model(net_input)
+
+    def closure(self):
+        return self.engine.closure()
+
+    def on_train_batch_end(self, outputs, batch, batch_idx, *args, **kwargs):
+        """
+        SGLD noise, plotting and checkpoints, stop once a stage asks for it (converged chains)
+        """
+        self.engine.step(self.optimizers())
+        if self.engine.should_stop:
+            self.trainer.should_stop = True
+
+    def plot_progress(self):
+        self.snapshotter.plot(self.engine)
+
+    def common_dataloader(self):
+        dataset = SingleImageDataset(self.phantom, 1)
+        return DataLoader(dataset, batch_size=1)
+
+    def train_dataloader(self):
+        return self.common_dataloader()
+
+    def optimizer_zero_grad(self, epoch, batch_idx, optimizer, opt_idx):
+        # Not sure if this is the default logic in the nni.retiarii.evaluator.pytorch.LightningModule
+        # needed to modify so it can accept the opt_idx argument
+        optimizer.zero_grad()
+
+    def configure_gradient_clipping(self, optimizer, opt_idx, gradient_clip_val, gradient_clip_algorithm):
+        # Not sure if this is the default logic in the nni.retiarii.evaluator.pytorch.LightningModule
+        # needed to modify so it can accept the opt_idx argument
+        self.clip_gradients(
+            optimizer,
+            gradient_clip_val=gradient_clip_val,
+            gradient_clip_algorithm=gradient_clip_algorithm
+        )
+
+
+def benchmark(model, phantom, phantom_noisy, steps=200, warmup=20, device='cpu', learning_rate=0.01, precision=32):
+    """
+    Seconds per DIP iteration of the engine (forward, loss, backward, Adam step, sampler and reporter)
+    with the burn-in over from the start, i.e. the most expensive phase of a run
+    """
+    sampler = SGLDSampler(MCMC_iter=50, learning_rate=learning_rate)
+    engine = DIPEngine(phantom, phantom_noisy, stages=[
+        FixedBurnin(-1),
+        sampler,
+        Reporter(report_every=steps + warmup + 1, report=lambda result: None),
+    ], precision=precision)
+    engine.to(model, device)
+    engine.start()
+    optimizer = torch.optim.Adam(model.parameters(), lr=learning_rate)
+
+    def iteration():
+        optimizer.zero_grad(set_to_none=True)
+        engine.closure().backward()
+        optimizer.step()
+        engine.step(optimizer)
+
+    def sync():
+        if engine.device.type == 'cuda':
+            torch.cuda.synchronize(engine.device)
+
+    for _ in range(warmup):
+        iteration()
+    sync()
+    start = time.perf_counter()
+    for _ in range(steps):
+        iteration()
+    sync()
+    engine.end()
+    return (time.perf_counter() - start) / steps
+
+if __name__ == '__main__':
+    import argparse
+
+    from search_space.unet import UNetBasic
+
+    parser = argparse.ArgumentParser(description='Time per iteration of the DIP engine shared by the evaluators')
+    parser.add_argument('--depth', type=int, default=4)
+    parser.add_argument('--resolution', type=int, default=256)
+    parser.add_argument('--steps', type=int, default=200)
+    parser.add_argument('--precision', default='32')
+    parser.add_argument('--device', default='cuda' if torch.cuda.is_available() else 'cpu')
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    phantom = rng.random((1, args.resolution, args.resolution), dtype=np.float32)
+    phantom_noisy = np.clip(phantom + 0.09 * rng.standard_normal(phantom.shape, dtype=np.float32), 0, 1)
+    seconds = benchmark(UNetBasic(depth=args.depth), phantom, phantom_noisy, steps=args.steps, device=args.device, precision=args.precision)
+    print(f'{seconds * 1e3:.2f} ms per iteration, {1 / seconds:.1f} iterations/s ({args.device}, {args.resolution}x{args.resolution})')
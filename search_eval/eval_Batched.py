@@ -0,0 +1,153 @@
+import numpy as np
+
+from nni import trace, report_final_result
+from nni.retiarii.evaluator.pytorch import LightningModule
+
+import torch
+
+from typing import Any
+
+from .engine import BatchedEngine, EngineAdapter, BatchedESBurnin, BatchedSGLDSampler, BatchedReporter, BatchedSnapshotter, engine_view
+from .utils.batched import batch_models
+from .optimizer.early_stopper import ES
+
+torch.backends.cudnn.enabled = True
+torch.backends.cudnn.benchmark =True
+
+@trace
+class Eval_Batched(EngineAdapter, LightningModule):
+    """
+    Same DIP + SGLD + ES-WMV loop as Eval_MT, but over N independent problems at once
+
+    Each problem (a phantom, a noise draw of it, or just another input seed) gets its own copy
+    of the network, the N copies are merged into grouped layers by utils.batched.batch_models
+    so one forward pass advances all of them. PSNR, ES-WMV burn-in and the SGLD means are
+    tracked per problem, by the Batched* stages of engine.py.
+
+    Args:
+        phantom: (N, 1, H, W) ground truths, or a single (1, H, W) phantom shared by all problems
+        phantom_noisy: (N, 1, H, W) noisy images, or a single (1, H, W) one shared by all problems
+        seeds: optional list of N seeds for the network inputs (e.g. to compare input seeds
+               on the same noisy image), drawn from a local generator each so the global RNG
+               is left alone, the inputs come from the global RNG otherwise
+    """
+    burnin_epoch = engine_view('burnin_epoch')
+    burnin_mask = engine_view('burnin_mask')
+
+    def __init__(self,
+                 phantom=None,
+                 phantom_noisy=None,
+                 seeds=None,
+
+                 learning_rate=0.01,
+                 buffer_size=100,
+                 patience=1000,
+                 weight_decay=5e-8,
+                 optimizer='adam',
+
+                 MCMC_iter=50,
+                 show_every=200,
+                 report_every=25,
+                 progress_dir=None,
+
+                 HPO=False,
+                 precision=32
+                ):
+        super().__init__()
+        self.automatic_optimization = True
+        self.HPO = HPO
+
+        self.learning_rate = learning_rate
+        self.weight_decay = weight_decay
+        if optimizer not in ('adam', 'sgld'):
+            raise ValueError(f"optimizer must be 'adam' or 'sgld', got {optimizer}")
+        self.optimizer_name = optimizer
+        self.MCMC_iter = MCMC_iter
+
+        # image and noise
+        # move to float 32 instead of float 64
+        img_np = self.as_batch(phantom, 'phantom')
+        img_noisy_np = self.as_batch(phantom_noisy, 'phantom_noisy')
+        self.num_problems = max(len(img_np), len(img_noisy_np), len(seeds) if seeds is not None else 1)
+        if seeds is not None and len(seeds) != self.num_problems:
+            raise ValueError(f"got {len(seeds)} seeds for {self.num_problems} problems")
+        self.seeds = seeds
+        self.phantom = self.broadcast(img_np, 'phantom')
+        generators = None
+        if seeds is not None:
+            generators = [torch.Generator().manual_seed(seed) for seed in seeds]
+
+        # burnin-end criteria, one ES-WMV per problem
+        self.patience = patience
+        self.buffer_size = buffer_size
+        self.early_stoppers = torch.nn.ModuleList([ES(buffer_size=buffer_size, patience=patience) for _ in range(self.num_problems)])
+
+        # the DIP iteration over all problems, see BatchedEngine in engine.py
+        #   progress_dir: progress PNGs rendered by a background thread instead of inline plots
+        #   precision: 32 or 'bf16' (autocast of the network), see utils/precision.py
+        self.sampler = BatchedSGLDSampler(MCMC_iter, learning_rate)
+        self.snapshotter = BatchedSnapshotter(show_every, progress_dir=progress_dir, HPO=HPO)
+        self.engine = BatchedEngine(self.phantom, self.broadcast(img_noisy_np, 'phantom_noisy'), stages=[
+            BatchedESBurnin(self.early_stoppers),
+            self.sampler,
+            BatchedReporter(report_every, HPO),
+            self.snapshotter,
+        ], precision=precision, generators=generators)
+
+    def as_batch(self, img, name):
+        img = np.float32(img)
+        if img.ndim == 2:
+            img = img[None, None]
+        elif img.ndim == 3:
+            img = img[None]
+        if img.ndim != 4:
+            raise ValueError(f"{name} must be (H, W), (1, H, W) or (N, 1, H, W), got shape {img.shape}")
+        return img
+
+    def broadcast(self, img, name):
+        if len(img) == self.num_problems:
+            return img
+        if len(img) == 1:
+            return np.repeat(img, self.num_problems, axis=0)
+        raise ValueError(f"{name} holds {len(img)} images for {self.num_problems} problems")
+
+    def set_model(self, model_cls):
+        # independent initialisations, one network per problem
+        self.model = batch_models([model_cls() for _ in range(self.num_problems)])
+
+    def on_train_start(self):
+        """
+        Move all tensors to the GPU to begin training
+        """
+        self.engine.to(self.model, self.device)
+        self.engine.start()
+
+        # bon voyage
+        self.plot_progress()
+
+    def current_psnr(self):
+        return self.engine.current_psnr()
+
+    def training_step(self, batch: Any, batch_idx: int) -> Any:
+        """
+        Oh the places you'll go
+        """
+        loss = self.closure()
+        return {"loss": loss}
+
+    def on_train_end(self, **kwargs: Any):
+        """
+        Report final metrics and display the results
+        """
+        self.engine.end()
+        final_psnr = [round(x,5) for x in self.current_psnr().tolist()]
+        results = {
+            'default': round(float(np.mean(final_psnr)),5),
+            'psnr': final_psnr,
+            'burnin_iter': self.burnin_epoch,
+            }
+        if not self.HPO:
+            for k in range(self.num_problems):
+                label = "SGLD mean PSNR" if self.sample_count[k] > 0 else "PSNR"
+                print(f"Problem {k}: final {label}: {final_psnr[k]}, burn-in ended at iter {self.burnin_epoch[k]}")
+        report_final_result(results)
@@ -1,51 +1,76 @@
-import matplotlib.pyplot as plt
-import numpy as np
-
-from nni import trace, report_intermediate_result, report_final_result
+from nni import trace, report_final_result
 from nni.retiarii.evaluator.pytorch import LightningModule
-from nni.retiarii.evaluator.pytorch.lightning import DataLoader
-
-from skimage.metrics import peak_signal_noise_ratio as compare_psnr
 
 import torch
-from torch.optim import Optimizer
-from torch import tensor
 
+import os
 from typing import Any
 
-from .utils.common_utils import get_noise
-from .optimizer.SingleImageDataset import SingleImageDataset
+from .engine import DIPEngine, EngineAdapter, ESBurnin, SGLDSampler, ChainSampler, SampleSink, Reporter, Snapshotter, STATE_ATTRS
+from .utils.checkpoint import load_checkpoint, rng_state, set_rng_state
+from .optimizer import early_stopper
 
 torch.backends.cudnn.enabled = True
 torch.backends.cudnn.benchmark =True
-dtype = torch.cuda.FloatTensor
+
+# evaluator attributes saved in a checkpoint next to the engine's STATE_ATTRS,
+# besides the model, optimizers, stopper and RNG
+CHECKPOINT_ATTRS = ('SGLD_regularize',)
 
 @trace
-class SGLDES(LightningModule):
-    def __init__(self, 
+class SGLDES(EngineAdapter, LightningModule):
+    def __init__(self,
                  phantom=None,
                  phantom_noisy=None,
-                 
+
                  learning_rate=0.01,
                  buffer_size=100,
                  patience=1000,
                  weight_decay = 5e-8,
+                 optimizer='adam',
 
-                 MCMC_iter=50, 
+                 MCMC_iter=50,
                  show_every=200,
                  report_every=25,
+                 progress_dir=None,
+                 metrics_dir=None,
+                 posterior_dir=None,
+                 sample_dir=None,
+                 sample_thin=None,
+                 sample_capacity=1000,
+                 sample_dtype='float16',
+                 chains=1,
+                 rhat_threshold=1.05,
+                 ess_threshold=100,
 
                  model_cls=None,
                  HPO=False,
+                 hpo_metric='psnr_gt',
                  NAS=False,
                  OneShot=False,
                  SGLD_regularize=True,
                  ES=True,
                  switch=None,
-                 plotting=True
+                 plotting=True,
+                 inner_steps=1,
+                 checkpoint_dir=None,
+                 checkpoint_every=1000,
+                 resume=True,
+                 keep_checkpoint=False,
+                 precision=32
                 ):
         super().__init__()
-        self.automatic_optimization = True
+        if inner_steps < 1:
+            raise ValueError(f"inner_steps must be at least 1, got {inner_steps}")
+        if inner_steps > 1 and NAS and OneShot:
+            raise ValueError("inner_steps > 1 is not supported with one-shot strategies, they drive the optimizer themselves")
+        if chains > 1 and NAS and OneShot:
+            raise ValueError("chains > 1 is not supported with one-shot strategies, their supernets can't be batched into chains")
+
+        # fused loop: each lightning step runs `inner_steps` DIP iterations
+        # so the trainer's max_epochs becomes total_iterations // inner_steps
+        self.inner_steps = inner_steps
+        self.automatic_optimization = inner_steps == 1
         self.HPO = HPO
         self.NAS = NAS
         self.OneShot = OneShot
@@ -54,81 +79,101 @@ class SGLDES(LightningModule):
         self.ES = ES
         self.plotting = plotting
 
-        # network input
-        self.input_depth = 1
-
         if NAS and OneShot:
             self.model_cls = model_cls
-        
+
         if not NAS:
-            if model_cls is None:
+            model = model_cls
+            if model is None:
                 model = torch.hub.load('mateuszbuda/brain-segmentation-pytorch', 'unet', in_channels=1, out_channels=1, init_features=64, pretrained=False)
             self.model_cls = model
             self.model = model
 
-        # loss
-        self.criteria = torch.nn.MSELoss().type(dtype)
-
-        # "Early Stopper" Trigger
-        # modifying an early stopper for DIP to determin more programatically when the SGLD burn in period is finished
-        self.reg_noise_std = tensor(1./30.)
         self.learning_rate = learning_rate
-        self.roll_back = True
         self.weight_decay = weight_decay
-        self.show_every =  show_every
-        self.report_every = report_every
+        if optimizer not in ('adam', 'sgld'):
+            raise ValueError(f"optimizer must be 'adam' or 'sgld', got {optimizer}")
+        self.optimizer_name = optimizer
+        self.phantom = phantom
+
+        # checkpoints of the whole evaluator state every `checkpoint_every` iterations,
+        # written by a background thread; with resume an existing checkpoint is picked up
+        if checkpoint_every % inner_steps != 0:
+            raise ValueError(f"checkpoint_every must be a multiple of inner_steps, got {checkpoint_every} and {inner_steps}")
+        # once the run completes its checkpoint is removed (unless keep_checkpoint), a later run with the
+        # same checkpoint_dir starts over instead of resuming at the end and reporting the old result
+        self.checkpoint_path = None if checkpoint_dir is None else os.path.join(checkpoint_dir, 'checkpoint.pt')
+        self.resume = resume
+        self.keep_checkpoint = keep_checkpoint
 
         # SGLD Optimization
         # SGLD takes the average of every n samples after the burn in period as the final reconstruction
-        self.sgld_mean_each = 0
         self.MCMC_iter = MCMC_iter # here is the n from the above comment
-        self.sgld_mean = 0
-        self.param_noise_sigma = 2
-
-
 
-        
         # burnin-end criteria
-        self.img_collection = []
-        self.variance_history = []
+        # modifying an early stopper for DIP to determin more programatically when the SGLD burn in period is finished
+        # ring buffer ES-WMV, the windowed variance updates in O(H*W) per iteration
         self.patience = patience
-        self.wait_count = 0
-        self.best_score = float('inf')
-        self.best_epoch = 0
-        self.img_collection = []
-        self.burnin_over = False
         self.buffer_size = buffer_size
-        self.cur_var = None
-
-        # image and noise
-        # move to float 32 instead of float 64
-
-        self.phantom = np.float32(phantom)
-        self.img_np = np.float32(phantom)
-        self.img_noisy_np = np.float32(phantom_noisy)
-
-        self.img_noisy_torch = torch.tensor(self.img_noisy_np, dtype=torch.float32).unsqueeze(0)
-        self.net_input = get_noise(self.input_depth, 'noise', (self.img_np.shape[-2:][1], self.img_np.shape[-2:][0])).type(self.dtype).detach()
-
-    def configure_optimizers(self) -> Optimizer:
-        """
-        We are doing a manual implementation of the SGLD optimizer
-        There is a SGLD optimizer that can be found here:
-            - https://pysgmcmc.readthedocs.io/en/pytorch/_modules/pysgmcmc/optimizers/sgld.html
-            - Implementing this would greatly affect the training step
-                - But could it work?? :`( I couldn't figure it out
-        """
-        return torch.optim.Adam(self.model.parameters(), lr=self.learning_rate, weight_decay=self.weight_decay)
+        self.early_stopper = early_stopper.ES(buffer_size=buffer_size, patience=patience,
+                                                 history_size=None if metrics_dir is None else 1000)
+        self.variance_history = self.early_stopper.variance_history
+
+        # the DIP iteration itself, see engine.py
+        #   progress_dir: progress PNGs rendered by a background thread instead of inline plots
+        #   metrics_dir: per iteration metrics, written in chunks under metrics_dir/<trial id>
+        #   posterior_dir: per-pixel posterior mean, std and 95% credible intervals of the SGLD samples, written at the end
+        #   sample_dir: every sample_thin-th SGLD sample (MCMC_iter by default), at most sample_capacity of them,
+        #               to a memory-mapped sample_dir/<trial id>.samples (utils/samples.py), as sample_dtype
+        #   chains: SGLD chains from the ES burn-in point, batched on the device; with more than one the sampling
+        #           stops once R-hat of the pixels and of the PSNR proxy <= rhat_threshold and ESS >= ess_threshold
+        #           instead of running until max_epochs, their samples are pooled into the SGLD mean
+        #   precision: 32 or 'bf16' (autocast of the network), see utils/precision.py
+        #   hpo_metric: PSNR reported under HPO, 'psnr_gt' or 'sgld_mean' (switches to the SGLD mean's after the burn-in), see engine.Reporter
+        # the sampler (SGLD means and noise) only runs while SGLD_regularize
+        self.sampler = SGLDSampler(MCMC_iter, learning_rate, posterior_dir=posterior_dir, enabled=SGLD_regularize)
+        self.snapshotter = Snapshotter(
+            show_every,
+            progress_dir=progress_dir,
+            HPO=HPO,
+            plotting=plotting,
+            checkpoint_path=self.checkpoint_path,
+            checkpoint_every=checkpoint_every,
+            checkpoint_state=self.checkpoint_state,
+            inner_steps=inner_steps,
+            )
+        self.sample_sink = None
+        if sample_dir is not None:
+            self.sample_sink = SampleSink(sample_dir, sample_thin or MCMC_iter, sample_capacity, sample_dtype)
+        self.chain_sampler = None
+        if chains > 1:
+            self.chain_sampler = ChainSampler(self.sampler, chains, rhat_threshold, ess_threshold)
+        stages = [ESBurnin(self.early_stopper)] if ES else []
+        stages += [self.sampler]
+        stages += [self.chain_sampler] if self.chain_sampler is not None else []
+        stages += [self.sample_sink] if self.sample_sink is not None else []
+        self.engine = DIPEngine(phantom, phantom_noisy, stages=stages + [
+            Reporter(report_every, HPO, metrics_dir=metrics_dir, hpo_metric=hpo_metric),
+            self.snapshotter,
+        ], precision=precision)
+
+    def sgld_burn_in_steps(self):
+        # noise from the first step when regularizing, from `switch` on otherwise
+        if self.SGLD_regularize:
+            return 0
+        if self.switch is not None:
+            return self.switch
+        return float('inf')
 
     def set_model(self, model):
         if self.NAS and self.OneShot:
             if self.model_cls is not None:
                 self.model = self.model_cls
             self.model = model
-        
+
         if self.NAS and not self.OneShot:
             self.model = model()
-        
+
         if not self.NAS:
             pass
 
@@ -138,127 +183,24 @@ class SGLDES(LightningModule):
         Initialize Iterators
         Set Sail
         """
-        # move to device
-        self.model.to(self.device)
-        self.net_input = self.net_input.to(self.device)
-        self.img_noisy_torch = self.img_noisy_torch.to(self.device)
-        self.reg_noise_std = self.reg_noise_std.to(self.device)
-
-        self.net_input_saved = self.net_input.clone().to(self.device)
-        self.noise = self.net_input.clone().to(self.device)
-        
-        # Initialize Iterations
-        self.i=0
-        self.sample_count=0
-        self.burnin_iter=0 # burn-in iteration for SGLD
+        self.engine.to(self.model, self.device)
+        self.engine.start()
 
-        # bon voyage
-        if self.plotting:
-            self.plot_progress()
+        state = None
+        if self.checkpoint_path is not None and self.resume:
+            state = load_checkpoint(self.checkpoint_path)
+            if state is not None:
+                self.load_state(state)
 
-    def forward(self, net_input_saved):
-        if self.reg_noise_std > 0:
-            self.net_input = self.net_input_saved + (self.noise.normal_() * self.reg_noise_std)
-            return self.model(self.net_input)
-        else:
-            return self.model(net_input_saved)
+        # bon voyage
+        self.plot_progress()
 
-    def update_stop(self,out_np):
-        """
-        Componenet of closure function
-        check if we should end the burnin phase
-        """
-        # update img collection
-        v_img_np = out_np.reshape(-1)
-        self.update_img_collection(v_img_np)
-        img_collection = self.get_img_collection()
-
-        if len(img_collection) >= self.buffer_size:
-            # update variance and var history
-            ave_img = np.mean(img_collection, axis=0)
-            variance = [self.MSE(ave_img, tmp) for tmp in img_collection]
-            self.cur_var = np.mean(variance)
-            self.variance_history.append(self.cur_var)
-            self.check_stop(self.cur_var, self.i)
-
-    def sgld_closure_calc(self,out_np):
-        ##########################################
-        ### Logging and SGLD mean collection #####
-        ##########################################
-        if self.burnin_over and np.mod(self.i, self.MCMC_iter) == 0:
-            self.sgld_mean += out_np
-            self.sample_count += 1.
-            self.sgld_mean_psnr = compare_psnr(self.img_np, self.sgld_mean / self.sample_count)
-
-        if self.burnin_over:
-            self.burnin_iter+=1
-            self.sgld_mean_each += out_np
-            self.sgld_mean_tmp = self.sgld_mean_each / self.burnin_iter
-            self.sgld_mean_psnr_each = compare_psnr(self.img_np, self.sgld_mean_tmp)
-
-            if self.i % self.report_every == 0:
-                if not self.HPO:
-                    report_intermediate_result({
-                        'iteration': self.i,
-                        'loss': round(self.latest_loss,5),
-                        'psnr_gt': round(self.psnr_gt,5),
-                        'psnr': round(self.sgld_mean_psnr_each,5)
-                        })
-        
-        elif self.cur_var is not None and not self.burnin_over:
-            if self.i % self.report_every == 0:
-                if not self.HPO:
-                    report_intermediate_result({
-                        'iteration': self.i,
-                        'loss': round(self.latest_loss,5),
-                        'psnr_gt': round(self.psnr_gt,5),
-                        'var': round(self.cur_var,5)
-                        })
+        # last, so nothing above draws from the restored generators
+        if state is not None:
+            set_rng_state(state['rng'])
+            print(f'Resumed from {self.checkpoint_path} at iteration {self.i}')
 
-        else:
-            if self.i % self.report_every == 0:
-                if not self.HPO:
-                    report_intermediate_result({
-                        'iteration': self.i,
-                        'loss': round(self.latest_loss,5),
-                        'psnr_gt': round(self.psnr_gt,5)
-                        })
-        if self.i % self.report_every == 0 and self.HPO:
-            report_intermediate_result(round(self.psnr_gt,5))
-
-    def closure(self):
-        out = self.forward(self.net_input)
-
-        # compute loss
-        self.total_loss = self.criteria(out, self.img_noisy_torch)
-        self.latest_loss = self.total_loss.item()
-        out_np = out.detach().cpu().numpy()[0]
-
-        # compute PSNR
-        self.psnr_gt = compare_psnr(self.img_np, out_np)
-
-        # early burn in termination criteria
-        if not self.burnin_over and self.ES:
-            self.update_stop(out_np)
-
-        # SGLD mean calculation and logging
-        if self.SGLD_regularize:
-            self.sgld_closure_calc(out_np)
-
-        # Non SGLD mean logging
-        elif self.i % self.report_every == 0 and not self.HPO:
-            report_intermediate_result({
-                'iteration': self.i,
-                'loss': round(self.latest_loss,5),
-                'psnr_gt': round(self.psnr_gt,5)
-                })
-        elif self.i % self.report_every == 0 and self.HPO:
-            report_intermediate_result(round(self.psnr_gt,5))
-
-        self.i += 1
-        return self.total_loss
-
-    # Define hook 
+    # Define hook
     def on_train_batch_start(self, batch, batch_idx):
         if self.NAS and self.OneShot:
             optimizer = self.optimizers()[0]
@@ -268,133 +210,114 @@ class SGLDES(LightningModule):
         """
         Oh the places you'll go
         """
-        loss = self.closure()
-        return {"loss": loss}
+        if self.inner_steps == 1:
+            loss = self.closure()
+            return {"loss": loss}
 
-
-    def add_noise(self, net):
-        """
-        Add noise to the network parameters
-        This is the critical part of SGLD
-        """
-        for n in [x for x in net.parameters() if len(x.size()) == 4]:
-            noise = torch.randn(n.size())*self.param_noise_sigma*self.learning_rate
-            noise = noise.type(self.dtype).to(self.device)
-            n.data = n.data + noise
+        # fused loop -- optimize manually so one lightning step covers several DIP iterations
+        optimizer = self.optimizers()
+        for _ in range(self.inner_steps):
+            optimizer.zero_grad()
+            loss = self.closure()
+            self.manual_backward(loss)
+            optimizer.step()
+            self.post_step()
+            if self.trainer.should_stop:
+                break
+        return {"loss": loss.detach()}
 
     def on_train_batch_end(self, outputs, batch, batch_idx, *args, **kwargs):
         """
         Add noise for SGLD
         """
-        optimizer = self.optimizers()
-        if isinstance(optimizer, torch.optim.Adam) and self.SGLD_regularize:
-            self.add_noise(self.model)
+        # the fused loop already ran post_step after each inner iteration
+        if self.inner_steps == 1:
+            self.post_step()
 
-        if self.i % self.show_every == 0 and not self.HPO:
-            if self.plotting:
-                self.plot_progress()
+    def post_step(self):
+        """
+        Per-iteration bookkeeping after the optimizer step
+        SGLD noise, plotting and checkpoints (engine.step), regularization switch and early stopping
+        """
+        self.engine.step(self.optimizers())
+        if self.engine.should_stop:
+            # converged SGLD chains
+            self.trainer.should_stop = True
 
         if self.switch is not None:
             if self.i >= self.switch:
                 self.SGLD_regularize = True
-        
+                self.sampler.enabled = True
+
         if self.burnin_over and self.ES and not self.SGLD_regularize:
             print(f'Early stopping after {self.i} iterations')
             self.trainer.should_stop = True
 
-    def on_train_end(self, **kwargs: Any):
+    def optimizer_list(self):
+        optimizers = self.optimizers()
+        if not isinstance(optimizers, (list, tuple)):
+            optimizers = [optimizers]
+        return [getattr(optimizer, 'optimizer', optimizer) for optimizer in optimizers]
+
+    def checkpoint_state(self):
         """
-        Report final metrics and display the results
+        Full evaluator state at the end of an iteration, see utils/checkpoint.py
         """
-        if not self.HPO:
-            if self.plotting:
-                self.plot_progress()
-            if self.sample_count != 0 and self.SGLD_regularize:
-                print(f"Final SGLD mean PSNR: {round(self.sgld_mean_psnr,5)}")
-                report_final_result(round(self.sgld_mean_psnr,5))
-            else:
-                print(f"Final PSNR: {round(self.psnr_gt,5)}")
-                report_final_result(round(self.psnr_gt,5))            
-        if self.HPO and self.sample_count != 0 and self.SGLD_regularize:
-            report_final_result(round(self.sgld_mean_psnr,5))
-        if self.HPO and self.sample_count == 0:
-            report_final_result(round(self.psnr_gt,5))
-
-    def common_dataloader(self):
-        # dataset = SingleImageDataset(self.phantom, self.num_iter)
-        # this should be net_input instead of phantom
-        dataset = SingleImageDataset(self.phantom, 1)
-        return DataLoader(dataset, batch_size=1)
-
-    def train_dataloader(self):
-        return self.common_dataloader()
-
-    def optimizer_zero_grad(self, epoch, batch_idx, optimizer, opt_idx):
-        # Not sure if this is the default logic in the nni.retiarii.evaluator.pytorch.LightningModule
-        # needed to modify so it can accept the opt_idx argument
-        optimizer.zero_grad()
-    
-    def configure_gradient_clipping(self, optimizer, opt_idx, gradient_clip_val, gradient_clip_algorithm):
-        # Not sure if this is the default logic in the nni.retiarii.evaluator.pytorch.LightningModule
-        # needed to modify so it can accept the opt_idx argument
-        # now need to define the clipping logic
-        self.clip_gradients(
-            optimizer,
-            gradient_clip_val=gradient_clip_val,
-            gradient_clip_algorithm=gradient_clip_algorithm
-        )
-
-    def check_stop(self, current, cur_epoch):
+        evaluator = self.engine.state_dict()
+        evaluator.update({name: getattr(self, name) for name in CHECKPOINT_ATTRS})
+        state = {
+            'evaluator': evaluator,
+            'model': self.model.state_dict(),
+            'optimizers': [optimizer.state_dict() for optimizer in self.optimizer_list()],
+            'early_stopper': self.early_stopper.checkpoint_state(),
+            'param_noise': self.sampler.param_noise.state_dict(),
+            'rng': rng_state(),
+        }
+        if self.chain_sampler is not None:
+            state['chains'] = self.chain_sampler.state_dict()
+        return state
+
+    def load_state(self, state):
         """
-        using an early stopper technique to determine when to end the burn in phase for SGLD
-        https://arxiv.org/pdf/2112.06074.pdf
-        https://github.com/sun-umn/Early_Stopping_for_DIP/blob/main/ES_WMV.ipynb
+        Restore a checkpoint_state, everything but the RNG (on_train_start restores it last)
         """
-        if current < self.best_score:
-            self.best_score = current
-            self.best_epoch = cur_epoch
-            self.wait_count = 0
-            self.burnin_over = False
-        else:
-            self.wait_count += 1
-            self.burnin_over = self.wait_count >= self.patience
-        if self.burnin_over:
-            print(f'\n\nBurn-in completed at iter {self.i}; \nStarting SGLD Mean sampling;\n\n')
-            # self.show_every = self.MCMC_iter
-
-    def update_img_collection(self, cur_img):
-        self.img_collection.append(cur_img)
-        if len(self.img_collection) > self.buffer_size:
-            self.img_collection.pop(0)
-
-    def get_img_collection(self):
-        return self.img_collection
-
-    def MSE(self, x1, x2):
-        return ((x1 - x2) ** 2).sum() / x1.size
-        
-    def plot_progress(self):
-        if self.sample_count == 0:
-            denoised_img = self.forward(self.net_input).detach().cpu().squeeze().numpy()
-            label = "Denoised Image"
-        else:
-            denoised_img = self.sgld_mean_each / self.burnin_iter
-            denoised_img = np.squeeze(denoised_img)
-            label = "SGLD Mean"
-
-        _, self.ax = plt.subplots(1, 3, figsize=(10, 5))
-
-        self.ax[0].imshow(self.img_np.squeeze(), cmap='gray')
-        self.ax[0].set_title("Original Image")
-        self.ax[0].axis('off')
-
-        self.ax[1].imshow(denoised_img, cmap='gray')
-        self.ax[1].set_title(label)
-        self.ax[1].axis('off')
+        evaluator = state['evaluator']
+        self.engine.load_state_dict({name: value for name, value in evaluator.items() if name in STATE_ATTRS})
+        for name in CHECKPOINT_ATTRS:
+            if name in evaluator:
+                setattr(self, name, evaluator[name])
+        self.sampler.enabled = self.SGLD_regularize
+        self.model.load_state_dict(state['model'])
+        for optimizer, optimizer_state in zip(self.optimizer_list(), state['optimizers']):
+            optimizer.load_state_dict(optimizer_state)
+        self.early_stopper.load_checkpoint_state(state['early_stopper'], self.device)
+        self.sampler.param_noise.load_state_dict(state['param_noise'])
+        if self.chain_sampler is not None and 'chains' in state:
+            self.chain_sampler.load_state_dict(state['chains'], self.device)
+        if self.sample_sink is not None:
+            # samples stored after the checkpoint are written again
+            self.sample_sink.resumed = True
+
+        # each lightning epoch is `inner_steps` iterations and lightning counts this run's epochs from 0,
+        # so the run only gets the epochs left of max_epochs (the length of the whole run)
+        epochs = self.i // self.inner_steps
+        self.trainer.fit_loop.max_epochs = max(self.trainer.max_epochs - epochs, 0)
 
-        self.ax[2].imshow(self.img_noisy_torch.detach().cpu().squeeze().numpy(), cmap='gray')
-        self.ax[2].set_title("Noisy Image")
-        self.ax[2].axis('off')
-
-        plt.tight_layout()
-        plt.show()
\ No newline at end of file
+    def on_train_end(self, **kwargs: Any):
+        """
+        Report final metrics and display the results
+        """
+        self.engine.end()
+        if self.sample_count != 0 and self.SGLD_regularize:
+            final = round(self.sgld_mean_psnr.item(),5)
+            if not self.HPO:
+                print(f"Final SGLD mean PSNR: {final}")
+        else:
+            final = round(self.psnr_gt.item(),5)
+            if not self.HPO:
+                print(f"Final PSNR: {final}")
+        report_final_result(final)
+
+        # engine.end flushed the checkpointer
+        if self.checkpoint_path is not None and not self.keep_checkpoint and os.path.exists(self.checkpoint_path):
+            os.remove(self.checkpoint_path)
@@ -15,7 +15,8 @@ class SGLD(Optimizer):
                  precondition_decay_rate=0.95,
                  num_pseudo_batches=1,
                  num_burn_in_steps=3000,
-                 diagonal_bias=1e-8) -> None:
+                 diagonal_bias=1e-8,
+                 weight_decay=0.) -> None:
         """ Set up a SGLD Optimizer.
 
         Parameters
@@ -44,6 +45,10 @@ class SGLD(Optimizer):
             Term added to the diagonal of the preconditioner to prevent it from
             degenerating.
             Default: `1e-8`.
+        weight_decay : float, optional
+            L2 penalty (Gaussian prior on the weights) added to the gradient,
+            same convention as torch.optim.Adam.
+            Default: `0`.
 
         """
         if lr < 0.0:
@@ -55,64 +60,84 @@ class SGLD(Optimizer):
             lr=lr, precondition_decay_rate=precondition_decay_rate,
             num_pseudo_batches=num_pseudo_batches,
             num_burn_in_steps=num_burn_in_steps,
-            diagonal_bias=1e-8,
+            diagonal_bias=diagonal_bias,
+            weight_decay=weight_decay,
         )
         super().__init__(params, defaults)
 
-
+    @torch.no_grad()
     def step(self, closure=None):
+        """
+        One preconditioned Langevin step over every parameter group
+
+            momentum   <- decay * momentum + (1 - decay) * grad^2
+            P          =  1 / sqrt(momentum + diagonal_bias)
+            parameter  <- parameter - lr/2 * num_pseudo_batches * P * grad
+                                    - sqrt(lr) * sqrt(P) * N(0, 1)      (after burn in)
+
+        Runs as a handful of multi-tensor (foreach) kernels per group, the state
+        buffers are allocated on the first step and updated in place afterwards.
+        """
         loss = None
 
         if closure is not None:
-            loss = closure()
+            with torch.enable_grad():
+                loss = closure()
 
         for group in self.param_groups:
-            for parameter in group["params"]:
+            params, grads, momentums, denoms, noises = [], [], [], [], []
+            lr = group["lr"]
+            num_pseudo_batches = group["num_pseudo_batches"]
+            precondition_decay_rate = group["precondition_decay_rate"]
 
+            for parameter in group["params"]:
                 if parameter.grad is None:
                     continue
-
                 state = self.state[parameter]
-                lr = group["lr"]
-                num_pseudo_batches = group["num_pseudo_batches"]
-                precondition_decay_rate = group["precondition_decay_rate"]
-                gradient = parameter.grad.data
 
                 #  State initialization {{{ #
 
                 if len(state) == 0:
                     state["iteration"] = 0
-                    state["momentum"] = torch.ones_like(parameter)
+                    state["momentum"] = torch.ones_like(parameter, memory_format=torch.preserve_format)
+                    state["denom"] = torch.empty_like(parameter, memory_format=torch.preserve_format)
+                    state["noise"] = torch.empty_like(parameter, memory_format=torch.preserve_format)
 
                 #  }}} State initialization #
 
                 state["iteration"] += 1
-
-                momentum = state["momentum"]
-
-                #  Momentum update {{{ #
-                momentum.add_(
-                    (1.0 - precondition_decay_rate) * ((gradient ** 2) - momentum)
-                )
-                #  }}} Momentum update #
-
-                if state["iteration"] > group["num_burn_in_steps"]:
-                    sigma = 1. / torch.sqrt(torch.tensor(lr))
-                else:
-                    sigma = torch.zeros_like(parameter)
-
-                preconditioner = (
-                    1. / torch.sqrt(momentum + group["diagonal_bias"])
-                )
-
-                scaled_grad = (
-                    0.5 * preconditioner * gradient * num_pseudo_batches +
-                    torch.normal(
-                        mean=torch.zeros_like(gradient),
-                        std=torch.ones_like(gradient)
-                    ) * sigma * torch.sqrt(preconditioner)
-                )
-
-                parameter.data.add_(-lr * scaled_grad)
-
-        return loss
\ No newline at end of file
+                params.append(parameter)
+                grads.append(parameter.grad)
+                momentums.append(state["momentum"])
+                denoms.append(state["denom"])
+                noises.append(state["noise"])
+
+            if len(params) == 0:
+                continue
+
+            if group["weight_decay"] != 0:
+                # in place on .grad, it is zeroed before the next backward anyway
+                torch._foreach_add_(grads, params, alpha=group["weight_decay"])
+
+            #  Momentum update {{{ #
+            torch._foreach_mul_(momentums, precondition_decay_rate)
+            torch._foreach_addcmul_(momentums, grads, grads, value=1.0 - precondition_decay_rate)
+            #  }}} Momentum update #
+
+            # denom = sqrt(momentum + diagonal_bias) = 1 / preconditioner
+            torch._foreach_zero_(denoms)
+            torch._foreach_add_(denoms, momentums)
+            torch._foreach_add_(denoms, group["diagonal_bias"])
+            torch._foreach_sqrt_(denoms)
+
+            # drift: -lr * 0.5 * preconditioner * gradient * num_pseudo_batches
+            torch._foreach_addcdiv_(params, grads, denoms, value=-0.5 * lr * num_pseudo_batches)
+
+            # diffusion: -lr * N(0, 1) * sigma * sqrt(preconditioner) with sigma = 1 / sqrt(lr)
+            if self.state[params[0]]["iteration"] > group["num_burn_in_steps"]:
+                for noise in noises:
+                    noise.normal_()
+                torch._foreach_sqrt_(denoms)
+                torch._foreach_addcdiv_(params, noises, denoms, value=-(lr ** 0.5))
+
+        return loss
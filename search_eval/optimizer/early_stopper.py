@@ -1,68 +1,190 @@
-import numpy as np
+from collections import deque
+
+import torch
 import torch.nn as nn
 
 class ES(nn.Module):
-    def __init__(self, 
+    """
+    Windowed moving variance (ES-WMV) early stopper
+    https://arxiv.org/pdf/2112.06074.pdf
+    https://github.com/sun-umn/Early_Stopping_for_DIP/blob/main/ES_WMV.ipynb
+
+    The last `buffer_size` flattened outputs live in a preallocated
+    (buffer_size, H*W) ring buffer. A running per-pixel sum and a running sum of
+    squared norms (both float64) are updated as images enter and leave the window,
+    so the windowed variance
+        mean_k MSE(mean_image, img_k) = (sum_k |img_k|^2 / B - |sum_k img_k|^2 / B^2) / (H*W)
+    costs O(H*W) per iteration instead of O(buffer_size * H*W)
+
+    The patience check stays on the device as well: cur_var, best_score, best_epoch and
+    wait_count are 0-d tensors updated without reading them back. wait_count grows by at
+    most one per iteration, so after reading it once the stopper knows the earliest
+    iteration the patience can run out and only syncs again there; the stop point is the
+    one of a check on every iteration.
+
+    variance_history keeps every variance by default, with `history_size` only the last
+    ones, for the evaluators that record the full series with utils/recorder.py anyway.
+    The variances come to the host together at those syncs (and in flush()), so the
+    history lags behind cur_var until then.
+    """
+    def __init__(self,
                  buffer_size=100,
                  patience=1000,
+                 history_size=None,
                 ):
         super().__init__()
-        
+
         # early stop criteria
-        self.img_collection = []
-        self.variance_history = []
+        self.variance_history = [] if history_size is None else deque(maxlen=history_size)
         self.patience = patience
         self.wait_count = 0
         self.best_score = float('inf')
         self.best_epoch = 0
-        self.img_collection = []
         self.burnin_over = False
         self.buffer_size = buffer_size
         self.cur_var = None
+        # variances not in variance_history yet, observations so far and the next one to sync at
+        self.pending = []
+        self.n_checks = 0
+        self.next_sync = max(patience, 1) + 1
+
+        # ring buffer and running sums, allocated on the device of the first image
+        self.n_imgs = 0
+        self.register_buffer('img_collection', None)
+        self.register_buffer('running_sum', None)
+        self.register_buffer('running_sq', None)
+        self.register_buffer('scratch', None, persistent=False)
 
-    def update_stop(self,out_np):
+    def update_stop(self, out, cur_epoch):
         """
         Componenet of closure function
         check if we should end the burnin phase
         """
         # update img collection
-        v_img_np = out_np.reshape(-1)
-        self.update_img_collection(v_img_np)
-        img_collection = self.get_img_collection()
+        self.update_img_collection(out.detach().reshape(-1))
 
-        if len(img_collection) >= self.buffer_size:
+        if self.n_imgs >= self.buffer_size:
             # update variance and var history
-            ave_img = np.mean(img_collection, axis=0)
-            variance = [self.MSE(ave_img, tmp) for tmp in img_collection]
-            self.cur_var = np.mean(variance)
-            self.variance_history.append(self.cur_var)
-            self.check_stop(self.cur_var, self.i)
+            self.cur_var = self.windowed_variance()
+            self.pending.append(self.cur_var)
+            self.check_stop(self.cur_var, cur_epoch)
+        return self.burnin_over
 
     def check_stop(self, current, cur_epoch):
         """
         using an early stopper technique to determine when to end the burn in phase for SGLD
         https://arxiv.org/pdf/2112.06074.pdf
         https://github.com/sun-umn/Early_Stopping_for_DIP/blob/main/ES_WMV.ipynb
+
+        current: 0-d tensor, the comparison with the best score stays on its device
         """
-        if current < self.best_score:
-            self.best_score = current
-            self.best_epoch = cur_epoch
-            self.wait_count = 0
-            self.burnin_over = False
-        else:
-            self.wait_count += 1
-            self.burnin_over = self.wait_count >= self.patience
+        if not torch.is_tensor(self.wait_count):
+            # first check, or the plain numbers of a checkpoint
+            self.best_score = torch.tensor(self.best_score, dtype=current.dtype, device=current.device)
+            self.best_epoch = torch.tensor(self.best_epoch, device=current.device)
+            self.wait_count = torch.tensor(self.wait_count, device=current.device)
+        improved = current < self.best_score
+        torch.minimum(self.best_score, current, out=self.best_score)
+        self.best_epoch.masked_fill_(improved, cur_epoch)
+        self.wait_count.add_(1).masked_fill_(improved, 0)
+
+        self.n_checks += 1
+        if self.n_checks < self.next_sync:
+            return
+        wait = int(self.wait_count.item())
+        self.flush()
+        # an improvement resets the wait to 0, which never ends the burn-in even with patience 0
+        patience = max(self.patience, 1)
+        self.burnin_over = wait >= patience
         if self.burnin_over:
-            print(f'\n\nBurn-in completed at iter {self.i}; \nStarting SGLD Mean sampling;\n\n')
-            # self.show_every = self.MCMC_iter
+            print(f'\n\nBurn-in completed at iter {cur_epoch}; \nStarting SGLD Mean sampling;\n\n')
+        else:
+            self.next_sync = self.n_checks + patience - wait
+
+    def flush(self):
+        """
+        Move the pending variances to variance_history, one transfer
+        """
+        if self.pending:
+            self.variance_history.extend(torch.stack(self.pending).tolist())
+            self.pending.clear()
 
     def update_img_collection(self, cur_img):
-        self.img_collection.append(cur_img)
-        if len(self.img_collection) > self.buffer_size:
-            self.img_collection.pop(0)
+        if self.img_collection is None:
+            self.img_collection = cur_img.new_zeros((self.buffer_size, cur_img.numel()))
+            self.running_sum = torch.zeros(cur_img.numel(), dtype=torch.float64, device=cur_img.device)
+            self.running_sq = torch.zeros((), dtype=torch.float64, device=cur_img.device)
+            self.scratch = torch.zeros(cur_img.numel(), dtype=torch.float64, device=cur_img.device)
+
+        slot = self.n_imgs % self.buffer_size
+
+        # the oldest image leaves the window
+        if self.n_imgs >= self.buffer_size:
+            self.scratch.copy_(self.img_collection[slot])
+            self.running_sum.sub_(self.scratch)
+            self.running_sq.sub_(torch.dot(self.scratch, self.scratch))
+
+        # the newest image enters the window
+        self.img_collection[slot].copy_(cur_img)
+        self.scratch.copy_(cur_img)
+        self.running_sum.add_(self.scratch)
+        self.running_sq.add_(torch.dot(self.scratch, self.scratch))
+        self.n_imgs += 1
 
     def get_img_collection(self):
-        return self.img_collection
+        """
+        Images currently in the window, oldest first
+        """
+        if self.img_collection is None:
+            return self.img_collection
+        n = min(self.n_imgs, self.buffer_size)
+        start = self.n_imgs % self.buffer_size if self.n_imgs > self.buffer_size else 0
+        idx = (torch.arange(n, device=self.img_collection.device) + start) % self.buffer_size
+        return self.img_collection[idx]
+
+    def windowed_variance(self):
+        """
+        Variance of the images in the (full) window as a 0-d tensor on the buffer's device
+        """
+        n_pixels = self.running_sum.numel()
+        mean_sq = self.running_sq / self.buffer_size
+        sq_mean = torch.dot(self.running_sum, self.running_sum) / self.buffer_size ** 2
+        return (mean_sq - sq_mean) / n_pixels
+
+    def checkpoint_state(self):
+        """
+        Everything needed to resume the stopper, the lazily allocated buffers included
+        (state_dict skips buffers that are still None)
+        """
+        self.flush()
+        return {
+            'variance_history': list(self.variance_history),
+            'wait_count': int(self.wait_count),
+            'best_score': float(self.best_score),
+            'best_epoch': int(self.best_epoch),
+            'burnin_over': self.burnin_over,
+            'cur_var': None if self.cur_var is None else float(self.cur_var),
+            'n_imgs': self.n_imgs,
+            'img_collection': self.img_collection,
+            'running_sum': self.running_sum,
+            'running_sq': self.running_sq,
+        }
 
-    def MSE(self, x1, x2):
-        return ((x1 - x2) ** 2).sum() / x1.size()[0]
\ No newline at end of file
+    def load_checkpoint_state(self, state, device=None):
+        # in place, the evaluators hold a reference to variance_history
+        self.variance_history.clear()
+        self.variance_history.extend(state['variance_history'])
+        self.pending.clear()
+        # back to tensors at the next check, which also syncs
+        self.wait_count = state['wait_count']
+        self.best_score = state['best_score']
+        self.best_epoch = state['best_epoch']
+        self.burnin_over = state['burnin_over']
+        self.cur_var = state['cur_var']
+        self.n_checks, self.next_sync = 0, 0
+        self.n_imgs = state['n_imgs']
+        if state['img_collection'] is not None:
+            self.img_collection = state['img_collection'].to(device)
+            self.running_sum = state['running_sum'].to(device)
+            self.running_sq = state['running_sq'].to(device)
+            self.scratch = torch.zeros_like(self.running_sum)
@@ -0,0 +1,74 @@
+import torch
+
+class ParamNoise:
+    """
+    SGLD parameter noise, the critical part of SGLD shared by all the evaluators
+
+    The noise is drawn in place into buffers that live next to the parameters (same device
+    and dtype) and are reused every step, then added with one multi-tensor op.
+    No host allocation, no H2D copy and no new parameter tensors per step, works on CPU too.
+
+    Args:
+        seed: seed for the per-device generators, None draws from torch's default generators
+              (so torch.manual_seed keeps runs reproducible like before)
+        ndim: only parameters with this many dims get noise (4 = conv weights)
+    """
+    def __init__(self, seed=None, ndim=4):
+        self.seed = seed
+        self.ndim = ndim
+        self.generators = {}
+        self.params = []
+        self.buffers = []
+
+    def generator(self, device):
+        if self.seed is None:
+            return None
+        if device not in self.generators:
+            generator = torch.Generator(device=device)
+            generator.manual_seed(self.seed)
+            self.generators[device] = generator
+        return self.generators[device]
+
+    def noise_buffers(self, params):
+        # reallocate only when the parameters change (new model, moved to another device, ...)
+        stale = len(params) != len(self.params) or any(
+            p is not q or b.device != p.device or b.dtype != p.dtype
+            for p, q, b in zip(params, self.params, self.buffers)
+        )
+        if stale:
+            self.params = params
+            self.buffers = [torch.empty_like(p, memory_format=torch.preserve_format) for p in params]
+        return self.buffers
+
+    @torch.no_grad()
+    def __call__(self, params, std):
+        """
+        Add N(0, std^2) noise to each parameter in place
+
+        Args:
+            params: iterable of parameters, e.g. net.parameters()
+            std: noise standard deviation, the evaluators use param_noise_sigma * learning_rate
+        """
+        params = [p for p in params if p.dim() == self.ndim]
+        if len(params) == 0:
+            return
+        buffers = self.noise_buffers(params)
+        for buffer in buffers:
+            buffer.normal_(0., std, generator=self.generator(buffer.device))
+
+        if hasattr(torch, '_foreach_add_'):
+            torch._foreach_add_(params, buffers)
+        else:
+            for p, buffer in zip(params, buffers):
+                p.add_(buffer)
+
+    def state_dict(self):
+        """
+        States of the seeded generators, the default generators are checkpointed with the rest of the RNG state
+        """
+        return {'seed': self.seed, 'generators': {str(device): g.get_state() for device, g in self.generators.items()}}
+
+    def load_state_dict(self, state):
+        self.seed = state['seed']
+        for device, generator_state in state['generators'].items():
+            self.generator(torch.device(device)).set_state(generator_state)
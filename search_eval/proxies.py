@@ -0,0 +1,286 @@
+"""
+Training free proxies to rank architectures before paying for a full DIP run
+
+Every proxy scores a network on the actual DIP problem (get_noise input, noisy phantom),
+higher is better, and works on a copy so the network that gets trained is untouched.
+    synflow: synaptic flow of the linearized network (Tanaka et al. 2020)
+    grad_norm: norm of the gradient of the DIP loss at initialization
+    jacob_cov: Jacobian covariance over perturbed inputs (Mellor et al. 2021)
+    short_fit: PSNR to the phantom after a few Adam iterations, DIP fits the low
+               frequencies first so good architectures get there quickly
+
+ProxyGate keeps the scores of the architectures seen so far and only lets the top fraction
+through. ProxyFilteredStrategy puts it in front of a Retiarii strategy: every model the
+strategy samples is scored before submission and the rejected ones never become trials,
+so no trial runs for nothing and no made up result reaches the strategy. rank_architectures
+samples architectures of a Retiarii space and ranks them by a proxy, e.g. to seed a search
+or to evaluate only the best ones with fixed_arch.
+"""
+
+import os
+import copy
+import json
+import fcntl
+import random
+
+import numpy as np
+import torch
+
+from nni.retiarii.strategy.base import BaseStrategy
+
+from .utils.common_utils import get_noise
+from .utils.metrics import psnr
+
+def synflow(model, net_input, img_noisy=None, img=None):
+    """
+    sum |theta * dR/dtheta| with R the output sum of the network with |theta| and an all ones input
+    """
+    model = copy.deepcopy(model).double().eval()
+    with torch.no_grad():
+        for p in model.parameters():
+            p.abs_()
+    model.zero_grad()
+    model(torch.ones_like(net_input, dtype=torch.float64)).sum().backward()
+    return sum((p * p.grad).abs().sum().item() for p in model.parameters() if p.grad is not None)
+
+def grad_norm(model, net_input, img_noisy, img=None):
+    model = copy.deepcopy(model)
+    model.zero_grad()
+    torch.nn.functional.mse_loss(model(net_input), img_noisy).backward()
+    return sum(p.grad.norm().item() for p in model.parameters() if p.grad is not None)
+
+def jacob_cov(model, net_input, img_noisy=None, img=None, n_samples=8, reg_noise_std=1./30., generator=None):
+    """
+    -sum(log(eig + k) + 1 / (eig + k)) of the correlation of the input Jacobians of
+    `n_samples` perturbed inputs, less correlated Jacobians score higher
+
+    The perturbations come from `generator`, a generator seeded with 0 by default, so every
+    architecture is scored on the same inputs and the global RNG of the caller is left alone
+    """
+    if generator is None:
+        generator = torch.Generator(device=net_input.device)
+        generator.manual_seed(0)
+    model = copy.deepcopy(model)
+    x = net_input.repeat(n_samples, 1, 1, 1)
+    noise = torch.randn(x.shape, generator=generator, device=x.device, dtype=x.dtype)
+    x = (x + noise * reg_noise_std).requires_grad_(True)
+    model(x).sum().backward()
+    jacobians = x.grad.flatten(1).double()
+    eig = torch.linalg.eigvalsh(torch.nan_to_num(torch.corrcoef(jacobians)))
+    k = 1e-5
+    return -torch.sum(torch.log(eig + k) + 1. / (eig + k)).item()
+
+def short_fit(model, net_input, img_noisy, img, num_iter=50, learning_rate=0.01):
+    model = copy.deepcopy(model)
+    optimizer = torch.optim.Adam(model.parameters(), lr=learning_rate)
+    for _ in range(num_iter):
+        optimizer.zero_grad()
+        torch.nn.functional.mse_loss(model(net_input), img_noisy).backward()
+        optimizer.step()
+    with torch.no_grad():
+        return psnr(img, model(net_input)[0]).item()
+
+PROXIES = {
+    'synflow': synflow,
+    'grad_norm': grad_norm,
+    'jacob_cov': jacob_cov,
+    'short_fit': short_fit,
+}
+
+def problem_tensors(phantom, phantom_noisy, input_depth=1, device='cpu'):
+    """
+    (net_input, img_noisy, img) of a phantom the way the evaluators build them
+    """
+    img = torch.tensor(np.float32(phantom), device=device)
+    img_noisy = torch.tensor(np.float32(phantom_noisy), device=device).unsqueeze(0)
+    net_input = get_noise(input_depth, 'noise', (img.shape[-1], img.shape[-2])).to(device)
+    return net_input, img_noisy, img
+
+def score_architecture(model, net_input, img_noisy, img, proxies=('synflow',)):
+    """
+    {proxy: score} of a network on one problem
+    """
+    unknown = [proxy for proxy in proxies if proxy not in PROXIES]
+    if unknown:
+        raise ValueError(f"Unknown proxies {unknown}, choose from {list(PROXIES)}")
+    return {proxy: PROXIES[proxy](model, net_input, img_noisy, img) for proxy in proxies}
+
+
+class ProxyGate:
+    """
+    Lets through the architectures whose proxy score is in the top `keep` fraction of the
+    scores seen so far in the experiment
+
+    The scores are kept in memory, or appended to a JSON lines file that outlives the
+    experiment and can be shared by concurrent processes
+
+    Args:
+        path: JSON lines file of the scores, None keeps them in memory
+        keep: fraction of the architectures that get a full evaluation
+        warmup: number of scores collected before anything is rejected
+    """
+    def __init__(self, path=None, keep=0.1, warmup=10):
+        if not 0 < keep <= 1:
+            raise ValueError(f"keep must be in (0, 1], got {keep}")
+        self.path = path
+        self.keep = keep
+        self.warmup = warmup
+        self.history = []
+
+    def scores(self):
+        if self.path is None:
+            return list(self.history)
+        if not os.path.exists(self.path):
+            return []
+        with open(self.path) as f:
+            fcntl.flock(f, fcntl.LOCK_SH)
+            return self.read(f)
+
+    def read(self, f):
+        f.seek(0)
+        return [json.loads(line)['score'] for line in f if line.strip()]
+
+    def admit(self, score, arch=None):
+        """
+        Record the score and tell whether the architecture deserves the full evaluation
+        """
+        if self.path is None:
+            history = list(self.history)
+            self.history.append(score)
+        else:
+            # read and append under one lock, so concurrent processes each see the others' scores
+            with open(self.path, 'a+') as f:
+                fcntl.flock(f, fcntl.LOCK_EX)
+                history = self.read(f)
+                f.write(json.dumps({'score': score, 'arch': arch}) + '\n')
+                f.flush()
+        if len(history) < self.warmup:
+            return True
+        return score >= np.quantile(history, 1. - self.keep)
+
+
+def search_space_choices(model_space):
+    """
+    {label: candidates} of the LayerChoices and InputChoices (also the ones inside Cells) of a model space
+    """
+    from nni.retiarii.nn.pytorch import LayerChoice, InputChoice
+    choices = {}
+    for module in model_space.modules():
+        if isinstance(module, LayerChoice):
+            choices[module.label] = ('layer', list(module.names))
+        elif isinstance(module, InputChoice):
+            choices[module.label] = ('input', (module.n_candidates, module.n_chosen or 1))
+    return choices
+
+def sample_architecture(choices, rng=random):
+    arch = {}
+    for label, (kind, candidates) in choices.items():
+        if kind == 'layer':
+            arch[label] = rng.choice(candidates)
+        else:
+            n_candidates, n_chosen = candidates
+            arch[label] = sorted(rng.sample(range(n_candidates), n_chosen))
+    return arch
+
+def rank_architectures(model_space_cls, phantom, phantom_noisy, num_samples=100, top=0.1, proxy='synflow',
+                       space_kwargs=None, input_depth=1, device='cpu', seed=0):
+    """
+    Sample architectures of a Retiarii model space (UNetSpaceMT, SearchSpace, UNetSpace, ...)
+    and rank them with a proxy, returns the best `top` fraction as [(score, exported_arch)]
+
+    The space is built once to read its choices, every sample is then built alone with fixed_arch
+    """
+    from nni.retiarii import fixed_arch
+
+    space_kwargs = space_kwargs or {}
+    choices = search_space_choices(model_space_cls(**space_kwargs))
+    net_input, img_noisy, img = problem_tensors(phantom, phantom_noisy, input_depth, device)
+
+    rng = random.Random(seed)
+    torch.manual_seed(seed)
+    ranked, seen = [], set()
+    for _ in range(num_samples):
+        arch = sample_architecture(choices, rng)
+        key = json.dumps(arch, sort_keys=True)
+        if key in seen:
+            continue
+        seen.add(key)
+        try:
+            with fixed_arch(arch, verbose=False):
+                model = model_space_cls(**space_kwargs).to(device)
+            score = PROXIES[proxy](model, net_input, img_noisy, img)
+        except RuntimeError as e:
+            # invalid architecture (shape mismatch, ...)
+            print(f"Skipping {arch}: {e}")
+            continue
+        ranked.append((score, arch))
+
+    ranked.sort(key=lambda item: item[0], reverse=True)
+    return ranked[:max(1, int(round(len(ranked) * top)))]
+
+
+def mutation_dict(model):
+    """
+    {label: choice} of a sampled Retiarii model, the format of fixed_arch and of exported architectures
+    """
+    return {m.mutator.label: m.samples[0] if len(m.samples) == 1 else m.samples for m in model.history}
+
+class ProxyFilteredStrategy(BaseStrategy):
+    """
+    A Retiarii strategy that only submits the models whose proxy score is in the top `keep`
+    fraction of the ones it sampled so far
+
+    The scoring goes through the `model_filter` of the wrapped strategy, which samples again
+    instead of submitting a rejected model: rejected architectures never become trials, so
+    nothing runs for them and the strategy only ever sees real results. The networks are
+    built with fixed_arch in the experiment process, on `device`.
+
+        strategy = ProxyFilteredStrategy(strategy.RegularizedEvolution(dedup=True),
+                                         UNetSpaceMT, phantom, phantom_noisy,
+                                         space_kwargs={'depth': 4, 'init_features': 64})
+        RetiariiExperiment(model_space, lightning, [], strategy)
+
+    Args:
+        strategy: Random, GridSearch or RegularizedEvolution, the strategies with a model_filter;
+                  a model_filter of their own is applied first
+        model_space_cls, space_kwargs: the model space of the experiment
+        phantom, phantom_noisy, input_depth: the problem of the evaluator
+        proxy: one of PROXIES
+        keep, warmup: see ProxyGate
+        path: JSON lines file of the scores, None keeps them in memory
+        device: where the candidates are scored
+    """
+    def __init__(self, strategy, model_space_cls, phantom, phantom_noisy, proxy='synflow', keep=0.1, warmup=10,
+                 path=None, space_kwargs=None, input_depth=1, device='cpu'):
+        if not hasattr(strategy, 'filter'):
+            raise ValueError(f"{type(strategy).__name__} takes no model_filter, "
+                             "wrap Random, GridSearch or RegularizedEvolution")
+        if proxy not in PROXIES:
+            raise ValueError(f"proxy must be one of {list(PROXIES)}, got {proxy}")
+        self.strategy = strategy
+        self.model_filter = strategy.filter
+        strategy.filter = self.admit
+
+        self.model_space_cls = model_space_cls
+        self.space_kwargs = space_kwargs or {}
+        self.proxy = proxy
+        self.gate = ProxyGate(path, keep=keep, warmup=warmup)
+        self.device = device
+        self.problem = problem_tensors(phantom, phantom_noisy, input_depth, device)
+
+    def admit(self, model):
+        from nni.retiarii import fixed_arch
+
+        if self.model_filter is not None and not self.model_filter(model):
+            return False
+        arch = mutation_dict(model)
+        with fixed_arch(arch, verbose=False):
+            network = self.model_space_cls(**self.space_kwargs).to(self.device)
+        score = PROXIES[self.proxy](network, *self.problem)
+        admitted = self.gate.admit(score, arch)
+        if not admitted:
+            print(f"Proxy filter: skipping {arch} ({self.proxy} = {score:.5g})")
+        return admitted
+
+    def run(self, base_model, applied_mutators):
+        self.strategy.run(base_model, applied_mutators)
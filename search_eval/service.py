@@ -0,0 +1,528 @@
+"""
+Local denoising service
+
+A FastAPI app that denoises images with SGLD-ES (the engine stages of Eval_Batched, without Lightning)
+on an exported architecture and a hyperparameter preset.
+
+    - a pool of worker processes, each with its networks built and compiled once
+      (search_space/export.py) and reset to their initial weights for every batch
+    - concurrent requests with the same architecture, preset and image size are queued
+      and batched (utils/batched.py), one forward pass advances all of them
+    - progress is streamed as JSON lines, the result is the denoised image (SGLD mean once
+      ES-WMV ends the burn-in, the latest output otherwise), the iteration ES stopped at and,
+      from two SGLD samples on, the per-pixel posterior std and 95% credible interval
+      (utils/posterior.py, streamed on the device, no sample is kept)
+
+It listens on localhost only and refuses other clients.
+
+    python -m search_eval.service --archs archs/ --workers 2 --port 8000
+
+archs/ holds one JSON file per architecture, {"depth": 4, "arch": {label: choice}} (exportedUNet)
+or {"depth": 4} (UNetBasic), the file name is the architecture name. UNetBasic is always available.
+
+    POST /denoise            {"arch", "preset", and one of "array" (H x W lists), "npy" or "png" (base64)}
+    GET  /jobs/{id}          status, latest progress and the result
+                             (finished jobs are kept job_ttl seconds, at most max_finished of them)
+    GET  /jobs/{id}/events   progress as JSON lines until the job is done
+    GET  /archs, /presets, /health
+"""
+
+import os
+import io
+import sys
+import copy
+import json
+import time
+import uuid
+import queue
+import base64
+import asyncio
+import threading
+import multiprocessing
+from collections import OrderedDict
+from typing import List, Optional
+
+import numpy as np
+import torch
+from fastapi import FastAPI, HTTPException, Request
+from fastapi.responses import JSONResponse, StreamingResponse
+from pydantic import BaseModel
+
+from .engine import BatchedEngine, BatchedESBurnin, BatchedSGLDSampler, Stage
+from .utils.batched import batch_models
+from .optimizer.early_stopper import ES
+
+# search_space lives next to search_eval
+sys.path.insert(1, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+LOCALHOST = ('127.0.0.1', '::1', 'localhost')
+
+PRESETS = {
+    'default': dict(learning_rate=0.01, weight_decay=5e-8, buffer_size=100, patience=1000,
+                    max_iter=10000, MCMC_iter=50, num_samples=20, reg_noise_std=1./30., param_noise_sigma=2),
+    'fast': dict(learning_rate=0.01, weight_decay=5e-8, buffer_size=50, patience=300,
+                 max_iter=3000, MCMC_iter=25, num_samples=10, reg_noise_std=1./30., param_noise_sigma=2),
+    'quality': dict(learning_rate=0.005, weight_decay=5e-8, buffer_size=100, patience=2000,
+                    max_iter=25000, MCMC_iter=50, num_samples=50, reg_noise_std=1./30., param_noise_sigma=2),
+}
+
+def load_archs(arch_dir=None):
+    """
+    {name: spec} of the servable architectures, UNetBasic plus the JSON files of `arch_dir`
+    """
+    archs = OrderedDict([('UNetBasic', {'depth': 4})])
+    if arch_dir is not None:
+        for filename in sorted(os.listdir(arch_dir)):
+            if filename.endswith('.json'):
+                with open(os.path.join(arch_dir, filename)) as f:
+                    archs[filename[:-len('.json')]] = json.load(f)
+    return archs
+
+def build_model(spec):
+    from search_space.unet import UNetBasic, exportedUNet
+    if 'arch' in spec:
+        return exportedUNet(1, 1, spec['depth'], spec['arch'])
+    return UNetBasic(depth=spec['depth'])
+
+
+class JobProgress(Stage):
+    """
+    Calls progress every `report_every` iterations with one dict per image of the batch
+    """
+    def __init__(self, progress, report_every=100):
+        self.progress = progress
+        self.report_every = report_every
+
+    def closure(self, engine, out):
+        if engine.i % self.report_every != 0:
+            return
+        losses, samples = engine.latest_loss.tolist(), engine.sample_count.tolist()
+        self.progress([{
+            'iteration': engine.i,
+            'loss': round(losses[k], 7),
+            'var': None if engine.cur_var[k] is None else round(float(engine.cur_var[k]), 7),
+            'stop_iter': engine.burnin_epoch[k],
+            'samples': int(samples[k]),
+            } for k in range(engine.num_problems)])
+
+def denoise_batch(model, images, preset, progress=None, report_every=100, level=0.95):
+    """
+    SGLD-ES on N images at once, with the engine stages of Eval_Batched (engine.py)
+
+    Args:
+        model: network (batched for N > 1) mapping (N, 1, H, W) -> (N, 1, H, W)
+        images: (N, 1, H, W) noisy images on the device of the model
+        preset: one of PRESETS
+        progress: called every `report_every` iterations with one dict per image
+        level: of the credible intervals
+    Returns:
+        one {'denoised', 'std', 'lower', 'upper', 'stop_iter', 'iterations', 'samples'} per image,
+        stop_iter is None if ES never ended the burn-in (denoised is then the latest output),
+        std / lower / upper are None below two samples
+    """
+    n = images.shape[0]
+    early_stoppers = [ES(buffer_size=preset['buffer_size'], patience=preset['patience']) for _ in range(n)]
+    # a problem collects num_samples samples after its burn-in, the run ends once all of them have theirs
+    stages = [
+        BatchedESBurnin(early_stoppers),
+        BatchedSGLDSampler(preset['MCMC_iter'], preset['learning_rate'], param_noise_sigma=preset['param_noise_sigma'],
+                           num_samples=preset['num_samples']),
+    ]
+    if progress is not None:
+        stages.append(JobProgress(progress, report_every))
+    engine = BatchedEngine(None, images.cpu().numpy(), stages=stages, reg_noise_std=preset['reg_noise_std'])
+    engine.to(model, images.device)
+    engine.start()
+    optimizer = torch.optim.Adam(model.parameters(), lr=preset['learning_rate'], weight_decay=preset['weight_decay'])
+
+    for _ in range(preset['max_iter']):
+        optimizer.zero_grad(set_to_none=True)
+        engine.closure().backward()
+        optimizer.step()
+        engine.step(optimizer)
+        if engine.should_stop:
+            break
+    engine.end()
+
+    samples = engine.sample_count.tolist()
+    denoised = engine.last_out
+    if engine.sgld_mean is not None:
+        count = engine.sample_count.view(-1, 1, 1, 1)
+        denoised = torch.where(count > 0, engine.sgld_mean * engine.per_problem(engine.sample_count), denoised)
+    denoised = denoised[:, 0].cpu().numpy()
+    maps = [None] * 3
+    if engine.posterior.mean is not None:
+        lower, upper = engine.posterior.credible_interval(level)
+        maps = [x[:, 0].cpu().numpy() for x in (engine.posterior.std(), lower, upper)]
+    results = []
+    for k in range(n):
+        std, lower, upper = [m[k] if m is not None and samples[k] >= 2 else None for m in maps]
+        results.append({'denoised': denoised[k], 'std': std, 'lower': lower, 'upper': upper,
+                        'stop_iter': engine.burnin_epoch[k], 'iterations': engine.i, 'samples': int(samples[k])})
+    return results
+
+
+class ModelPool:
+    """
+    Compiled networks of one worker, per (architecture, batch size, height, width)
+    """
+    def __init__(self, archs, device='cpu'):
+        self.archs = archs
+        self.device = device
+        self.models = {}
+
+    def get(self, name, n, height, width):
+        """
+        The compiled network, reset to its initial weights
+        """
+        from search_space.export import export_for_speed, strip_nni
+
+        key = (name, n, height, width)
+        if key not in self.models:
+            model = strip_nni(build_model(self.archs[name]))
+            if n > 1:
+                model = batch_models([copy.deepcopy(model) for _ in range(n)])
+            model = model.to(self.device).train()
+            example_input = torch.randn(n, 1, height, width, device=self.device)
+            fast, backend = export_for_speed(model, example_input, verbose=False)
+            self.models[key] = (fast, {k: v.clone() for k, v in fast.state_dict().items()})
+        fast, initial_state = self.models[key]
+        fast.load_state_dict(initial_state)
+        return fast
+
+def worker_main(archs, batches, events, device, resolution, threads):
+    """
+    Worker process: warm up the networks, then denoise the batches of the dispatcher
+    """
+    if threads is not None:
+        torch.set_num_threads(threads)
+    pool = ModelPool(archs, device)
+    for name in archs:
+        pool.get(name, 1, resolution, resolution)
+    events.put(('ready', None, os.getpid()))
+
+    while True:
+        batch = batches.get()
+        if batch is None:
+            break
+        job_ids = [job_id for job_id, _ in batch['jobs']]
+        try:
+            images = torch.tensor(np.stack([image for _, image in batch['jobs']]), dtype=torch.float32, device=device).unsqueeze(1)
+            model = pool.get(batch['arch'], len(job_ids), images.shape[-2], images.shape[-1])
+
+            def progress(infos):
+                for job_id, info in zip(job_ids, infos):
+                    events.put(('progress', job_id, info))
+
+            results = denoise_batch(model, images, PRESETS[batch['preset']], progress)
+            for job_id, result in zip(job_ids, results):
+                events.put(('done', job_id, result))
+        except Exception as e:
+            for job_id in job_ids:
+                events.put(('error', job_id, f'{type(e).__name__}: {e}'))
+
+
+def decode_image(request):
+    """
+    (H, W) float32 array of a DenoiseRequest and the encoding to answer with
+    """
+    if request.array is not None:
+        image, encoding = np.asarray(request.array, dtype=np.float32), 'array'
+    elif request.npy is not None:
+        image, encoding = np.load(io.BytesIO(base64.b64decode(request.npy))).astype(np.float32), 'npy'
+    elif request.png is not None:
+        from PIL import Image
+        image = np.asarray(Image.open(io.BytesIO(base64.b64decode(request.png))).convert('L'), dtype=np.float32) / 255.
+        encoding = 'png'
+    else:
+        raise ValueError("give the image as 'array', 'npy' or 'png'")
+    image = np.squeeze(image)
+    if image.ndim != 2:
+        raise ValueError(f"expected one grayscale image, got shape {image.shape}")
+    return image, encoding
+
+def encode_image(image, encoding):
+    if encoding == 'array':
+        return image.tolist()
+    buffer = io.BytesIO()
+    if encoding == 'npy':
+        np.save(buffer, image)
+    else:
+        from PIL import Image
+        Image.fromarray((np.clip(image, 0., 1.) * 255).round().astype(np.uint8)).save(buffer, format='PNG')
+    return base64.b64encode(buffer.getvalue()).decode()
+
+
+class DenoiseRequest(BaseModel):
+    arch: str = 'UNetBasic'
+    preset: str = 'default'
+    array: Optional[List[List[float]]] = None
+    npy: Optional[str] = None
+    png: Optional[str] = None
+
+
+class DenoiseService:
+    """
+    Job table, dispatcher (queue -> batches) and worker pool behind the app
+
+    Args:
+        archs: {name: spec}, see load_archs
+        workers: number of worker processes
+        max_batch: most images denoised together
+        batch_window: seconds the dispatcher waits for more requests to batch with the first one
+        device: device of the workers
+        resolution: image size the networks are compiled for up front, other sizes compile on first use
+        threads: torch threads per worker, None keeps torch's default
+        job_ttl: seconds a finished job (and its result) stays available
+        max_finished: most finished jobs kept, the oldest go first
+    """
+    def __init__(self, archs, workers=2, max_batch=4, batch_window=0.05, device='cpu', resolution=64, threads=None,
+                 job_ttl=600., max_finished=1000):
+        self.archs = archs
+        self.num_workers = workers
+        self.max_batch = max_batch
+        self.batch_window = batch_window
+        self.device = device
+        self.resolution = resolution
+        self.threads = threads
+        self.job_ttl = job_ttl
+        self.max_finished = max_finished
+
+        self.jobs = {}
+        # {job_id: time it finished}, oldest first, for the eviction
+        self.finished = OrderedDict()
+        self.lock = threading.Lock()
+        self.submissions = queue.Queue()
+        self.ready = 0
+        self.stopping = False
+
+    def start(self):
+        context = multiprocessing.get_context('spawn')
+        self.batches = context.Queue()
+        self.events = context.Queue()
+        self.workers = [
+            context.Process(target=worker_main, daemon=True,
+                            args=(self.archs, self.batches, self.events, self.device, self.resolution, self.threads))
+            for _ in range(self.num_workers)
+        ]
+        for worker in self.workers:
+            worker.start()
+        self.background = [threading.Thread(target=target, daemon=True) for target in (self.dispatch, self.collect)]
+        for thread in self.background:
+            thread.start()
+
+    def stop(self):
+        self.stopping = True
+        for _ in self.workers:
+            self.batches.put(None)
+        for worker in self.workers:
+            worker.join(timeout=5)
+            if worker.is_alive():
+                worker.terminate()
+
+    def submit(self, image, arch, preset, encoding):
+        if arch not in self.archs:
+            raise ValueError(f"Unknown architecture {arch}, choose from {list(self.archs)}")
+        if preset not in PRESETS:
+            raise ValueError(f"Unknown preset {preset}, choose from {list(PRESETS)}")
+        job_id = uuid.uuid4().hex
+        with self.lock:
+            self.jobs[job_id] = {'status': 'queued', 'arch': arch, 'preset': preset, 'encoding': encoding,
+                                 'submitted': time.time(), 'events': [], 'result': None, 'error': None}
+        self.submissions.put((job_id, image))
+        return job_id
+
+    def dispatch(self):
+        """
+        Group the requests of a batch_window by (arch, preset, size), max_batch images per batch
+        """
+        while not self.stopping:
+            try:
+                pending = [self.submissions.get(timeout=0.5)]
+            except queue.Empty:
+                continue
+            deadline = time.monotonic() + self.batch_window
+            while len(pending) < self.max_batch * self.num_workers:
+                timeout = deadline - time.monotonic()
+                if timeout <= 0:
+                    break
+                try:
+                    pending.append(self.submissions.get(timeout=timeout))
+                except queue.Empty:
+                    break
+
+            groups = OrderedDict()
+            for job_id, image in pending:
+                job = self.jobs[job_id]
+                groups.setdefault((job['arch'], job['preset'], image.shape), []).append((job_id, image))
+            for (arch, preset, _), jobs in groups.items():
+                for start in range(0, len(jobs), self.max_batch):
+                    self.batches.put({'arch': arch, 'preset': preset, 'jobs': jobs[start:start + self.max_batch]})
+
+    def collect(self):
+        """
+        Apply the workers' events to the job table
+        """
+        while not self.stopping:
+            self.evict()
+            try:
+                kind, job_id, payload = self.events.get(timeout=0.5)
+            except queue.Empty:
+                continue
+            if kind == 'ready':
+                self.ready += 1
+                continue
+            with self.lock:
+                job = self.jobs.get(job_id)
+                if job is None:
+                    continue
+                if kind == 'progress':
+                    job['status'] = 'running'
+                    job['events'].append(payload)
+                elif kind == 'done':
+                    job['status'] = 'done'
+                    job['result'] = dict(payload, **{
+                        name: encode_image(payload[name], job['encoding'])
+                        for name in ('denoised', 'std', 'lower', 'upper') if payload[name] is not None
+                    })
+                    job['events'].append({'done': True, 'stop_iter': payload['stop_iter'], 'iterations': payload['iterations']})
+                    self.finished[job_id] = time.monotonic()
+                else:
+                    job['status'] = 'error'
+                    job['error'] = payload
+                    job['events'].append({'error': payload})
+                    self.finished[job_id] = time.monotonic()
+
+    def evict(self):
+        """
+        Drop the finished jobs older than job_ttl and the oldest beyond max_finished
+        """
+        deadline = time.monotonic() - self.job_ttl
+        with self.lock:
+            while self.finished:
+                job_id, finished = next(iter(self.finished.items()))
+                if finished > deadline and len(self.finished) <= self.max_finished:
+                    break
+                del self.finished[job_id]
+                del self.jobs[job_id]
+
+    def summary(self, job_id):
+        with self.lock:
+            job = self.jobs.get(job_id)
+            if job is None:
+                return None
+            return {
+                'job_id': job_id,
+                'status': job['status'],
+                'arch': job['arch'],
+                'preset': job['preset'],
+                'progress': job['events'][-1] if job['events'] else None,
+                'result': job['result'],
+                'error': job['error'],
+            }
+
+
+def create_app(archs=None, **service_kwargs):
+    """
+    FastAPI app serving `archs` (load_archs()), service_kwargs go to DenoiseService
+    """
+    service = DenoiseService(archs if archs is not None else load_archs(), **service_kwargs)
+    app = FastAPI(title='DIP denoising')
+    app.state.service = service
+
+    @app.on_event('startup')
+    def startup():
+        service.start()
+
+    @app.on_event('shutdown')
+    def shutdown():
+        service.stop()
+
+    @app.middleware('http')
+    async def localhost_only(request: Request, call_next):
+        if request.client is None or request.client.host not in LOCALHOST:
+            return JSONResponse({'detail': 'localhost only'}, status_code=403)
+        return await call_next(request)
+
+    @app.get('/health')
+    def health():
+        return {'workers': service.num_workers, 'ready': service.ready}
+
+    @app.get('/archs')
+    def get_archs():
+        return service.archs
+
+    @app.get('/presets')
+    def get_presets():
+        return PRESETS
+
+    @app.post('/denoise')
+    def denoise(request: DenoiseRequest):
+        try:
+            image, encoding = decode_image(request)
+            job_id = service.submit(image, request.arch, request.preset, encoding)
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+        return service.summary(job_id)
+
+    @app.get('/jobs/{job_id}')
+    def job(job_id: str):
+        summary = service.summary(job_id)
+        if summary is None:
+            raise HTTPException(status_code=404, detail=f'Unknown job {job_id}')
+        return summary
+
+    @app.get('/jobs/{job_id}/events')
+    async def events(job_id: str):
+        if service.summary(job_id) is None:
+            raise HTTPException(status_code=404, detail=f'Unknown job {job_id}')
+
+        async def stream():
+            sent = 0
+            while True:
+                with service.lock:
+                    job = service.jobs.get(job_id)
+                    if job is None:
+                        # evicted, the stream ends
+                        break
+                    new, finished = job['events'][sent:], job['status'] in ('done', 'error')
+                for event in new:
+                    yield json.dumps(event) + '\n'
+                sent += len(new)
+                if finished:
+                    break
+                await asyncio.sleep(0.2)
+
+        return StreamingResponse(stream(), media_type='application/x-ndjson')
+
+    return app
+
+if __name__ == '__main__':
+    import argparse
+
+    parser = argparse.ArgumentParser(description='Local DIP denoising service')
+    parser.add_argument('--archs', default=None, help='directory of exported architecture JSON files')
+    parser.add_argument('--port', type=int, default=8000)
+    parser.add_argument('--workers', type=int, default=2)
+    parser.add_argument('--max-batch', type=int, default=4)
+    parser.add_argument('--batch-window', type=float, default=0.05)
+    parser.add_argument('--device', default='cpu')
+    parser.add_argument('--resolution', type=int, default=64)
+    parser.add_argument('--threads', type=int, default=None)
+    parser.add_argument('--job-ttl', type=float, default=600., help='seconds finished jobs stay available')
+    args = parser.parse_args()
+
+    import uvicorn
+
+    app = create_app(
+        load_archs(args.archs),
+        workers=args.workers,
+        max_batch=args.max_batch,
+        batch_window=args.batch_window,
+        device=args.device,
+        resolution=args.resolution,
+        threads=args.threads,
+        job_ttl=args.job_ttl,
+    )
+    # localhost only, never 0.0.0.0
+    uvicorn.run(app, host='127.0.0.1', port=args.port)
@@ -0,0 +1,234 @@
+"""
+Fit N independent DIP problems with one forward pass
+
+`batch_models` takes N structurally identical networks (e.g. N calls to the same model_cls)
+and merges them into a single module mapping (N, C, H, W) -> (N, C', H', W') where sample k
+only ever sees the weights of network k.
+    - Conv2d / ConvTranspose2d become one grouped conv with N times the groups,
+      the batch is folded into the channels (1, N*C, H, W) for the call and unfolded after
+    - BatchNorm2d becomes BatchNorm2d(N*C) on the folded tensor, so the statistics stay per problem
+      (with batch size 1 this is exactly what each single-image network computed)
+    - Linear becomes a per-sample baddbmm
+    - parameter free modules (activations, pooling, upsampling, ...) work on the batch as is
+
+Between layers the activations keep the usual (N, C, H, W) layout so torch.cat(..., dim=1)
+skip connections and .view(b, c) in the forward methods of the search spaces still work.
+Layers holding parameters or buffers that aren't listed above raise NotImplementedError
+"""
+
+import copy
+
+import torch
+import torch.nn as nn
+
+
+class BatchedConv2d(nn.Module):
+    def __init__(self, convs):
+        super().__init__()
+        ref = convs[0]
+        self.n = len(convs)
+        self.conv = nn.Conv2d(
+            self.n * ref.in_channels,
+            self.n * ref.out_channels,
+            kernel_size=ref.kernel_size,
+            stride=ref.stride,
+            padding=ref.padding,
+            dilation=ref.dilation,
+            groups=self.n * ref.groups,
+            bias=ref.bias is not None,
+            padding_mode=ref.padding_mode,
+        )
+        with torch.no_grad():
+            # (N*C_out, C_in/groups, k, k), group n*groups + j is group j of network n
+            self.conv.weight.copy_(torch.cat([c.weight for c in convs]))
+            if ref.bias is not None:
+                self.conv.bias.copy_(torch.cat([c.bias for c in convs]))
+
+    def forward(self, x):
+        n, c, h, w = x.shape
+        y = self.conv(x.reshape(1, n * c, h, w))
+        return y.view(n, -1, y.shape[-2], y.shape[-1])
+
+
+class BatchedConvTranspose2d(nn.Module):
+    def __init__(self, convs):
+        super().__init__()
+        ref = convs[0]
+        self.n = len(convs)
+        self.conv = nn.ConvTranspose2d(
+            self.n * ref.in_channels,
+            self.n * ref.out_channels,
+            kernel_size=ref.kernel_size,
+            stride=ref.stride,
+            padding=ref.padding,
+            output_padding=ref.output_padding,
+            groups=self.n * ref.groups,
+            bias=ref.bias is not None,
+            dilation=ref.dilation,
+            padding_mode=ref.padding_mode,
+        )
+        with torch.no_grad():
+            # transposed weights are (C_in, C_out/groups, k, k)
+            self.conv.weight.copy_(torch.cat([c.weight for c in convs]))
+            if ref.bias is not None:
+                self.conv.bias.copy_(torch.cat([c.bias for c in convs]))
+
+    def forward(self, x):
+        n, c, h, w = x.shape
+        y = self.conv(x.reshape(1, n * c, h, w))
+        return y.view(n, -1, y.shape[-2], y.shape[-1])
+
+
+class BatchedBatchNorm2d(nn.Module):
+    def __init__(self, norms):
+        super().__init__()
+        ref = norms[0]
+        self.n = len(norms)
+        self.norm = nn.BatchNorm2d(
+            self.n * ref.num_features,
+            eps=ref.eps,
+            momentum=ref.momentum,
+            affine=ref.affine,
+            track_running_stats=ref.track_running_stats,
+        )
+        with torch.no_grad():
+            if ref.affine:
+                self.norm.weight.copy_(torch.cat([b.weight for b in norms]))
+                self.norm.bias.copy_(torch.cat([b.bias for b in norms]))
+            if ref.track_running_stats:
+                self.norm.running_mean.copy_(torch.cat([b.running_mean for b in norms]))
+                self.norm.running_var.copy_(torch.cat([b.running_var for b in norms]))
+                self.norm.num_batches_tracked.copy_(ref.num_batches_tracked)
+
+    def forward(self, x):
+        n, c, h, w = x.shape
+        return self.norm(x.reshape(1, n * c, h, w)).view(n, c, h, w)
+
+
+class BatchedLinear(nn.Module):
+    def __init__(self, linears):
+        super().__init__()
+        ref = linears[0]
+        self.n = len(linears)
+        self.in_features = ref.in_features
+        self.out_features = ref.out_features
+        # stored transposed, (N, in, out), so the forward is a plain bmm
+        self.weight = nn.Parameter(torch.stack([l.weight.detach().t() for l in linears]).contiguous())
+        if ref.bias is not None:
+            self.bias = nn.Parameter(torch.stack([l.bias.detach() for l in linears]).unsqueeze(1))
+        else:
+            self.register_parameter('bias', None)
+
+    def forward(self, x):
+        shape = x.shape
+        x = x.reshape(self.n, -1, self.in_features)
+        if self.bias is None:
+            y = torch.bmm(x, self.weight)
+        else:
+            y = torch.baddbmm(self.bias, x, self.weight)
+        return y.view(*shape[:-1], self.out_features)
+
+
+# order matters, the NNI wrappers (nni.retiarii.nn.pytorch) subclass the torch layers
+BATCHED_LAYERS = [
+    (nn.Conv2d, BatchedConv2d),
+    (nn.ConvTranspose2d, BatchedConvTranspose2d),
+    (nn.BatchNorm2d, BatchedBatchNorm2d),
+    (nn.Linear, BatchedLinear),
+]
+
+def batched_layer(module):
+    for layer, batched in BATCHED_LAYERS:
+        if isinstance(module, layer):
+            return batched
+    return None
+
+def batch_models(models):
+    """
+    Merge N structurally identical networks into one network over a batch of N problems
+
+    Args:
+        models: list of nn.Module, e.g. [model_cls() for _ in range(N)]
+    Returns:
+        nn.Module with independent weights per problem, expects inputs of batch size N
+    """
+    if len(models) == 0:
+        raise ValueError("batch_models needs at least one model")
+    batched = copy.deepcopy(models[0])
+    _batch_children(batched, models, prefix='')
+    return batched
+
+def _batch_children(target, models, prefix):
+    for name, child in list(target._modules.items()):
+        if child is None:
+            continue
+        path = prefix + name
+        peers = [m._modules.get(name) for m in models]
+        if any(type(p) is not type(child) for p in peers):
+            raise ValueError(f"models differ at '{path}', they must share one architecture to be batched")
+
+        batched = batched_layer(child)
+        if batched is not None:
+            target._modules[name] = batched(peers)
+            continue
+
+        has_state = any(p is not None for p in child._parameters.values()) \
+            or any(b is not None for b in child._buffers.values())
+        if has_state:
+            raise NotImplementedError(f"can't batch '{path}' ({type(child).__name__}), it holds parameters or buffers")
+        _batch_children(child, peers, prefix=path + '.')
+
+def unbatch_state_dict(batched, n):
+    """
+    Split the weights of a batched network back into N state dicts of the original layout
+    Handy to export the k-th network of a grid run
+    """
+    state_dicts = [{} for _ in range(n)]
+    for module_name, module in batched.named_modules():
+        prefix = module_name + '.' if module_name else ''
+        if isinstance(module, (BatchedConv2d, BatchedConvTranspose2d)):
+            inner = module.conv
+        elif isinstance(module, BatchedBatchNorm2d):
+            inner = module.norm
+        elif isinstance(module, BatchedLinear):
+            for k in range(n):
+                state_dicts[k][prefix + 'weight'] = module.weight[k].t().clone()
+                if module.bias is not None:
+                    state_dicts[k][prefix + 'bias'] = module.bias[k, 0].clone()
+            continue
+        else:
+            continue
+        # the wrapped layer's keys lose the 'conv.' / 'norm.' level in the original layout
+        for key, value in inner.state_dict().items():
+            chunks = [value] * n if value.dim() == 0 else value.chunk(n)
+            for k in range(n):
+                state_dicts[k][prefix + key] = chunks[k].clone()
+    return state_dicts
+
+def batch_optimizer_state(model, optimizer, n):
+    """
+    Per-parameter state of `optimizer` over `model` laid out for batch_models([model] * n),
+    one dict per parameter of the batched network (empty for the ones without state)
+
+    Tensor states (Adam's moments, SGLD's preconditioner) go through batch_models like the
+    weights, so every copy starts from the same state, the others (step counts) are copied
+    """
+    params = list(model.parameters())
+    states = [optimizer.state.get(p, {}) for p in params]
+    batched_states = [{} for _ in params]
+    keys = {key for state in states for key, value in state.items() if torch.is_tensor(value) and value.dim() > 0}
+    for key in keys:
+        # a copy of the network carrying the state in place of the weights
+        carrier = copy.deepcopy(model)
+        with torch.no_grad():
+            for p, state in zip(carrier.parameters(), states):
+                if key in state:
+                    p.copy_(state[key])
+        for k, (p, state) in enumerate(zip(batch_models([carrier] * n).parameters(), states)):
+            if key in state:
+                batched_states[k][key] = p.detach().clone()
+    for batched, state in zip(batched_states, states):
+        for key, value in state.items():
+            if key not in batched:
+                batched[key] = copy.deepcopy(value)
+    return batched_states
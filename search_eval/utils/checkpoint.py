@@ -0,0 +1,113 @@
+"""
+Checkpoints of the full evaluator state, written off the training loop
+
+The training loop only pays for a host snapshot (device to host copies of the tensors), a
+background thread torch.saves it to a temporary file and os.replace's it over the checkpoint,
+so a crash or preemption mid-write leaves the previous checkpoint intact.
+The RNG states are part of the state so a resumed run draws the same noise
+(bit for bit as long as the kernels are deterministic, cudnn.benchmark is not).
+"""
+
+import os
+import queue
+import random
+import threading
+
+import numpy as np
+import torch
+
+def snapshot(obj):
+    """
+    Host copy of a (nested) state, tensors are detached and cloned to the CPU
+    """
+    if torch.is_tensor(obj):
+        return obj.detach().to('cpu', copy=True)
+    if isinstance(obj, dict):
+        return {k: snapshot(v) for k, v in obj.items()}
+    if isinstance(obj, (list, tuple)):
+        return type(obj)(snapshot(v) for v in obj)
+    return obj
+
+def rng_state():
+    state = {
+        'torch': torch.get_rng_state(),
+        'numpy': np.random.get_state(),
+        'python': random.getstate(),
+    }
+    if torch.cuda.is_available():
+        state['cuda'] = torch.cuda.get_rng_state_all()
+    return state
+
+def set_rng_state(state):
+    torch.set_rng_state(state['torch'])
+    np.random.set_state(state['numpy'])
+    random.setstate(state['python'])
+    if 'cuda' in state and torch.cuda.is_available():
+        torch.cuda.set_rng_state_all(state['cuda'])
+
+def load_checkpoint(path, map_location='cpu'):
+    """
+    The state saved at `path`, None if there is no checkpoint
+    """
+    if not os.path.exists(path):
+        return None
+    return torch.load(path, map_location=map_location)
+
+
+class AsyncCheckpointer:
+    """
+    Args:
+        path: checkpoint file, its directory is created if needed
+    A snapshot still waiting to be written when the next one comes is replaced by it,
+    only the latest state matters. A failed write stops the thread, the error is raised
+    again in the training loop by the next save or close
+    """
+    def __init__(self, path):
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self.path = path
+        self.error = None
+        self.queue = queue.Queue(maxsize=1)
+        self.thread = threading.Thread(target=self.run, daemon=True)
+        self.thread.start()
+
+    def save(self, state):
+        """
+        Snapshot `state` and queue it, returns once the host copy is done
+        """
+        self.check()
+        state = snapshot(state)
+        try:
+            self.queue.get_nowait()
+        except queue.Empty:
+            pass
+        self.queue.put(state)
+
+    def run(self):
+        while True:
+            state = self.queue.get()
+            if state is None:
+                break
+            tmp = f'{self.path}.tmp'
+            try:
+                torch.save(state, tmp)
+                os.replace(tmp, self.path)
+            except Exception as e:
+                self.error = e
+                break
+
+    def check(self):
+        """
+        Raise the error of a failed write, once
+        """
+        if self.error is not None:
+            error, self.error = self.error, None
+            raise RuntimeError(f"writing the checkpoint {self.path} failed") from error
+
+    def close(self):
+        """
+        Write whatever is still queued, then stop the thread
+        """
+        if self.thread.is_alive():
+            self.queue.put(None)
+            self.thread.join()
+        self.check()
@@ -115,16 +115,16 @@ def get_image(path, imsize=-1):
 
 
 
-def fill_noise(x, noise_type):
-    """Fills tensor `x` with noise of type `noise_type`."""
+def fill_noise(x, noise_type, generator=None):
+    """Fills tensor `x` with noise of type `noise_type`, drawn from `generator` if given."""
     if noise_type == 'u':
-        x.uniform_()
+        x.uniform_(generator=generator)
     elif noise_type == 'n':
-        x.normal_() 
+        x.normal_(generator=generator)
     else:
         assert False
 
-def get_noise(input_depth, method, spatial_size, noise_type='u', var=1./10):
+def get_noise(input_depth, method, spatial_size, noise_type='u', var=1./10, generator=None):
     """Returns a pytorch.Tensor of size (1 x `input_depth` x `spatial_size[0]` x `spatial_size[1]`) 
     initialized in a specific way.
     Args:
@@ -133,6 +133,7 @@ def get_noise(input_depth, method, spatial_size, noise_type='u', var=1./10):
         spatial_size: spatial size of the tensor to initialize
         noise_type: 'u' for uniform; 'n' for normal
         var: a factor, a noise will be multiplicated by. Basically it is standard deviation scaler. 
+        generator: torch.Generator to draw the noise from, the global RNG if None
     """
     if isinstance(spatial_size, int):
         spatial_size = (spatial_size, spatial_size)
@@ -140,7 +141,7 @@ def get_noise(input_depth, method, spatial_size, noise_type='u', var=1./10):
         shape = [1, input_depth, spatial_size[0], spatial_size[1]]
         net_input = torch.zeros(shape)
         
-        fill_noise(net_input, noise_type)
+        fill_noise(net_input, noise_type, generator)
         net_input *= var            
     elif method == 'meshgrid': 
         assert input_depth == 2
@@ -0,0 +1,94 @@
+"""
+Convergence diagnostics of several SGLD chains
+
+R-hat compares the variance of the chains' means with the variance within the chains
+(Gelman et al., BDA3 ch. 11.4), with m chains of n samples each
+
+    W = mean of the within-chain variances
+    B/n = variance of the chain means
+    var+ = (n - 1) / n * W + B/n
+    R-hat = sqrt(var+ / W)              -> 1 as the chains forget where they started
+
+pixel_rhat does this per pixel from a Welford over the stacked (chains, C, H, W) samples, so it
+needs no stored sample. The scalar traces (e.g. a PSNR per chain and sample) are small enough
+to keep, split_rhat splits each chain in halves first (which also catches a drift within the
+chains) and ess is the multi-chain effective sample size with Geyer's initial monotone sequence
+of the autocorrelations (Vehtari et al. 2021, without the rank normalization).
+"""
+
+import math
+
+import numpy as np
+
+def pixel_rhat(welford, eps=1e-12):
+    """
+    Per-pixel R-hat of a Welford fed with (chains, ...) samples, as a (...) tensor
+    Pixels that are constant in every chain come out 0
+    """
+    n = welford.count()
+    within = welford.variance().mean(0)
+    between = welford.mean.var(0)
+    var_plus = within * ((n - 1) / n) + between
+    return var_plus.div_(within.clamp_(min=eps)).sqrt_()
+
+def rhat(traces):
+    """
+    R-hat of (chains, n) scalar traces, 1 for traces without any variance
+    """
+    traces = np.asarray(traces, dtype=np.float64)
+    m, n = traces.shape
+    within = traces.var(axis=1, ddof=1).mean()
+    between = traces.mean(axis=1).var(ddof=1) if m > 1 else 0.
+    var_plus = within * (n - 1) / n + between
+    if within <= 0:
+        return 1. if var_plus <= 0 else math.inf
+    return math.sqrt(var_plus / within)
+
+def split_rhat(traces):
+    """
+    R-hat of the first and second halves of the (chains, n) traces as 2 * chains chains
+    """
+    traces = np.asarray(traces, dtype=np.float64)
+    half = traces.shape[1] // 2
+    if half < 2:
+        raise ValueError(f"split R-hat needs at least 4 samples per chain, got {traces.shape[1]}")
+    return rhat(np.concatenate([traces[:, :half], traces[:, -half:]]))
+
+def autocovariance(x):
+    """
+    Autocovariance of a 1-d trace at every lag, through the FFT
+    """
+    n = len(x)
+    size = 2 ** math.ceil(math.log2(2 * n))
+    f = np.fft.rfft(x - x.mean(), size)
+    return np.fft.irfft(f * np.conj(f), size)[:n] / n
+
+def ess(traces):
+    """
+    Effective sample size of the (chains, n) traces together
+    """
+    traces = np.asarray(traces, dtype=np.float64)
+    m, n = traces.shape
+    if n < 4:
+        raise ValueError(f"ess needs at least 4 samples per chain, got {n}")
+    acov = np.stack([autocovariance(chain) for chain in traces])
+    within = acov[:, 0].mean() * n / (n - 1)
+    between = traces.mean(axis=1).var(ddof=1) if m > 1 else 0.
+    var_plus = within * (n - 1) / n + between
+    if var_plus <= 0:
+        return float(m * n)
+    rho = 1. - (within - acov.mean(axis=0)) / var_plus
+    rho[0] = 1.
+
+    # sum of the pairs rho[2t] + rho[2t+1] while positive, made non-increasing
+    tau = -1.
+    previous = math.inf
+    for t in range(0, n - 1, 2):
+        pair = rho[t] + rho[t + 1]
+        if pair < 0:
+            break
+        previous = min(pair, previous)
+        tau += 2 * previous
+    # antithetic chains can make tau tiny, bound the ESS like Stan does
+    tau = max(tau, 1. / math.log10(m * n))
+    return m * n / tau
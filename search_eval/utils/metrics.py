@@ -0,0 +1,24 @@
+import torch
+
+def psnr(img_true, img_test, data_range=1.):
+    """
+    Peak signal to noise ratio computed on the tensors' device
+
+    Matches skimage.metrics.peak_signal_noise_ratio for float images in [0, 1]
+    (skimage infers data_range=1 for those), but returns a 0-d tensor so the
+    caller decides when to synchronize with the host (e.g. only at report_every)
+
+    Args:
+        img_true: ground truth tensor
+        img_test: tensor of the same shape as `img_true`
+        data_range: max - min of the possible image values
+    """
+    mse = torch.mean((img_true - img_test) ** 2)
+    return 10 * torch.log10(data_range ** 2 / mse)
+
+def batch_psnr(img_true, img_test, data_range=1.):
+    """
+    PSNR of each sample of a (N, ...) batch, returns a (N,) tensor on the tensors' device
+    """
+    mse = torch.mean((img_true - img_test).flatten(1) ** 2, dim=1)
+    return 10 * torch.log10(data_range ** 2 / mse)
@@ -0,0 +1,133 @@
+"""
+Streaming per-pixel posterior statistics of the SGLD samples
+
+Welford keeps the running mean and sum of squared deviations (M2) of the samples it is given,
+in place on their device: one buffer each plus one scratch buffer, whatever the number of
+samples, so the sampling phase gets a variance / uncertainty map without storing a sample.
+
+    n += 1
+    delta = x - mean
+    mean += delta / n
+    M2 += delta^2 * (n - 1) / n        (= delta * (x - new mean))
+    variance = M2 / (n - 1)
+
+With a mask (e.g. the images of a batch still collecting samples) n is a per-sample count and
+only the masked samples are updated. The credible intervals are the Gaussian ones of each
+pixel's posterior, mean +- z * std.
+
+save_posterior writes the maps of a run next to the denoised mean:
+    path.npz    {'mean', 'std', 'lower', 'upper', 'n'} of the MCMC_iter thinned samples,
+                the same with an '_each' suffix for every sample after the burn-in, and 'level'
+"""
+
+import os
+from statistics import NormalDist
+
+import numpy as np
+import torch
+
+class Welford:
+    """
+    Args:
+        dtype: accumulation dtype, the dtype of the first sample if None
+    """
+    def __init__(self, dtype=None):
+        self.dtype = dtype
+        self.n = 0
+        self.mean = None
+        self.m2 = None
+        self.delta = None
+
+    @torch.no_grad()
+    def update(self, x, mask=None):
+        """
+        Add the sample x, with a mask (broadcastable to x, 1 = update) only where it is set
+        """
+        if self.mean is None:
+            dtype = x.dtype if self.dtype is None else self.dtype
+            self.mean = torch.zeros_like(x, dtype=dtype)
+            self.m2 = torch.zeros_like(x, dtype=dtype)
+            self.delta = torch.zeros_like(x, dtype=dtype)
+        torch.sub(x, self.mean, out=self.delta)
+
+        if mask is None:
+            self.n += 1
+            self.mean.add_(self.delta, alpha=1. / self.n)
+            self.m2.addcmul_(self.delta, self.delta, value=(self.n - 1) / self.n)
+            return
+
+        if not torch.is_tensor(self.n):
+            self.n = torch.zeros_like(mask, dtype=self.mean.dtype)
+        self.n.add_(mask)
+        self.delta.mul_(mask)
+        n = self.n.clamp(min=1)
+        self.mean.addcdiv_(self.delta, n)
+        self.m2.addcmul_(self.delta, self.delta * ((n - 1) / n))
+
+    def count(self):
+        """
+        Number of samples, the smallest per-sample count with a mask
+        """
+        return int(self.n.min().item()) if torch.is_tensor(self.n) else self.n
+
+    def variance(self):
+        """
+        Unbiased per-pixel variance, zeros before the second sample
+        """
+        if self.mean is None:
+            return None
+        if torch.is_tensor(self.n):
+            return self.m2 / (self.n - 1).clamp(min=1)
+        return self.m2 / max(self.n - 1, 1)
+
+    def std(self):
+        variance = self.variance()
+        return None if variance is None else variance.sqrt_()
+
+    def credible_interval(self, level=0.95):
+        """
+        (lower, upper) per-pixel bounds of the central `level` credible interval
+        """
+        if self.mean is None:
+            return None, None
+        half = self.std().mul_(NormalDist().inv_cdf((1 + level) / 2))
+        return self.mean - half, self.mean + half
+
+    def state_dict(self):
+        return {'n': self.n, 'mean': self.mean, 'm2': self.m2}
+
+    def load_state_dict(self, state, device=None):
+        self.n = state['n'].to(device) if torch.is_tensor(state['n']) else state['n']
+        self.mean = None if state['mean'] is None else state['mean'].to(device)
+        self.m2 = None if state['m2'] is None else state['m2'].to(device)
+        self.delta = None if self.mean is None else torch.zeros_like(self.mean)
+
+
+def posterior_maps(welford, level=0.95, suffix=''):
+    """
+    {'mean', 'std', 'lower', 'upper', 'n'} of a Welford as host arrays, `suffix` appended to the names
+    """
+    maps = {f'n{suffix}': np.asarray(welford.n.cpu().numpy() if torch.is_tensor(welford.n) else welford.n)}
+    if welford.mean is None:
+        return maps
+    lower, upper = welford.credible_interval(level)
+    for name, value in (('mean', welford.mean), ('std', welford.std()), ('lower', lower), ('upper', upper)):
+        maps[f'{name}{suffix}'] = value.detach().cpu().numpy()
+    return maps
+
+def save_posterior(path, posterior, posterior_each=None, level=0.95):
+    """
+    Write the maps of the thinned (and every-sample) Welfords to `path`.npz, through a temporary file
+    Returns the file name
+    """
+    arrays = {'level': np.float64(level)}
+    arrays.update(posterior_maps(posterior, level))
+    if posterior_each is not None:
+        arrays.update(posterior_maps(posterior_each, level, '_each'))
+    filename = path + '.npz'
+    os.makedirs(os.path.dirname(os.path.abspath(filename)), exist_ok=True)
+    # through a file object, np.savez would append .npz to the temporary name
+    with open(filename + '.tmp', 'wb') as f:
+        np.savez(f, **arrays)
+    os.replace(filename + '.tmp', filename)
+    return filename
@@ -0,0 +1,30 @@
+"""
+Precision modes of the evaluators
+
+    precision=32      plain fp32
+    precision='bf16'  the network runs under bfloat16 autocast (CPU or GPU), convolutions in bf16.
+                      The parameters stay fp32 master weights, so the optimizer step and the SGLD
+                      noise are fp32, and the output is cast back to fp32 before the loss, so the
+                      PSNR, ES variance and SGLD means are accumulated in fp32 as well.
+
+bf16 keeps the fp32 exponent range, no loss scaling is needed unlike fp16.
+"""
+
+import contextlib
+
+import torch
+
+PRECISIONS = ('32', 'bf16')
+
+def check_precision(precision):
+    """
+    Normalized precision, 32 or 'bf16'
+    """
+    if str(precision) not in PRECISIONS:
+        raise ValueError(f"precision must be one of {PRECISIONS}, got {precision}")
+    return 'bf16' if str(precision) == 'bf16' else 32
+
+def autocast(precision, device):
+    if precision == 'bf16':
+        return torch.autocast(device_type=torch.device(device).type, dtype=torch.bfloat16)
+    return contextlib.nullcontext()
@@ -0,0 +1,141 @@
+"""
+Progress snapshots (original / denoised / noisy panels) for the evaluators
+
+Inline (notebooks): show_panels draws with pyplot and closes the figure once shown
+Offline (searches): ProgressRenderer takes snapshots through a bounded queue and a
+background thread renders them to PNGs with one reused Agg figure, the training
+loop only pays for a (downsampled) device to host copy
+"""
+
+import os
+import queue
+import threading
+
+import numpy as np
+import torch
+import matplotlib.pyplot as plt
+from matplotlib.figure import Figure
+from matplotlib.backends.backend_agg import FigureCanvasAgg
+
+def to_host(img, max_size=None):
+    """
+    Copy of an image on the host, strided down to at most `max_size` pixels per side
+    Always a copy so later in-place updates (e.g. of the SGLD mean) don't leak into the snapshot
+    """
+    if max_size is not None:
+        step = max(1, -(-max(img.shape[-2:]) // max_size))
+        img = img[..., ::step, ::step]
+    if torch.is_tensor(img):
+        return img.detach().to('cpu', copy=True).float().numpy()
+    return np.array(img, dtype=np.float32)
+
+def draw_panels(axes, panels):
+    for ax, (title, img) in zip(axes, panels):
+        ax.clear()
+        ax.imshow(np.squeeze(img), cmap='gray')
+        ax.set_title(title)
+        ax.axis('off')
+
+def show_panels(panels, figsize=(10, 5)):
+    """
+    Draw the panels in the notebook and close the figure so they don't pile up
+    """
+    fig, ax = plt.subplots(1, len(panels), figsize=figsize)
+    draw_panels(np.atleast_1d(ax), [(title, to_host(img)) for title, img in panels])
+    plt.tight_layout()
+    plt.show()
+    plt.close(fig)
+
+def show_rows(rows, figsize=None):
+    """
+    show_panels with one row of panels per entry of `rows`, e.g. the problems of a batched run
+    """
+    fig, ax = plt.subplots(len(rows), len(rows[0]), figsize=figsize or (10, 3.5 * len(rows)), squeeze=False)
+    for axes, panels in zip(ax, rows):
+        draw_panels(axes, [(title, to_host(img)) for title, img in panels])
+    plt.tight_layout()
+    plt.show()
+    plt.close(fig)
+
+
+class ProgressRenderer:
+    """
+    Renders progress snapshots to `out_dir`/`prefix`_[tag_]<iteration>.png off the training loop
+
+    Args:
+        out_dir: directory for the PNGs, created if needed
+        prefix: file name prefix
+        max_queue: snapshots waiting to be rendered, push drops new ones when it is full
+        max_size: snapshots are strided down to at most this many pixels per side
+    """
+    def __init__(self, out_dir, prefix='progress', max_queue=8, max_size=256, figsize=(10, 5), dpi=100):
+        os.makedirs(out_dir, exist_ok=True)
+        self.out_dir = out_dir
+        self.prefix = prefix
+        self.max_size = max_size
+        self.figsize = figsize
+        self.dpi = dpi
+        self.dropped = 0
+
+        self.queue = queue.Queue(maxsize=max_queue)
+        self.thread = threading.Thread(target=self.run, daemon=True)
+        self.thread.start()
+
+    def push(self, iteration, panels, tag=None):
+        """
+        Queue a snapshot, never blocks the training loop
+
+        Args:
+            iteration: used in the file name
+            panels: list of (title, image) with images as tensors (any device) or arrays
+            tag: optional extra file name part, e.g. the problem index of a batched run
+        """
+        if not self.thread.is_alive():
+            return
+        try:
+            # the host copy happens before queueing, the tensors keep changing on the device
+            name = f'{self.prefix}_{iteration:07d}.png' if tag is None else f'{self.prefix}_{tag}_{iteration:07d}.png'
+            self.queue.put_nowait((name, [(title, to_host(img, self.max_size)) for title, img in panels]))
+        except queue.Full:
+            self.dropped += 1
+
+    def run(self):
+        fig = Figure(figsize=self.figsize, dpi=self.dpi)
+        FigureCanvasAgg(fig)
+        axes, images = None, None
+        try:
+            while True:
+                item = self.queue.get()
+                if item is None:
+                    break
+                name, panels = item
+
+                if axes is None or len(axes) != len(panels):
+                    fig.clf()
+                    axes = np.atleast_1d(fig.subplots(1, len(panels)))
+                    images = None
+
+                # reuse the artists, only the pixels and the titles change between snapshots
+                if images is not None and all(im.get_array().shape == np.squeeze(img).shape for im, (_, img) in zip(images, panels)):
+                    for ax, im, (title, img) in zip(axes, images, panels):
+                        im.set_data(np.squeeze(img))
+                        im.autoscale()
+                        ax.set_title(title)
+                else:
+                    draw_panels(axes, panels)
+                    images = [ax.get_images()[0] for ax in axes]
+                    fig.tight_layout()
+
+                fig.savefig(os.path.join(self.out_dir, name))
+        finally:
+            fig.clf()
+
+    def close(self):
+        """
+        Render whatever is still queued, then stop the thread
+        """
+        if self.thread.is_alive():
+            self.queue.put(None)
+            self.thread.join()
+        if self.dropped:
+            print(f'Progress renderer dropped {self.dropped} snapshots (queue full)')
@@ -0,0 +1,194 @@
+"""
+Chunked columnar metrics of a run
+
+The evaluators used to append every iteration to Python lists that grew over the whole run.
+MetricsRecorder keeps one preallocated buffer of `chunk_size` rows per column instead, on the
+device of the values for tensors (recording a 0-d device tensor is a device copy, no host sync)
+and in numpy for Python numbers. A full chunk comes to the host in one transfer per column and
+a background thread writes it as the next file of an append-only directory
+
+    path/
+        chunk_000000.npz    {'step': (n,), column: (n,), ...}
+        chunk_000001.npz
+        ...
+
+so memory stays at a few chunks whatever the length of the run, and a chunk is only visible once
+complete (temporary file + os.replace). Rows without a value for a column hold NaN.
+
+read_metrics(path) gives the columns back as numpy arrays, also while the run is going.
+"""
+
+import os
+import glob
+import time
+import queue
+import threading
+
+import numpy as np
+import torch
+
+
+class MetricsRecorder:
+    """
+    Args:
+        path: directory of the run's chunks, created if needed
+        chunk_size: rows per chunk
+        max_pending: full chunks waiting for the writer, recording blocks beyond that
+    A failed write is raised again in the training loop by the next record, flush or close,
+    the writer goes on with the next chunks
+    """
+    def __init__(self, path, chunk_size=1024, max_pending=4):
+        os.makedirs(path, exist_ok=True)
+        self.path = path
+        self.chunk_size = chunk_size
+        # continue after the chunks already there (e.g. a resumed run)
+        self.chunk_index = len(glob.glob(os.path.join(path, 'chunk_*.npz')))
+        self.rows = 0
+        self.steps = np.zeros(chunk_size, dtype=np.int64)
+        self.columns = {}
+
+        self.error = None
+        self.queue = queue.Queue(maxsize=max_pending)
+        self.thread = threading.Thread(target=self.run, daemon=True)
+        self.thread.start()
+
+    def allocate(self, name, value):
+        if torch.is_tensor(value):
+            dtype = value.dtype if value.is_floating_point() else torch.float64
+            buffer = torch.full((self.chunk_size,), float('nan'), dtype=dtype, device=value.device)
+        else:
+            buffer = np.full(self.chunk_size, np.nan, dtype=np.float64)
+        self.columns[name] = buffer
+        return buffer
+
+    def record(self, step, **values):
+        """
+        One row, values are 0-d tensors, numbers or None (NaN)
+        """
+        self.check()
+        row = self.rows
+        self.steps[row] = step
+        for name, value in values.items():
+            if value is None:
+                continue
+            buffer = self.columns.get(name)
+            if buffer is None:
+                buffer = self.allocate(name, value)
+            if torch.is_tensor(buffer):
+                buffer[row] = value.detach() if torch.is_tensor(value) else value
+            else:
+                buffer[row] = value.item() if torch.is_tensor(value) else value
+        self.rows += 1
+        if self.rows == self.chunk_size:
+            self.flush()
+
+    def flush(self):
+        """
+        Hand the rows recorded so far to the writer thread
+        """
+        self.check()
+        if self.rows == 0:
+            return
+        n = self.rows
+        arrays = {'step': self.steps[:n].copy()}
+        for name, buffer in self.columns.items():
+            if torch.is_tensor(buffer):
+                arrays[name] = buffer[:n].cpu().numpy()
+                buffer.fill_(float('nan'))
+            else:
+                arrays[name] = buffer[:n].copy()
+                buffer.fill(np.nan)
+        self.queue.put((self.chunk_index, arrays))
+        self.chunk_index += 1
+        self.rows = 0
+
+    def run(self):
+        while True:
+            item = self.queue.get()
+            if item is None:
+                break
+            index, arrays = item
+            filename = os.path.join(self.path, f'chunk_{index:06d}.npz')
+            tmp = filename + '.tmp'
+            try:
+                # through a file object, np.savez would append .npz to the temporary name
+                with open(tmp, 'wb') as f:
+                    np.savez(f, **arrays)
+                os.replace(tmp, filename)
+            except Exception as e:
+                # keep draining the queue, a stopped writer would block record once it is full
+                if self.error is None:
+                    self.error = e
+
+    def check(self):
+        """
+        Raise the error of a failed write, once
+        """
+        if self.error is not None:
+            error, self.error = self.error, None
+            raise RuntimeError(f"writing the metrics chunks under {self.path} failed") from error
+
+    def close(self):
+        """
+        Write the last partial chunk and wait for the writer
+        """
+        self.flush()
+        if self.thread.is_alive():
+            self.queue.put(None)
+            self.thread.join()
+        self.check()
+
+
+def read_metrics(path, columns=None):
+    """
+    {column: array} over every chunk of a run, in step order of recording
+
+    Args:
+        path: directory of a MetricsRecorder
+        columns: names to read, None for all of them ('step' is always included)
+    """
+    chunks = []
+    for filename in sorted(glob.glob(os.path.join(path, 'chunk_*.npz'))):
+        with np.load(filename) as data:
+            chunks.append({name: data[name] for name in data.files})
+
+    names = ['step'] + sorted({name for chunk in chunks for name in chunk} - {'step'})
+    if columns is not None:
+        names = ['step'] + [name for name in columns if name != 'step']
+    metrics = {}
+    for name in names:
+        parts = [chunk[name] if name in chunk else np.full(len(chunk['step']), np.nan) for chunk in chunks]
+        metrics[name] = np.concatenate(parts) if parts else np.zeros(0)
+    return metrics
+
+# outside NNI every process is a run of its own, the recorder, SampleSink and save_posterior of a run share it
+RUN_ID = f"run_{time.strftime('%Y%m%d-%H%M%S')}_{os.getpid()}"
+
+def trial_metrics_path(root):
+    """
+    Path of the running trial's files under `root`, one per NNI trial (one per process outside NNI)
+    """
+    return os.path.join(root, os.environ.get('NNI_TRIAL_JOB_ID', RUN_ID))
+
+
+class RecordingMixin:
+    """
+    record(**values) for a LightningModule: one row per call at self.global_step, into a MetricsRecorder
+    under trial_metrics_path(self.metrics_root), created on first use. Every run gets a fresh
+    directory, nothing is deleted or overwritten.
+    """
+    metrics_root = 'metrics'
+    recorder = None
+
+    def record(self, **values):
+        # created on first use, validation_step already runs in the sanity check before on_train_start
+        if self.recorder is None:
+            self.recorder = MetricsRecorder(trial_metrics_path(self.metrics_root))
+        self.recorder.record(self.global_step, **values)
+
+    def read_recorded(self):
+        """
+        Close the recorder and read back everything recorded, see read_metrics
+        """
+        self.recorder.close()
+        return read_metrics(self.recorder.path)
@@ -0,0 +1,109 @@
+"""
+Local content addressed store of trial results
+
+A result is keyed by the sha256 of the canonical JSON of
+    - the exported architecture {label: choice}
+    - the image: a digest of the ground truth and noisy arrays plus an optional id
+      (e.g. phantom number, noise type and level)
+    - the evaluator hyperparameters (including the number of iterations)
+so rerunning a sweep, or resuming one, skips the architectures already trained on that image.
+
+    root/
+        ab/abcdef....json   final metric, intermediate results and the key fields
+        ab/abcdef....pt     weights, only if they were stored
+
+Writes go through a temporary file and os.replace, concurrent trials never read half a record.
+"""
+
+import os
+import json
+import hashlib
+import logging
+
+import numpy as np
+import torch
+
+logger = logging.getLogger('result_cache')
+
+def _jsonable(obj):
+    if isinstance(obj, np.generic):
+        return obj.item()
+    if isinstance(obj, (np.ndarray, torch.Tensor)):
+        return obj.tolist()
+    return str(obj)
+
+def canonical_json(obj):
+    return json.dumps(obj, sort_keys=True, separators=(',', ':'), default=_jsonable)
+
+def array_digest(array):
+    """
+    sha256 of the float32 values and the shape of an image
+    """
+    array = np.ascontiguousarray(np.asarray(array, dtype=np.float32))
+    digest = hashlib.sha256(str(array.shape).encode())
+    digest.update(array.tobytes())
+    return digest.hexdigest()
+
+def result_key(arch, image, hparams):
+    return hashlib.sha256(canonical_json({'arch': arch, 'image': image, 'hparams': hparams}).encode()).hexdigest()
+
+def current_arch():
+    """
+    Exported architecture {label: choice} of the running Retiarii trial, None outside of one
+    """
+    from nni.retiarii.utils import get_current_context, NoContextError
+    try:
+        return dict(get_current_context('fixed'))
+    except NoContextError:
+        logger.info('No fixed architecture in context, not a Retiarii trial')
+        return None
+
+
+class ResultCache:
+    """
+    Args:
+        root: directory of the store, created if needed
+    """
+    def __init__(self, root):
+        os.makedirs(root, exist_ok=True)
+        self.root = root
+
+    def path(self, key, ext='json'):
+        return os.path.join(self.root, key[:2], f'{key}.{ext}')
+
+    def __contains__(self, key):
+        return os.path.exists(self.path(key))
+
+    def get(self, key):
+        """
+        The stored record, None on a miss
+        """
+        try:
+            with open(self.path(key)) as f:
+                return json.load(f)
+        except (FileNotFoundError, json.JSONDecodeError):
+            return None
+
+    def put(self, key, record, state_dict=None):
+        """
+        Store a record (JSON serializable dict) and optionally the weights of the network
+        """
+        os.makedirs(os.path.dirname(self.path(key)), exist_ok=True)
+        record = dict(record, has_weights=state_dict is not None)
+        if state_dict is not None:
+            # weights first, a record never points to missing weights
+            tmp = self.path(key, 'pt') + f'.{os.getpid()}.tmp'
+            torch.save({k: v.detach().cpu() for k, v in state_dict.items()}, tmp)
+            os.replace(tmp, self.path(key, 'pt'))
+        tmp = self.path(key) + f'.{os.getpid()}.tmp'
+        with open(tmp, 'w') as f:
+            f.write(canonical_json(record))
+        os.replace(tmp, self.path(key))
+
+    def load_weights(self, key, map_location='cpu'):
+        """
+        state_dict stored with the record, None if there is none
+        """
+        if not os.path.exists(self.path(key, 'pt')):
+            return None
+        return torch.load(self.path(key, 'pt'), map_location=map_location)
@@ -0,0 +1,206 @@
+"""
+Memory-mapped store of thinned SGLD samples
+
+The running means of the evaluators are enough for the reconstruction, quantiles, posterior
+predictive checks or autocorrelations need the samples themselves. SampleStore writes them
+into one preallocated file
+
+    [header, HEADER_SIZE bytes]   MAGIC, uint32 length, JSON {'shape', 'dtype', 'capacity'}
+    [index,  capacity int64]      iteration of each slot, -1 while empty
+    [data,   capacity x shape]    the samples, float16 or float32
+
+through a memory map. `put` only queues the host array, a background thread copies it into the
+next slot and then sets the slot's index entry, so a sample is visible to readers once its index
+is set. When the queue is full (disk too slow) or the file is full the sample is dropped and
+counted, the training loop never waits on the disk.
+
+read_samples(path) gives a lazy array over the samples written so far (also while the run is
+going), only the slices that are indexed are read from disk.
+"""
+
+import os
+import json
+import queue
+import struct
+import threading
+
+import numpy as np
+
+MAGIC = b'DIPSAMPLES01'
+HEADER_SIZE = 4096
+DTYPES = ('float16', 'float32')
+
+def read_header(path):
+    with open(path, 'rb') as f:
+        head = f.read(HEADER_SIZE)
+    if head[:len(MAGIC)] != MAGIC:
+        raise ValueError(f"{path} is not a sample store")
+    length, = struct.unpack('<I', head[len(MAGIC):len(MAGIC) + 4])
+    header = json.loads(head[len(MAGIC) + 4:len(MAGIC) + 4 + length].decode())
+    header['shape'] = tuple(header['shape'])
+    return header
+
+def layout(header):
+    """
+    (index, data) memmap arguments of a header: offset and shape
+    """
+    capacity = header['capacity']
+    data_offset = HEADER_SIZE + 8 * capacity
+    return (HEADER_SIZE, (capacity,)), (data_offset, (capacity,) + header['shape'])
+
+def open_maps(path, header, mode):
+    (index_offset, index_shape), (data_offset, data_shape) = layout(header)
+    index = np.memmap(path, dtype=np.int64, mode=mode, offset=index_offset, shape=index_shape)
+    data = np.memmap(path, dtype=header['dtype'], mode=mode, offset=data_offset, shape=data_shape)
+    return index, data
+
+def written(index):
+    """
+    Number of filled slots, they are filled in order
+    """
+    empty = np.flatnonzero(np.asarray(index) < 0)
+    return int(empty[0]) if len(empty) else len(index)
+
+
+class SampleStore:
+    """
+    Args:
+        path: file of the store, its directory is created if needed
+        shape: shape of one sample, e.g. (1, H, W)
+        capacity: most samples the file holds (it is preallocated for all of them)
+        dtype: 'float16' (half the disk, ~3 significant digits) or 'float32'
+        keep_before: with an existing store of the same layout, keep its samples of iterations
+                     before this one and append after them (resumed runs), None starts over
+        max_queue: samples waiting for the writer before new ones are dropped
+    """
+    def __init__(self, path, shape, capacity=1000, dtype='float16', keep_before=None, max_queue=256):
+        if dtype not in DTYPES:
+            raise ValueError(f"dtype must be one of {DTYPES}, got {dtype}")
+        header = {'shape': [int(s) for s in shape], 'dtype': dtype, 'capacity': int(capacity)}
+        self.path = path
+        self.shape = tuple(header['shape'])
+        self.capacity = header['capacity']
+        self.dtype = dtype
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+
+        if keep_before is not None and os.path.exists(path) and self.matches(path, header):
+            self.index, self.data = open_maps(path, dict(header, shape=self.shape), 'r+')
+            count = written(self.index)
+            kept = int(np.sum(self.index[:count] < keep_before))
+            self.index[kept:] = -1
+            self.count = kept
+        else:
+            self.create(path, header)
+            self.count = 0
+
+        # slots handed out on the training loop's side, the writer fills them in this order
+        self.accepted = self.count
+        self.dropped = 0
+        self.full = 0
+        self.queue = queue.Queue(maxsize=max_queue)
+        self.thread = threading.Thread(target=self.run, daemon=True)
+        self.thread.start()
+
+    @staticmethod
+    def matches(path, header):
+        try:
+            existing = read_header(path)
+        except (OSError, ValueError):
+            return False
+        return existing == dict(header, shape=tuple(header['shape']))
+
+    def create(self, path, header):
+        encoded = json.dumps(header).encode()
+        if len(MAGIC) + 4 + len(encoded) > HEADER_SIZE:
+            raise ValueError(f"header too long for {HEADER_SIZE} bytes: {header}")
+        # temporary file + os.replace, a reader never sees a half written header
+        tmp = path + '.tmp'
+        with open(tmp, 'wb') as f:
+            f.write(MAGIC + struct.pack('<I', len(encoded)) + encoded)
+        self.index, self.data = open_maps(tmp, dict(header, shape=tuple(header['shape'])), 'r+')
+        self.index[:] = -1
+        self.index.flush()
+        os.replace(tmp, path)
+
+    def put(self, step, sample):
+        """
+        Queue one host sample (array of `shape`) of iteration `step`, never blocks
+        """
+        if self.accepted >= self.capacity:
+            self.full += 1
+            return
+        try:
+            self.queue.put_nowait((step, sample))
+            self.accepted += 1
+        except queue.Full:
+            self.dropped += 1
+
+    def run(self):
+        while True:
+            item = self.queue.get()
+            if item is None:
+                break
+            step, sample = item
+            self.data[self.count] = sample
+            # index last, the sample is complete once it is listed
+            self.index[self.count] = step
+            self.count += 1
+
+    def close(self):
+        """
+        Write what is still queued and flush the file
+        """
+        if self.thread.is_alive():
+            self.queue.put(None)
+            self.thread.join()
+        self.data.flush()
+        self.index.flush()
+        if self.dropped or self.full:
+            print(f'Sample store {self.path}: {self.count} samples, dropped {self.dropped} (queue full) and {self.full} (store full)')
+
+
+class SampleArray:
+    """
+    Lazy read-only (n, *shape) array of the samples of a store, n as of opening (see `refresh`)
+    Indexing reads only the selected samples, np.asarray(samples) reads all of them
+    """
+    def __init__(self, path):
+        self.path = path
+        self.header = read_header(path)
+        self.index, self.data = open_maps(path, self.header, 'r')
+        self.refresh()
+
+    def refresh(self):
+        """
+        Pick up the samples written since opening
+        """
+        self.n = written(self.index)
+        self.steps = np.array(self.index[:self.n])
+        return self
+
+    @property
+    def shape(self):
+        return (self.n,) + self.header['shape']
+
+    @property
+    def dtype(self):
+        return np.dtype(self.header['dtype'])
+
+    def __len__(self):
+        return self.n
+
+    def __getitem__(self, key):
+        return np.array(self.data[:self.n][key])
+
+    def __iter__(self):
+        for k in range(self.n):
+            yield self[k]
+
+    def __array__(self, dtype=None):
+        return np.asarray(self.data[:self.n], dtype=dtype)
+
+def read_samples(path):
+    """
+    SampleArray of the store at `path`, .steps holds the iteration of each sample
+    """
+    return SampleArray(path)
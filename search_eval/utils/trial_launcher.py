@@ -0,0 +1,167 @@
+"""
+Core-aware launcher for concurrent local trials
+
+With trial_concurrency = k every trial used torch's default thread count (all the cores), so k
+trials oversubscribed the box k times. The launcher wraps the trial command:
+    1. takes a free slot out of `--slots` (a flock'ed file per slot, held for the trial's lifetime),
+    2. gives the slot its own contiguous share of the allowed cores, listed node by node so a share
+       stays on one NUMA node whenever the slots split evenly across the nodes,
+    3. runs the trial pinned to those cores (sched_setaffinity, inherited by the child) with
+       the OMP/MKL/OpenBLAS thread env vars set to the share size (torch sizes its intra-op
+       pool from OMP_NUM_THREADS) and the cores in TRIAL_CPUS, and with --numa under
+       `numactl --preferred=<node>` so its memory is allocated on the same node,
+    4. reports the trial's CPU utilization (CPU time / (wall time * cores)) on stdout and in
+       <lock-dir>/utilization.jsonl.
+
+Standard library only, Linux. In an NNI experiment:
+    experiment.config.trial_command = f'python {REPO_ROOT}/search_eval/utils/trial_launcher.py --slots 6 -- python model.py'
+"""
+
+import os
+import sys
+import json
+import time
+import glob
+import fcntl
+import shutil
+import signal
+import argparse
+import resource
+import subprocess
+
+THREAD_ENV = ('OMP_NUM_THREADS', 'MKL_NUM_THREADS', 'OPENBLAS_NUM_THREADS', 'NUMEXPR_NUM_THREADS', 'VECLIB_MAXIMUM_THREADS')
+LOCK_DIR = os.path.join(os.path.expanduser('~'), '.cache', 'nas-for-dip', 'trial_slots')
+
+def parse_cpulist(cpulist):
+    """
+    '0-3,8,10-11' -> [0, 1, 2, 3, 8, 10, 11]
+    """
+    cpus = []
+    for part in cpulist.strip().split(','):
+        if not part:
+            continue
+        if '-' in part:
+            start, end = part.split('-')
+            cpus.extend(range(int(start), int(end) + 1))
+        else:
+            cpus.append(int(part))
+    return cpus
+
+def numa_nodes(allowed=None):
+    """
+    {node: [cpus]} restricted to the allowed cpus, a single node 0 if there is no NUMA information
+    """
+    allowed = sorted(os.sched_getaffinity(0)) if allowed is None else sorted(allowed)
+    nodes = {}
+    for path in sorted(glob.glob('/sys/devices/system/node/node[0-9]*/cpulist')):
+        node = int(os.path.basename(os.path.dirname(path))[len('node'):])
+        with open(path) as f:
+            cpus = [cpu for cpu in parse_cpulist(f.read()) if cpu in allowed]
+        if cpus:
+            nodes[node] = cpus
+    return nodes or {0: allowed}
+
+def partition_cores(nodes, slots):
+    """
+    Split the cpus in `slots` contiguous shares of (almost) equal size, at least one cpu each
+    Returns [(cpus, node)] with node the NUMA node holding most of the share
+    """
+    ordered = [(cpu, node) for node in sorted(nodes) for cpu in nodes[node]]
+    if slots > len(ordered):
+        # more trials than cores, they have to share: one core each, round robin
+        print(f'{slots} slots for {len(ordered)} cores, trials share cores', flush=True)
+        return [([ordered[slot % len(ordered)][0]], ordered[slot % len(ordered)][1]) for slot in range(slots)]
+    size, extra = divmod(len(ordered), slots)
+    shares, start = [], 0
+    for slot in range(slots):
+        end = start + size + (1 if slot < extra else 0)
+        share = ordered[start:end]
+        cpus = [cpu for cpu, _ in share]
+        share_nodes = [node for _, node in share]
+        shares.append((cpus, max(set(share_nodes), key=share_nodes.count)))
+        start = end
+    return shares
+
+def acquire_slot(lock_dir, slots, poll=1.):
+    """
+    Index and open (locked) file of the first free slot, waits while all of them are taken
+    """
+    os.makedirs(lock_dir, exist_ok=True)
+    while True:
+        for slot in range(slots):
+            f = open(os.path.join(lock_dir, f'slot_{slot}.lock'), 'w')
+            try:
+                fcntl.flock(f, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                return slot, f
+            except BlockingIOError:
+                f.close()
+        time.sleep(poll)
+
+def trial_env(cpus):
+    env = dict(os.environ)
+    for name in THREAD_ENV:
+        env[name] = str(len(cpus))
+    env['TRIAL_CPUS'] = ','.join(map(str, cpus))
+    return env
+
+def run_trial(command, slots, lock_dir=LOCK_DIR, numa=False):
+    """
+    Run `command` pinned to the cores of a free slot, returns its exit code
+    """
+    slot, lock = acquire_slot(lock_dir, slots)
+    try:
+        cpus, node = partition_cores(numa_nodes(), slots)[slot]
+        os.sched_setaffinity(0, cpus)
+        if numa and shutil.which('numactl') is not None:
+            command = ['numactl', f'--preferred={node}'] + command
+        print(f'Trial slot {slot}/{slots}: cores {cpus} (node {node}), {len(cpus)} threads', flush=True)
+
+        # NNI stops trials with SIGTERM, pass it on; the handlers go in before the child starts
+        # so a signal that comes while it is being spawned is forwarded once it exists
+        process, received = None, []
+        def forward(signum, frame):
+            received.append(signum)
+            if process is not None:
+                process.send_signal(signum)
+        for signum in (signal.SIGTERM, signal.SIGINT):
+            signal.signal(signum, forward)
+
+        start, usage = time.time(), resource.getrusage(resource.RUSAGE_CHILDREN)
+        process = subprocess.Popen(command, env=trial_env(cpus))
+        if received:
+            process.send_signal(received[-1])
+        returncode = process.wait()
+
+        wall = time.time() - start
+        end_usage = resource.getrusage(resource.RUSAGE_CHILDREN)
+        cpu_time = (end_usage.ru_utime - usage.ru_utime) + (end_usage.ru_stime - usage.ru_stime)
+        stats = {
+            'trial': os.environ.get('NNI_TRIAL_JOB_ID'),
+            'slot': slot,
+            'cores': cpus,
+            'node': node,
+            'wall_s': round(wall, 3),
+            'cpu_s': round(cpu_time, 3),
+            'utilization': round(cpu_time / max(wall * len(cpus), 1e-9), 4),
+            'max_rss_kb': end_usage.ru_maxrss,
+            'returncode': returncode,
+        }
+        print(f"Trial utilization {stats['utilization']:.1%} of {len(cpus)} cores over {wall:.1f}s", flush=True)
+        with open(os.path.join(lock_dir, 'utilization.jsonl'), 'a') as f:
+            f.write(json.dumps(stats) + '\n')
+        return returncode
+    finally:
+        lock.close()
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Run a trial pinned to its share of the cores')
+    parser.add_argument('--slots', type=int, required=True, help='concurrent trials sharing the cores (trial_concurrency)')
+    parser.add_argument('--lock-dir', default=LOCK_DIR)
+    parser.add_argument('--numa', action='store_true', help='allocate memory on the NUMA node of the cores (numactl)')
+    parser.add_argument('command', nargs=argparse.REMAINDER, help='trial command, after --')
+    args = parser.parse_args()
+
+    command = args.command[1:] if args.command[:1] == ['--'] else args.command
+    if not command:
+        parser.error('no trial command given')
+    sys.exit(run_trial(command, args.slots, args.lock_dir, args.numa))
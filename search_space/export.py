@@ -0,0 +1,195 @@
+"""
+Export a chosen architecture for speed
+
+Retraining the final model and the production denoising runs use exportedUNet / exportedModel /
+UNetBasic thousands of times, eagerly and through NNI's wrapped layers. export_for_speed
+    1. rebuilds the network from plain torch.nn layers (same parameters, no NNI wrappers),
+    2. converts it, and its input, to channels_last,
+    3. compiles it with the first backend that works: torch.compile (inductor, torch >= 2),
+       TorchScript (script, then trace for the forwards with ModuleList indexing script rejects),
+       eager as the last resort,
+and checks every candidate against the eager output before keeping it.
+
+The export works on a copy, load the weights before exporting and train the returned model.
+BatchNorm keeps the mode the model was in when exported (the DIP evaluators train in train mode).
+
+    python -m search_space.export --arch best_arch.json --depth 4 --resolution 64
+benchmarks UNetBasic and the exportedUNet of every arch file, eager vs exported.
+"""
+
+import copy
+import time
+from collections import OrderedDict
+
+import torch
+
+def torch_base(cls):
+    """
+    First torch.nn class in the MRO of a layer class
+    """
+    for base in cls.__mro__:
+        if base.__module__.startswith('torch.nn'):
+            return base
+    return None
+
+def strip_nni(module):
+    """
+    Replace (in place) the NNI wrapped layers of a module by their plain torch.nn class,
+    parameters and buffers are kept as they are. Custom modules keep their class.
+    """
+    for name, child in module.named_children():
+        module._modules[name] = strip_nni(child)
+
+    cls = type(module)
+    base = torch_base(cls)
+    if cls.__module__.startswith('torch.') or base is None or base is torch.nn.Module:
+        return module
+    plain = base.__new__(base)
+    # drop the trace info NNI keeps on the instances
+    plain.__dict__.update({k: v for k, v in module.__dict__.items() if not k.startswith(('_nni', 'trace_'))})
+    return plain
+
+
+class ChannelsLast(torch.nn.Module):
+    """
+    Feeds the wrapped model channels_last inputs, so the convolutions never convert back and forth
+    """
+    def __init__(self, model):
+        super().__init__()
+        self.model = model
+
+    def forward(self, x):
+        return self.model(x.contiguous(memory_format=torch.channels_last))
+
+
+def compile_backend(model, example_input):
+    if not hasattr(torch, 'compile'):
+        raise RuntimeError(f"torch.compile needs torch >= 2.0, this is {torch.__version__}")
+    return torch.compile(model)
+
+def script_backend(model, example_input):
+    return torch.jit.script(model)
+
+def trace_backend(model, example_input):
+    return torch.jit.trace(model, example_input, check_trace=False)
+
+def eager_backend(model, example_input):
+    return model
+
+BACKENDS = OrderedDict([
+    ('compile', compile_backend),
+    ('script', script_backend),
+    ('trace', trace_backend),
+    ('eager', eager_backend),
+])
+
+def matches(model, reference, example_input, rtol=1e-4, atol=1e-5):
+    """
+    Whether model(example_input) is allclose to `reference`, restores the BatchNorm running stats
+    """
+    state = {k: v.clone() for k, v in model.state_dict().items()}
+    try:
+        with torch.no_grad():
+            out = model(example_input)
+        return torch.allclose(out.float(), reference.float(), rtol=rtol, atol=atol)
+    finally:
+        model.load_state_dict(state)
+
+def export_for_speed(model, example_input, backends=('compile', 'script', 'trace'), channels_last=True,
+                     rtol=1e-4, atol=1e-5, verbose=True):
+    """
+    Plain, channels_last, compiled copy of `model`, see the module docstring
+
+    Args:
+        model: exportedUNet, exportedModel, UNetBasic or any other network
+        example_input: (N, C, H, W) input of the production runs, used to compile and check
+        backends: tried in order, eager is always the fallback
+    Returns:
+        (fast_model, backend)
+    """
+    unknown = [backend for backend in backends if backend not in BACKENDS]
+    if unknown:
+        raise ValueError(f"Unknown backends {unknown}, choose from {list(BACKENDS)}")
+
+    model = strip_nni(copy.deepcopy(model))
+    state = {k: v.clone() for k, v in model.state_dict().items()}
+    with torch.no_grad():
+        reference = model(example_input)
+    model.load_state_dict(state)
+
+    if channels_last:
+        model = ChannelsLast(model.to(memory_format=torch.channels_last))
+
+    for backend in list(backends) + ['eager']:
+        try:
+            fast = BACKENDS[backend](model, example_input)
+            if matches(fast, reference, example_input, rtol, atol):
+                return fast, backend
+            reason = 'output does not match eager'
+        except Exception as e:
+            reason = f'{type(e).__name__}: {e}'
+        if verbose:
+            print(f'{backend} backend failed, {reason.splitlines()[0]}')
+    raise RuntimeError("The exported model does not match the original one, even eagerly")
+
+
+def benchmark(model, example_input, steps=50, warmup=5, backward=True):
+    """
+    Seconds per DIP iteration: forward, MSE and backward (forward only with backward=False)
+    """
+    def iteration():
+        out = model(example_input)
+        if backward:
+            out.float().pow(2).mean().backward()
+            model.zero_grad(set_to_none=True)
+
+    def sync():
+        if example_input.is_cuda:
+            torch.cuda.synchronize(example_input.device)
+
+    with torch.set_grad_enabled(backward):
+        for _ in range(warmup):
+            iteration()
+        sync()
+        start = time.perf_counter()
+        for _ in range(steps):
+            iteration()
+        sync()
+    return (time.perf_counter() - start) / steps
+
+def benchmark_export(model, example_input, name='model', steps=50, warmup=5, **export_kwargs):
+    """
+    Eager vs exported time per iteration of one architecture
+    Returns {'name', 'backend', 'eager', 'exported', 'speedup'}
+    """
+    # on a copy, the BatchNorm running stats of `model` stay as they are
+    eager = benchmark(copy.deepcopy(model), example_input, steps, warmup)
+    fast, backend = export_for_speed(model, example_input, **export_kwargs)
+    exported = benchmark(fast, example_input, steps, warmup)
+    result = {'name': name, 'backend': backend, 'eager': eager, 'exported': exported, 'speedup': eager / exported}
+    print(f"{name}: eager {eager * 1e3:.2f} ms, {backend} {exported * 1e3:.2f} ms, speedup x{result['speedup']:.2f}")
+    return result
+
+if __name__ == '__main__':
+    import json
+    import argparse
+
+    from .unet import UNetBasic, exportedUNet
+
+    parser = argparse.ArgumentParser(description='Benchmark exported architectures, eager vs compiled')
+    parser.add_argument('--arch', nargs='*', default=[], help='JSON files of exported architectures (exportedUNet labels)')
+    parser.add_argument('--depth', type=int, default=4)
+    parser.add_argument('--resolution', type=int, default=64)
+    parser.add_argument('--backends', nargs='+', default=['compile', 'script', 'trace'])
+    parser.add_argument('--steps', type=int, default=50)
+    parser.add_argument('--device', default='cpu')
+    args = parser.parse_args()
+
+    example_input = torch.randn(1, 1, args.resolution, args.resolution, device=args.device)
+    models = [('UNetBasic', UNetBasic(depth=args.depth))]
+    for path in args.arch:
+        with open(path) as f:
+            models.append((path, exportedUNet(1, 1, args.depth, json.load(f))))
+
+    for name, model in models:
+        benchmark_export(model.to(args.device), example_input, name=name, steps=args.steps, backends=args.backends)
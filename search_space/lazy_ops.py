@@ -0,0 +1,77 @@
+"""
+Lazily built candidate ops for the search spaces
+
+convs()/pools()/upsamples() list zero-arg factories instead of built modules, so counting
+the candidates or picking one by name (exported models, validity checks) only builds the
+ops that are actually used. The supernets call .build_for(label): every candidate for a
+one-shot supernet or a strategy's dry run, but only the chosen ones when NNI builds the
+model of a multi-trial trial under its fixed architecture (LayerChoice and Cell would
+otherwise build all of them and keep one).
+"""
+
+from collections import OrderedDict
+
+
+def fixed_choices(label):
+    """
+    Names the fixed architecture of the running trial picks for the LayerChoice `label`, or for
+    the op slots (label/op_<node>_<op>) of the Cell `label`; None outside of a fixed architecture
+    """
+    from nni.retiarii.utils import get_current_context, NoContextError
+    try:
+        fixed = get_current_context('fixed')
+    except NoContextError:
+        return None
+    if fixed is None:
+        return None
+    if label in fixed:
+        return [fixed[label]]
+    names = [value for key, value in fixed.items() if key.startswith(f'{label}/op_')]
+    return list(OrderedDict.fromkeys(names)) or None
+
+
+class LazyOps:
+    """
+    Ordered registry of name -> zero-arg factory of a candidate op
+
+        len(ops), ops.keys(), name in ops, iterating: free, nothing is built
+        ops[name]: builds that one op (a new module on every call)
+        ops.build(): OrderedDict of every op
+        ops.build_for(label): op_candidates of the LayerChoice / Cell `label`, see fixed_choices
+    """
+    def __init__(self, factories):
+        self.factories = OrderedDict(factories)
+
+    def __len__(self):
+        return len(self.factories)
+
+    def __iter__(self):
+        return iter(self.factories)
+
+    def __contains__(self, name):
+        return name in self.factories
+
+    def keys(self):
+        return self.factories.keys()
+
+    def __getitem__(self, name):
+        if name not in self.factories:
+            raise KeyError(f"{name} is not a candidate op, choose one of {list(self.factories)}")
+        return self.factories[name]()
+
+    def build(self, names=None):
+        """
+        OrderedDict of the built ops, all of them or only `names`
+        """
+        if names is None:
+            names = self.factories
+        return OrderedDict((name, self[name]) for name in names)
+
+    def build_for(self, label):
+        """
+        OrderedDict of the ops the fixed architecture picks for `label`, all of them without one
+        """
+        return self.build(fixed_choices(label))
+
+    def __repr__(self):
+        return f'LazyOps({list(self.factories)})'
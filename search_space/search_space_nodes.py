@@ -1,9 +1,9 @@
-from collections import OrderedDict
 import torch
 import nni.retiarii.nn.pytorch as nn
 from nni import trace
 from nni.retiarii import model_wrapper
 from nni.retiarii.nn.pytorch import Cell
+from .lazy_ops import LazyOps
 
 @trace
 def conv_2d(C_in, C_out, kernel_size=3, dilation=1, padding=1, activation=None):
@@ -38,50 +38,50 @@ def transposed_conv_2d(C_in, C_out, kernel_size=4, stride=2, padding=1, activati
     )
 
 def pools():
-    pool_dict = OrderedDict([
-        ("MaxPool2d", nn.MaxPool2d(kernel_size=2, stride=2, padding=0)),
-        ("AvgPool2d", nn.AvgPool2d(kernel_size=2, stride=2, padding=0)),
-        # ("AdaMaxPool2d", nn.AdaptiveMaxPool2d(1)),
-        # ("AdaAvgPool2d", nn.AdaptiveAvgPool2d(1)),
-        # ("DepthToSpace", nn.PixelShuffle(2)),
+    pool_dict = LazyOps([
+        ("MaxPool2d", lambda: nn.MaxPool2d(kernel_size=2, stride=2, padding=0)),
+        ("AvgPool2d", lambda: nn.AvgPool2d(kernel_size=2, stride=2, padding=0)),
+        # ("AdaMaxPool2d", lambda: nn.AdaptiveMaxPool2d(1)),
+        # ("AdaAvgPool2d", lambda: nn.AdaptiveAvgPool2d(1)),
+        # ("DepthToSpace", lambda: nn.PixelShuffle(2)),
     ])
     return pool_dict
 
 def upsamples(C_in, C_out):
-    upsample_dict = OrderedDict([
-        ("Upsample_nearest", nn.Upsample(scale_factor=2, mode='nearest')),
-        ("Upsample_bilinear", nn.Upsample(scale_factor=2, mode='bilinear')),
-        ("TransConv_4x4_Relu", transposed_conv_2d(C_in, C_out)),
-        ("TransConv_2x2_RelU", transposed_conv_2d(C_in, C_out, kernel_size=2, stride=2, padding=0)),
+    upsample_dict = LazyOps([
+        ("Upsample_nearest", lambda: nn.Upsample(scale_factor=2, mode='nearest')),
+        ("Upsample_bilinear", lambda: nn.Upsample(scale_factor=2, mode='bilinear')),
+        ("TransConv_4x4_Relu", lambda: transposed_conv_2d(C_in, C_out)),
+        ("TransConv_2x2_RelU", lambda: transposed_conv_2d(C_in, C_out, kernel_size=2, stride=2, padding=0)),
     ])
     return upsample_dict
 
 def convs(C_in, C_out):
     # all padding should follow this formula:
     # pd = (ks - 1) * dl // 2
-    conv_dict = OrderedDict([
+    conv_dict = LazyOps([
         
-        ("conv2d_1x1_Relu", conv_2d(C_in, C_out)),
-        # ("conv2d_1x1_SiLU", conv_2d(C_in, C_out, activation=nn.SiLU())),
+        ("conv2d_1x1_Relu", lambda: conv_2d(C_in, C_out)),
+        # ("conv2d_1x1_SiLU", lambda: conv_2d(C_in, C_out, activation=nn.SiLU())),
 
-        ("conv2d_3x3_Relu", conv_2d(C_in, C_out, kernel_size=3, padding=1)),
-        # ("conv2d_3x3_SiLU", conv_2d(C_in, C_out, kernel_size=3, padding=1, activation=nn.SiLU())),
-        # ("conv2d_3x3_Sigmoid", conv_2d(C_in, C_out, kernel_size=3, padding=1, activation=nn.Sigmoid())),
-        ("conv2d_3x3_Relu_1dil", conv_2d(C_in, C_out, kernel_size=3, padding=2, dilation=2)),
+        ("conv2d_3x3_Relu", lambda: conv_2d(C_in, C_out, kernel_size=3, padding=1)),
+        # ("conv2d_3x3_SiLU", lambda: conv_2d(C_in, C_out, kernel_size=3, padding=1, activation=nn.SiLU())),
+        # ("conv2d_3x3_Sigmoid", lambda: conv_2d(C_in, C_out, kernel_size=3, padding=1, activation=nn.Sigmoid())),
+        ("conv2d_3x3_Relu_1dil", lambda: conv_2d(C_in, C_out, kernel_size=3, padding=2, dilation=2)),
 
-        ("conv2d_5x5_Relu", conv_2d(C_in, C_out, kernel_size=5, padding=2)),
-        ("conv2d_5x5_Relu_1dil", conv_2d(C_in, C_out, kernel_size=5, padding=4, dilation=2, activation=nn.SiLU())),
-        # ("conv2d_5x5_SiLU", conv_2d(C_in, C_out, kernel_size=5, padding=2, activation=nn.SiLU())),
+        ("conv2d_5x5_Relu", lambda: conv_2d(C_in, C_out, kernel_size=5, padding=2)),
+        ("conv2d_5x5_Relu_1dil", lambda: conv_2d(C_in, C_out, kernel_size=5, padding=4, dilation=2, activation=nn.SiLU())),
+        # ("conv2d_5x5_SiLU", lambda: conv_2d(C_in, C_out, kernel_size=5, padding=2, activation=nn.SiLU())),
 
 
-        # ("convDS_1x1_Relu", depthwise_separable_conv(C_in, C_out)),
-        # ("convDS_1x1_SiLU", depthwise_separable_conv(C_in, C_out, activation=nn.SiLU())),
+        # ("convDS_1x1_Relu", lambda: depthwise_separable_conv(C_in, C_out)),
+        # ("convDS_1x1_SiLU", lambda: depthwise_separable_conv(C_in, C_out, activation=nn.SiLU())),
 
-        # ("convDS_3x3_Relu", depthwise_separable_conv(C_in, C_out, kernel_size=3, padding=1)),
-        # ("convDS_3x3_SiLU", depthwise_separable_conv(C_in, C_out, kernel_size=3, padding=1, activation=nn.SiLU())),
+        # ("convDS_3x3_Relu", lambda: depthwise_separable_conv(C_in, C_out, kernel_size=3, padding=1)),
+        # ("convDS_3x3_SiLU", lambda: depthwise_separable_conv(C_in, C_out, kernel_size=3, padding=1, activation=nn.SiLU())),
 
-        # ("convDS_5x5_Relu", depthwise_separable_conv(C_in, C_out, kernel_size=5, padding=2)),
-        # ("convDS_5x5_SiLU", depthwise_separable_conv(C_in, C_out, kernel_size=5, padding=2, activation=nn.SiLU())),
+        # ("convDS_5x5_Relu", lambda: depthwise_separable_conv(C_in, C_out, kernel_size=5, padding=2)),
+        # ("convDS_5x5_SiLU", lambda: depthwise_separable_conv(C_in, C_out, kernel_size=5, padding=2, activation=nn.SiLU())),
     ])
     return conv_dict
 
@@ -107,14 +107,14 @@ class SearchSpace(nn.Module):
             enConv_candidates = convs(filters, filters*2 // enNodes)
 
             self.encoders.append(Cell(
-                op_candidates=pool_candidates, 
+                op_candidates=pool_candidates.build_for(f'pool_{i+1}'), 
                 num_nodes=1, 
                 num_ops_per_node=1, #len(pool_candidates), 
                 num_predecessors=1, 
                 label=f'pool_{i+1}',
                 ))
             self.encoders.append(Cell(
-                op_candidates=enConv_candidates, 
+                op_candidates=enConv_candidates.build_for(f'conv_{i+1}'), 
                 num_nodes=enNodes, 
                 num_ops_per_node=2,
                 num_predecessors=1, 
@@ -129,7 +129,7 @@ class SearchSpace(nn.Module):
             upsample_candidates = upsamples(filters, filters)
 
             self.decoders.append(Cell(
-                op_candidates=upsample_candidates, 
+                op_candidates=upsample_candidates.build_for(f'upsample_{i+1}'), 
                 num_nodes=1, 
                 num_ops_per_node=1, #len(upsample_candidates), 
                 num_predecessors=1, 
@@ -140,7 +140,7 @@ class SearchSpace(nn.Module):
             deConv_candidates = convs(filters*3, filters // deNodes)
 
             self.decoders.append(Cell(
-                op_candidates=deConv_candidates, 
+                op_candidates=deConv_candidates.build_for(f'conv_{i+1+depth}'), 
                 num_nodes=deNodes, 
                 num_ops_per_node=len(deConv_candidates), 
                 num_predecessors=1, 
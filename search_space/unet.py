@@ -4,6 +4,7 @@ import nni.retiarii.nn.pytorch as nn
 from nni import trace
 from nni.retiarii import model_wrapper
 from nni.retiarii.nn.pytorch import Cell
+from .lazy_ops import LazyOps
 
 @trace
 def conv_2d(C_in, C_out, kernel_size=3, dilation=1, padding=1, activation=None):
@@ -41,36 +42,36 @@ def attention(channel, reduction=16):
 
 
 def pools():
-    pool_dict = OrderedDict([
-        ("MaxPool2d", nn.MaxPool2d(kernel_size=2, stride=2, padding=0)),
-        ("AvgPool2d", nn.AvgPool2d(kernel_size=2, stride=2, padding=0)),
-        ("AdaMaxPool2d", nn.AdaptiveMaxPool2d(1)),
-        ("AdaAvgPool2d", nn.AdaptiveAvgPool2d(1)),
-        ("MaxPool2d_3x3", nn.MaxPool2d(kernel_size=3, stride=2, padding=1)),
-        ("AvgPool2d_3x3", nn.AvgPool2d(kernel_size=3, stride=2, padding=1)),
-        ("MaxPool2d_5x5", nn.MaxPool2d(kernel_size=5, stride=2, padding=2)),
-        ("AvgPool2d_5x5", nn.AvgPool2d(kernel_size=5, stride=2, padding=2)),
-        ("MaxPool2d_7x7", nn.MaxPool2d(kernel_size=7, stride=2, padding=3)),
-        ("AvgPool2d_7x7", nn.AvgPool2d(kernel_size=7, stride=2, padding=3)),
-        ("MaxPool2d_9x9", nn.MaxPool2d(kernel_size=9, stride=2, padding=4)),
-        ("AvgPool2d_9x9", nn.AvgPool2d(kernel_size=9, stride=2, padding=4)),
-
-        # ("DepthToSpace", nn.PixelShuffle(2)),
+    pool_dict = LazyOps([
+        ("MaxPool2d", lambda: nn.MaxPool2d(kernel_size=2, stride=2, padding=0)),
+        ("AvgPool2d", lambda: nn.AvgPool2d(kernel_size=2, stride=2, padding=0)),
+        ("AdaMaxPool2d", lambda: nn.AdaptiveMaxPool2d(1)),
+        ("AdaAvgPool2d", lambda: nn.AdaptiveAvgPool2d(1)),
+        ("MaxPool2d_3x3", lambda: nn.MaxPool2d(kernel_size=3, stride=2, padding=1)),
+        ("AvgPool2d_3x3", lambda: nn.AvgPool2d(kernel_size=3, stride=2, padding=1)),
+        ("MaxPool2d_5x5", lambda: nn.MaxPool2d(kernel_size=5, stride=2, padding=2)),
+        ("AvgPool2d_5x5", lambda: nn.AvgPool2d(kernel_size=5, stride=2, padding=2)),
+        ("MaxPool2d_7x7", lambda: nn.MaxPool2d(kernel_size=7, stride=2, padding=3)),
+        ("AvgPool2d_7x7", lambda: nn.AvgPool2d(kernel_size=7, stride=2, padding=3)),
+        ("MaxPool2d_9x9", lambda: nn.MaxPool2d(kernel_size=9, stride=2, padding=4)),
+        ("AvgPool2d_9x9", lambda: nn.AvgPool2d(kernel_size=9, stride=2, padding=4)),
+
+        # ("DepthToSpace", lambda: nn.PixelShuffle(2)),
     ])
     return pool_dict
 
 def upsamples(C_in, C_out):
-    upsample_dict = OrderedDict([
-        ("Upsample_nearest", nn.Upsample(scale_factor=2, mode='nearest')),
-        ("Upsample_bilinear", nn.Upsample(scale_factor=2, mode='bilinear')),
+    upsample_dict = LazyOps([
+        ("Upsample_nearest", lambda: nn.Upsample(scale_factor=2, mode='nearest')),
+        ("Upsample_bilinear", lambda: nn.Upsample(scale_factor=2, mode='bilinear')),
         
-        ("TransConv_2x2_RelU", transposed_conv_2d(C_in, C_out, kernel_size=2, stride=2, padding=0)),
-        ("TransConv_2x2_SiLU", transposed_conv_2d(C_in, C_out, kernel_size=2, stride=2, padding=0, activation=nn.SiLU())),
-        ("TransConv_2x2_Sigmoid", transposed_conv_2d(C_in, C_out, kernel_size=2, stride=2, padding=0, activation=nn.Sigmoid())),
+        ("TransConv_2x2_RelU", lambda: transposed_conv_2d(C_in, C_out, kernel_size=2, stride=2, padding=0)),
+        ("TransConv_2x2_SiLU", lambda: transposed_conv_2d(C_in, C_out, kernel_size=2, stride=2, padding=0, activation=nn.SiLU())),
+        ("TransConv_2x2_Sigmoid", lambda: transposed_conv_2d(C_in, C_out, kernel_size=2, stride=2, padding=0, activation=nn.Sigmoid())),
 
-        ("TransConv_4x4_Relu", transposed_conv_2d(C_in, C_out)),
-        ("TransConv_4x4_SiLU", transposed_conv_2d(C_in, C_out, activation=nn.SiLU())),
-        ("TransConv_4x4_Sigmoid", transposed_conv_2d(C_in, C_out, activation=nn.Sigmoid())),
+        ("TransConv_4x4_Relu", lambda: transposed_conv_2d(C_in, C_out)),
+        ("TransConv_4x4_SiLU", lambda: transposed_conv_2d(C_in, C_out, activation=nn.SiLU())),
+        ("TransConv_4x4_Sigmoid", lambda: transposed_conv_2d(C_in, C_out, activation=nn.Sigmoid())),
         
     ])
     return upsample_dict
@@ -78,81 +79,81 @@ def upsamples(C_in, C_out):
 def convs(C_in, C_out):
     # all padding should follow this formula:
     # pd = (ks - 1) * dl // 2
-    conv_dict = OrderedDict([
+    conv_dict = LazyOps([
         
-        # ("Identity", nn.Identity()),
-
-        # ("conv2d_1x1_Relu", conv_2d(C_in, C_out, kernel_size=1, padding=0)),
-        # ("conv2d_1x1_SiLU", conv_2d(C_in, C_out, kernel_size=1, padding=0, activation=nn.SiLU())),
-        ("conv2d_1x1_Sigmoid", conv_2d(C_in, C_out, kernel_size=1, padding=0, activation=nn.Sigmoid())),
-        ("conv2d_1x1_Mish", conv_2d(C_in, C_out, kernel_size=1, padding=0, activation=nn.Mish())),
-
-        ("conv2d_3x3_Relu", conv_2d(C_in, C_out, kernel_size=3, padding=1)),
-        # ("conv2d_3x3_SiLU", conv_2d(C_in, C_out, kernel_size=3, padding=1, activation=nn.SiLU())),
-        # ("conv2d_3x3_Sigmoid", conv_2d(C_in, C_out, kernel_size=3, padding=1, activation=nn.Sigmoid())),
-        ("conv2d_3x3_Mish", conv_2d(C_in, C_out, kernel_size=3, padding=1, activation=nn.Mish())),
-        # ("conv2d_3x3_Relu_1dil", conv_2d(C_in, C_out, kernel_size=3, padding=2, dilation=2)),
-        # ("conv2d_3x3_SiLU_1dil", conv_2d(C_in, C_out, kernel_size=3, padding=2, dilation=2, activation=nn.SiLU())),
-        # ("conv2d_3x3_Sigmoid_1dil", conv_2d(C_in, C_out, kernel_size=3, padding=2, dilation=2, activation=nn.Sigmoid())),
-
-        # ("conv2d_5x5_Relu", conv_2d(C_in, C_out, kernel_size=5, padding=2)),
-        ("conv2d_5x5_SiLU", conv_2d(C_in, C_out, kernel_size=5, padding=2, activation=nn.SiLU())),
-        # ("conv2d_5x5_Sigmoid", conv_2d(C_in, C_out, kernel_size=5, padding=2, activation=nn.Sigmoid())),
-        # ("conv2d_5x5_Mish", conv_2d(C_in, C_out, kernel_size=5, padding=2, activation=nn.Mish())),
-        # ("conv2d_5x5_Relu_1dil", conv_2d(C_in, C_out, kernel_size=5, padding=4, dilation=2, activation=nn.SiLU())),
-        # ("conv2d_5x5_SiLU_1dil", conv_2d(C_in, C_out, kernel_size=5, padding=4, dilation=2, activation=nn.SiLU())),
-        # ("conv2d_5x5_Sigmoid_1dil", conv_2d(C_in, C_out, kernel_size=5, padding=4, dilation=2, activation=nn.Sigmoid())),
-        # ("conv2d_5x5_Mish_1dil", conv_2d(C_in, C_out, kernel_size=5, padding=4, dilation=2, activation=nn.Mish())),
-
-        # ("conv2d_7x7_Relu", conv_2d(C_in, C_out, kernel_size=7, padding=3)),
-        # ("conv2d_7x7_SiLU", conv_2d(C_in, C_out, kernel_size=7, padding=3, activation=nn.SiLU())),
-        # ("conv2d_7x7_Sigmoid", conv_2d(C_in, C_out, kernel_size=7, padding=3, activation=nn.Sigmoid())),
-        ("conv2d_7x7_Mish", conv_2d(C_in, C_out, kernel_size=7, padding=3, activation=nn.Mish())),
-        # ("conv2d_7x7_Relu_1dil", conv_2d(C_in, C_out, kernel_size=7, padding=6, dilation=2, activation=nn.SiLU())),
-        # ("conv2d_7x7_SiLU_1dil", conv_2d(C_in, C_out, kernel_size=7, padding=6, dilation=2, activation=nn.SiLU())),
-        # ("conv2d_7x7_Sigmoid_1dil", conv_2d(C_in, C_out, kernel_size=7, padding=6, dilation=2, activation=nn.Sigmoid())),
-
-        # ("conv2d_9x9_Relu", conv_2d(C_in, C_out, kernel_size=9, padding=4)),
-        # ("conv2d_9x9_SiLU", conv_2d(C_in, C_out, kernel_size=9, padding=4, activation=nn.SiLU())),
-        # ("conv2d_9x9_Sigmoid", conv_2d(C_in, C_out, kernel_size=9, padding=4, activation=nn.Sigmoid())),
-        # ("conv2d_9x9_Mish", conv_2d(C_in, C_out, kernel_size=9, padding=4, activation=nn.Mish())),
-        # ("conv2d_9x9_Relu_1dil", conv_2d(C_in, C_out, kernel_size=9, padding=8, dilation=2, activation=nn.SiLU())),
-        # ("conv2d_9x9_SiLU_1dil", conv_2d(C_in, C_out, kernel_size=9, padding=8, dilation=2, activation=nn.SiLU())),
-        # ("conv2d_9x9_Sigmoid_1dil", conv_2d(C_in, C_out, kernel_size=9, padding=8, dilation=2, activation=nn.Sigmoid())),
-
-        # ("convDS_1x1_Relu", depthwise_separable_conv(C_in, C_out)),
-        ("convDS_1x1_SiLU", depthwise_separable_conv(C_in, C_out, activation=nn.SiLU())),
-        # ("convDS_1x1_Sigmoid", depthwise_separable_conv(C_in, C_out, activation=nn.Sigmoid())),
-        # ("convDS_1x1_Mish", depthwise_separable_conv(C_in, C_out, activation=nn.Mish())),
-
-        # ("convDS_3x3_Relu", depthwise_separable_conv(C_in, C_out, kernel_size=3, padding=1)),
-        # ("convDS_3x3_SiLU", depthwise_separable_conv(C_in, C_out, kernel_size=3, padding=1, activation=nn.SiLU())),
-        # ("convDS_3x3_Sigmoid", depthwise_separable_conv(C_in, C_out, kernel_size=3, padding=1, activation=nn.Sigmoid())),
-        # ("convDS_3x3_Relu_1dil", depthwise_separable_conv(C_in, C_out, kernel_size=3, padding=2, dilation=2)),
-        # ("convDS_3x3_SiLU_1dil", depthwise_separable_conv(C_in, C_out, kernel_size=3, padding=2, dilation=2, activation=nn.SiLU())),
-        # ("convDS_3x3_Sigmoid_1dil", depthwise_separable_conv(C_in, C_out, kernel_size=3, padding=2, dilation=2, activation=nn.Sigmoid())),
-
-        # ("convDS_5x5_Relu", depthwise_separable_conv(C_in, C_out, kernel_size=5, padding=2)),
-        # ("convDS_5x5_SiLU", depthwise_separable_conv(C_in, C_out, kernel_size=5, padding=2, activation=nn.SiLU())),
-        # ("convDS_5x5_Sigmoid", depthwise_separable_conv(C_in, C_out, kernel_size=5, padding=2, activation=nn.Sigmoid())),
-        ("convDS_5x5_Mish", depthwise_separable_conv(C_in, C_out, kernel_size=5, padding=2, activation=nn.Mish())),
-        # ("convDS_5x5_Relu_1dil", depthwise_separable_conv(C_in, C_out, kernel_size=5, padding=4, dilation=2, activation=nn.SiLU())),
-        # ("convDS_5x5_SiLU_1dil", depthwise_separable_conv(C_in, C_out, kernel_size=5, padding=4, dilation=2, activation=nn.SiLU())),
-        # ("convDS_5x5_Sigmoid_1dil", depthwise_separable_conv(C_in, C_out, kernel_size=5, padding=4, dilation=2, activation=nn.Sigmoid())),
-
-        # ("convDS_7x7_Relu", depthwise_separable_conv(C_in, C_out, kernel_size=7, padding=3)),
-        # ("convDS_7x7_SiLU", depthwise_separable_conv(C_in, C_out, kernel_size=7, padding=3, activation=nn.SiLU())),
-        # ("convDS_7x7_Sigmoid", depthwise_separable_conv(C_in, C_out, kernel_size=7, padding=3, activation=nn.Sigmoid())),
-        # ("convDS_7x7_Relu_1dil", depthwise_separable_conv(C_in, C_out, kernel_size=7, padding=6, dilation=2, activation=nn.SiLU())),
-        # ("convDS_7x7_SiLU_1dil", depthwise_separable_conv(C_in, C_out, kernel_size=7, padding=6, dilation=2, activation=nn.SiLU())),
-        # ("convDS_7x7_Sigmoid_1dil", depthwise_separable_conv(C_in, C_out, kernel_size=7, padding=6, dilation=2, activation=nn.Sigmoid())),
-
-        # ("convDS_9x9_Relu", depthwise_separable_conv(C_in, C_out, kernel_size=9, padding=4)),
-        # ("convDS_9x9_SiLU", depthwise_separable_conv(C_in, C_out, kernel_size=9, padding=4, activation=nn.SiLU())),
-        # ("convDS_9x9_Sigmoid", depthwise_separable_conv(C_in, C_out, kernel_size=9, padding=4, activation=nn.Sigmoid())),
-        # ("convDS_9x9_Relu_1dil", depthwise_separable_conv(C_in, C_out, kernel_size=9, padding=8, dilation=2, activation=nn.SiLU())),
-        # ("convDS_9x9_SiLU_1dil", depthwise_separable_conv(C_in, C_out, kernel_size=9, padding=8, dilation=2, activation=nn.SiLU())),
-        # ("convDS_9x9_Sigmoid_1dil", depthwise_separable_conv(C_in, C_out, kernel_size=9, padding=8, dilation=2, activation=nn.Sigmoid())),
+        # ("Identity", lambda: nn.Identity()),
+
+        # ("conv2d_1x1_Relu", lambda: conv_2d(C_in, C_out, kernel_size=1, padding=0)),
+        # ("conv2d_1x1_SiLU", lambda: conv_2d(C_in, C_out, kernel_size=1, padding=0, activation=nn.SiLU())),
+        ("conv2d_1x1_Sigmoid", lambda: conv_2d(C_in, C_out, kernel_size=1, padding=0, activation=nn.Sigmoid())),
+        ("conv2d_1x1_Mish", lambda: conv_2d(C_in, C_out, kernel_size=1, padding=0, activation=nn.Mish())),
+
+        ("conv2d_3x3_Relu", lambda: conv_2d(C_in, C_out, kernel_size=3, padding=1)),
+        # ("conv2d_3x3_SiLU", lambda: conv_2d(C_in, C_out, kernel_size=3, padding=1, activation=nn.SiLU())),
+        # ("conv2d_3x3_Sigmoid", lambda: conv_2d(C_in, C_out, kernel_size=3, padding=1, activation=nn.Sigmoid())),
+        ("conv2d_3x3_Mish", lambda: conv_2d(C_in, C_out, kernel_size=3, padding=1, activation=nn.Mish())),
+        # ("conv2d_3x3_Relu_1dil", lambda: conv_2d(C_in, C_out, kernel_size=3, padding=2, dilation=2)),
+        # ("conv2d_3x3_SiLU_1dil", lambda: conv_2d(C_in, C_out, kernel_size=3, padding=2, dilation=2, activation=nn.SiLU())),
+        # ("conv2d_3x3_Sigmoid_1dil", lambda: conv_2d(C_in, C_out, kernel_size=3, padding=2, dilation=2, activation=nn.Sigmoid())),
+
+        # ("conv2d_5x5_Relu", lambda: conv_2d(C_in, C_out, kernel_size=5, padding=2)),
+        ("conv2d_5x5_SiLU", lambda: conv_2d(C_in, C_out, kernel_size=5, padding=2, activation=nn.SiLU())),
+        # ("conv2d_5x5_Sigmoid", lambda: conv_2d(C_in, C_out, kernel_size=5, padding=2, activation=nn.Sigmoid())),
+        # ("conv2d_5x5_Mish", lambda: conv_2d(C_in, C_out, kernel_size=5, padding=2, activation=nn.Mish())),
+        # ("conv2d_5x5_Relu_1dil", lambda: conv_2d(C_in, C_out, kernel_size=5, padding=4, dilation=2, activation=nn.SiLU())),
+        # ("conv2d_5x5_SiLU_1dil", lambda: conv_2d(C_in, C_out, kernel_size=5, padding=4, dilation=2, activation=nn.SiLU())),
+        # ("conv2d_5x5_Sigmoid_1dil", lambda: conv_2d(C_in, C_out, kernel_size=5, padding=4, dilation=2, activation=nn.Sigmoid())),
+        # ("conv2d_5x5_Mish_1dil", lambda: conv_2d(C_in, C_out, kernel_size=5, padding=4, dilation=2, activation=nn.Mish())),
+
+        # ("conv2d_7x7_Relu", lambda: conv_2d(C_in, C_out, kernel_size=7, padding=3)),
+        # ("conv2d_7x7_SiLU", lambda: conv_2d(C_in, C_out, kernel_size=7, padding=3, activation=nn.SiLU())),
+        # ("conv2d_7x7_Sigmoid", lambda: conv_2d(C_in, C_out, kernel_size=7, padding=3, activation=nn.Sigmoid())),
+        ("conv2d_7x7_Mish", lambda: conv_2d(C_in, C_out, kernel_size=7, padding=3, activation=nn.Mish())),
+        # ("conv2d_7x7_Relu_1dil", lambda: conv_2d(C_in, C_out, kernel_size=7, padding=6, dilation=2, activation=nn.SiLU())),
+        # ("conv2d_7x7_SiLU_1dil", lambda: conv_2d(C_in, C_out, kernel_size=7, padding=6, dilation=2, activation=nn.SiLU())),
+        # ("conv2d_7x7_Sigmoid_1dil", lambda: conv_2d(C_in, C_out, kernel_size=7, padding=6, dilation=2, activation=nn.Sigmoid())),
+
+        # ("conv2d_9x9_Relu", lambda: conv_2d(C_in, C_out, kernel_size=9, padding=4)),
+        # ("conv2d_9x9_SiLU", lambda: conv_2d(C_in, C_out, kernel_size=9, padding=4, activation=nn.SiLU())),
+        # ("conv2d_9x9_Sigmoid", lambda: conv_2d(C_in, C_out, kernel_size=9, padding=4, activation=nn.Sigmoid())),
+        # ("conv2d_9x9_Mish", lambda: conv_2d(C_in, C_out, kernel_size=9, padding=4, activation=nn.Mish())),
+        # ("conv2d_9x9_Relu_1dil", lambda: conv_2d(C_in, C_out, kernel_size=9, padding=8, dilation=2, activation=nn.SiLU())),
+        # ("conv2d_9x9_SiLU_1dil", lambda: conv_2d(C_in, C_out, kernel_size=9, padding=8, dilation=2, activation=nn.SiLU())),
+        # ("conv2d_9x9_Sigmoid_1dil", lambda: conv_2d(C_in, C_out, kernel_size=9, padding=8, dilation=2, activation=nn.Sigmoid())),
+
+        # ("convDS_1x1_Relu", lambda: depthwise_separable_conv(C_in, C_out)),
+        ("convDS_1x1_SiLU", lambda: depthwise_separable_conv(C_in, C_out, activation=nn.SiLU())),
+        # ("convDS_1x1_Sigmoid", lambda: depthwise_separable_conv(C_in, C_out, activation=nn.Sigmoid())),
+        # ("convDS_1x1_Mish", lambda: depthwise_separable_conv(C_in, C_out, activation=nn.Mish())),
+
+        # ("convDS_3x3_Relu", lambda: depthwise_separable_conv(C_in, C_out, kernel_size=3, padding=1)),
+        # ("convDS_3x3_SiLU", lambda: depthwise_separable_conv(C_in, C_out, kernel_size=3, padding=1, activation=nn.SiLU())),
+        # ("convDS_3x3_Sigmoid", lambda: depthwise_separable_conv(C_in, C_out, kernel_size=3, padding=1, activation=nn.Sigmoid())),
+        # ("convDS_3x3_Relu_1dil", lambda: depthwise_separable_conv(C_in, C_out, kernel_size=3, padding=2, dilation=2)),
+        # ("convDS_3x3_SiLU_1dil", lambda: depthwise_separable_conv(C_in, C_out, kernel_size=3, padding=2, dilation=2, activation=nn.SiLU())),
+        # ("convDS_3x3_Sigmoid_1dil", lambda: depthwise_separable_conv(C_in, C_out, kernel_size=3, padding=2, dilation=2, activation=nn.Sigmoid())),
+
+        # ("convDS_5x5_Relu", lambda: depthwise_separable_conv(C_in, C_out, kernel_size=5, padding=2)),
+        # ("convDS_5x5_SiLU", lambda: depthwise_separable_conv(C_in, C_out, kernel_size=5, padding=2, activation=nn.SiLU())),
+        # ("convDS_5x5_Sigmoid", lambda: depthwise_separable_conv(C_in, C_out, kernel_size=5, padding=2, activation=nn.Sigmoid())),
+        ("convDS_5x5_Mish", lambda: depthwise_separable_conv(C_in, C_out, kernel_size=5, padding=2, activation=nn.Mish())),
+        # ("convDS_5x5_Relu_1dil", lambda: depthwise_separable_conv(C_in, C_out, kernel_size=5, padding=4, dilation=2, activation=nn.SiLU())),
+        # ("convDS_5x5_SiLU_1dil", lambda: depthwise_separable_conv(C_in, C_out, kernel_size=5, padding=4, dilation=2, activation=nn.SiLU())),
+        # ("convDS_5x5_Sigmoid_1dil", lambda: depthwise_separable_conv(C_in, C_out, kernel_size=5, padding=4, dilation=2, activation=nn.Sigmoid())),
+
+        # ("convDS_7x7_Relu", lambda: depthwise_separable_conv(C_in, C_out, kernel_size=7, padding=3)),
+        # ("convDS_7x7_SiLU", lambda: depthwise_separable_conv(C_in, C_out, kernel_size=7, padding=3, activation=nn.SiLU())),
+        # ("convDS_7x7_Sigmoid", lambda: depthwise_separable_conv(C_in, C_out, kernel_size=7, padding=3, activation=nn.Sigmoid())),
+        # ("convDS_7x7_Relu_1dil", lambda: depthwise_separable_conv(C_in, C_out, kernel_size=7, padding=6, dilation=2, activation=nn.SiLU())),
+        # ("convDS_7x7_SiLU_1dil", lambda: depthwise_separable_conv(C_in, C_out, kernel_size=7, padding=6, dilation=2, activation=nn.SiLU())),
+        # ("convDS_7x7_Sigmoid_1dil", lambda: depthwise_separable_conv(C_in, C_out, kernel_size=7, padding=6, dilation=2, activation=nn.Sigmoid())),
+
+        # ("convDS_9x9_Relu", lambda: depthwise_separable_conv(C_in, C_out, kernel_size=9, padding=4)),
+        # ("convDS_9x9_SiLU", lambda: depthwise_separable_conv(C_in, C_out, kernel_size=9, padding=4, activation=nn.SiLU())),
+        # ("convDS_9x9_Sigmoid", lambda: depthwise_separable_conv(C_in, C_out, kernel_size=9, padding=4, activation=nn.Sigmoid())),
+        # ("convDS_9x9_Relu_1dil", lambda: depthwise_separable_conv(C_in, C_out, kernel_size=9, padding=8, dilation=2, activation=nn.SiLU())),
+        # ("convDS_9x9_SiLU_1dil", lambda: depthwise_separable_conv(C_in, C_out, kernel_size=9, padding=8, dilation=2, activation=nn.SiLU())),
+        # ("convDS_9x9_Sigmoid_1dil", lambda: depthwise_separable_conv(C_in, C_out, kernel_size=9, padding=8, dilation=2, activation=nn.Sigmoid())),
     ])
     return conv_dict
 
@@ -281,7 +282,7 @@ class UNetSpace(nn.Module):
 
         self.preencoders.append(nn.Conv2d(C_in, mid_in, kernel_size=3, padding=1))
         self.encoders.append(Cell(
-                op_candidates=convs(mid_in,mid_in),
+                op_candidates=convs(mid_in,mid_in).build_for(f"encoder 1"),
                 num_nodes=1,
                 num_ops_per_node=ops_per_node,
                 num_predecessors=1,
@@ -289,7 +290,7 @@ class UNetSpace(nn.Module):
             ))
         self.enAttentions.append(attention(mid_in,16))
         self.pools.append(Cell(
-                op_candidates=pools(),
+                op_candidates=pools().build_for(f"pool 1"),
                 num_nodes=1, 
                 num_ops_per_node=poolOps_per_node,
                 num_predecessors=1, 
@@ -298,7 +299,7 @@ class UNetSpace(nn.Module):
 
         for i in range(self.depth-1):
             self.pools.append(Cell(
-                op_candidates=pools(),
+                op_candidates=pools().build_for(f"pool {i+2}"),
                 num_nodes=1,
                 num_ops_per_node=poolOps_per_node,
                 num_predecessors=1,
@@ -312,7 +313,7 @@ class UNetSpace(nn.Module):
                 encoder_in_channels, encoder_out_channels = mid_in, mid_in
                 
             self.encoders.append(Cell(
-                op_candidates=convs(encoder_in_channels, encoder_out_channels),
+                op_candidates=convs(encoder_in_channels, encoder_out_channels).build_for(f"encoder {i+2}"),
                 num_nodes=nodes,
                 num_ops_per_node=ops_per_node,
                 num_predecessors=1,
@@ -329,7 +330,7 @@ class UNetSpace(nn.Module):
         else:
             encoder_in_channels, encoder_out_channels = mid_in, mid_in
         self.bottleneck = Cell(
-                op_candidates=convs(encoder_in_channels,encoder_out_channels),
+                op_candidates=convs(encoder_in_channels,encoder_out_channels).build_for(f"bottleneck"),
                 num_nodes=nodes,
                 num_ops_per_node=ops_per_node,
                 num_predecessors=1,
@@ -344,7 +345,7 @@ class UNetSpace(nn.Module):
         self.decAttentions = nn.ModuleList()
         for i in range(self.depth):
             self.upsamples.append(Cell(
-                op_candidates=upsamples(mid_in,mid_in),
+                op_candidates=upsamples(mid_in,mid_in).build_for(f"upsample {self.depth-i-1}"),
                 num_nodes=1, 
                 num_ops_per_node=upsampleOps_per_node,
                 num_predecessors=1, 
@@ -352,7 +353,7 @@ class UNetSpace(nn.Module):
             ))
             self.predecoders.append(nn.Conv2d(mid_in*3, mid_in, kernel_size=3, padding=1))
             self.decoders.append(Cell(
-                op_candidates=convs(mid_in,mid_in),
+                op_candidates=convs(mid_in,mid_in).build_for(f"decoder {self.depth-i-1}"),
                 num_nodes=nodes, 
                 num_ops_per_node=ops_per_node,
                 num_predecessors=1, 
@@ -1,8 +1,36 @@
 
+"""
+Validity of UNet architectures built from the components.py candidates
+
+Instead of building every network of the Cartesian product and running a forward pass,
+shapes are propagated through the op specs: each candidate is built once with tiny channel
+counts and run on a zero image to learn how it maps (H, W) and whether it keeps C_in or
+outputs C_out (memoized per input size). Walking the layers in forward order shows where an
+architecture breaks, e.g. AdaMaxPool2d(1) collapsing the spatial dims or an upsample not
+matching its skip connection, and the DFS stops at the first invalid prefix instead of
+enumerating all of its completions.
+
+is_valid stores its verdicts in a JSON cache keyed by (op names, depth, resolution), in
+~/.cache/nas-for-dip by default, so multi-trial strategies can reject invalid architectures
+before launching a trial.
+"""
+
+import os
+import re
+import json
+import fcntl
+import tempfile
+import functools
+import itertools
+
 import torch
 import nni.retiarii.nn.pytorch as nn
-from components import convs, pools, upsamples
-import itertools
+
+try:
+    from .components import convs, pools, upsamples
+except ImportError:
+    # run as a script from this folder
+    from components import convs, pools, upsamples
 
 class CheckValidSearchSpace():
     def __init__(self, exported_arch, C_in=1, C_out=1, depth=1, init_features=64):
@@ -123,40 +151,236 @@ class CheckValidSearchSpace():
 
 
 
-def generate_list():
-    # List of functions to get candidates for each layer
-    funcs = [
-        lambda: convs(1,64), 
-        pools, 
-        lambda: convs(64,128), 
-        lambda: upsamples(128,64), 
-        lambda: convs(128,64)
-    ]
+# the candidate registries per layer type, pools don't depend on the channels
+FAMILIES = {
+    'convs': convs,
+    'pools': lambda C_in, C_out: pools(),
+    'upsamples': upsamples,
+}
 
-    # Generate the Cartesian product of all candidates for each layer
-    all_combinations = list(itertools.product(*[func() for func in funcs]))
+# channels of the probe ops, distinct so the output tells C_in and C_out apart
+PROBE_IN, PROBE_OUT = 2, 3
 
-    # Define the filename for clarity and potential future changes
-    filename = "failed_architectures.txt"
+# per user, the package may be installed read-only or shared between users
+CACHE_PATH = os.path.join(os.path.expanduser('~'), '.cache', 'nas-for-dip', 'architecture_verdicts.json')
 
-    # Clear the content of the file before starting the loop (if the file exists)
-    with open(filename, "w") as file:
-        pass
+_probes = {}
+
+def probe_op(family, name):
+    if (family, name) not in _probes:
+        _probes[(family, name)] = FAMILIES[family](PROBE_IN, PROBE_OUT)[name]
+    return _probes[(family, name)]
+
+@functools.lru_cache(maxsize=None)
+def op_output(family, name, height, width):
+    """
+    ((keeps_channels, height, width), None) of a candidate on a (1, C, height, width) input,
+    (None, error) if the op fails on it
+    """
+    try:
+        with torch.no_grad():
+            out = probe_op(family, name)(torch.zeros(1, PROBE_IN, height, width))
+    except Exception as e:
+        return None, str(e)
+    if out.dim() != 4 or out.shape[1] not in (PROBE_IN, PROBE_OUT):
+        return None, f"unexpected output shape {tuple(out.shape)}"
+    return (out.shape[1] == PROBE_IN, out.shape[2], out.shape[3]), None
+
+def architecture_layers(depth=1, C_in=1, init_features=64):
+    """
+    (label, family, C_in, C_out) of every choice in forward order, same layout as CheckValidSearchSpace
+    """
+    features = init_features
+    layers = [('encoder 1', 'convs', C_in, features), ('pool 1', 'pools', features, features)]
+    for i in range(depth-1):
+        layers += [(f'encoder {i+2}', 'convs', features, features * 2), (f'pool {i+2}', 'pools', features * 2, features * 2)]
+        features *= 2
+    layers.append(('bottleneck', 'convs', features, features * 2))
+    for i in range(depth):
+        layers += [(f'upsample {i+1}', 'upsamples', features * 2, features), (f'decoder {i+1}', 'convs', features * 2, features)]
+        features //= 2
+    return layers
+
+def step(layer, state, name):
+    """
+    Apply the candidate `name` at `layer` to state = (channels, height, width, skips)
+    Returns (new_state, None) or (None, error)
+    """
+    label, family, C_in, C_out = layer
+    channels, height, width, skips = state
+
+    if channels != C_in:
+        return None, f"expects {C_in} channels, gets {channels}"
+    out, error = op_output(family, name, height, width)
+    if error is not None:
+        return None, error
+    keeps_channels, height, width = out
+    channels = C_in if keeps_channels else C_out
+
+    if label.startswith('encoder'):
+        skips = skips + ((channels, height, width),)
+    elif label.startswith('upsample'):
+        # torch.cat((x, skip), dim=1), checked here so the failure prunes every decoder choice
+        (skip_channels, skip_height, skip_width), skips = skips[-1], skips[:-1]
+        if (skip_height, skip_width) != (height, width):
+            return None, f"upsampled {height}x{width} doesn't match the {skip_height}x{skip_width} skip connection"
+        channels += skip_channels
+        # the decoder takes as many channels as the upsample
+        if channels != C_in:
+            return None, f"concatenation gives {channels} channels, the decoder expects {C_in}"
+    return (channels, height, width, skips), None
+
+def search(depth=1, resolution=64, C_in=1, init_features=64):
+    """
+    DFS over the choices in forward order, yields (names, error)
+        error None: names is a valid architecture
+        otherwise: names is the failing prefix, every completion of it fails the same way
+    """
+    layers = architecture_layers(depth, C_in, init_features)
+
+    def dfs(k, state, prefix):
+        if k == len(layers):
+            _, height, width, _ = state
+            if (height, width) != (resolution, resolution):
+                yield prefix, f"Output is {height}x{width} instead of {resolution}x{resolution}"
+            else:
+                yield prefix, None
+            return
+        label, family, layer_in, layer_out = layers[k]
+        for name in FAMILIES[family](layer_in, layer_out).keys():
+            new_state, error = step(layers[k], state, name)
+            if error is not None:
+                yield prefix + (name,), f"Failed at {label} due to {name}: {error}"
+            else:
+                yield from dfs(k + 1, new_state, prefix + (name,))
 
-    for combination in all_combinations:
-        exported_arch = {
-            "encoder 1": combination[0],
-            "pool 1": combination[1],
-            "bottleneck": combination[2],
-            "upsample 1": combination[3],
-            "decoder 1": combination[4]
-        }
+    yield from dfs(0, (C_in, resolution, resolution, ()), ())
 
-        checker = CheckValidSearchSpace(exported_arch)
+def count_architectures(depth=1, resolution=64, C_in=1, init_features=64):
+    """
+    (valid, total) number of architectures, memoized on (layer, shape state) so it stays
+    cheap for deep spaces where listing them is out of the question
+    """
+    layers = architecture_layers(depth, C_in, init_features)
+    sizes = [len(FAMILIES[family](layer_in, layer_out)) for _, family, layer_in, layer_out in layers]
 
+    @functools.lru_cache(maxsize=None)
+    def valid(k, state):
+        if k == len(layers):
+            return int(state[1:3] == (resolution, resolution))
+        label, family, layer_in, layer_out = layers[k]
+        total = 0
+        for name in FAMILIES[family](layer_in, layer_out).keys():
+            new_state, error = step(layers[k], state, name)
+            if error is None:
+                total += valid(k + 1, new_state)
+        return total
+
+    n_valid = valid(0, (C_in, resolution, resolution, ()))
+    n_total = 1
+    for size in sizes:
+        n_total *= size
+    return n_valid, n_total
+
+def normalize_arch(exported_arch):
+    """
+    Labels of CheckValidSearchSpace, UNetSpaceMT ones (enc1, pool1, upconv1, dec1) are renamed
+    """
+    rename = {'enc': 'encoder', 'pool': 'pool', 'upconv': 'upsample', 'dec': 'decoder'}
+    arch = {}
+    for label, name in exported_arch.items():
+        match = re.fullmatch(r'(enc|pool|upconv|dec)(\d+)', label)
+        arch[f'{rename[match.group(1)]} {match.group(2)}' if match else label] = name
+    return arch
+
+_caches = {}
+
+def load_cache(path=CACHE_PATH):
+    if path not in _caches:
+        _caches[path] = {}
+        if os.path.exists(path):
+            with open(path) as f:
+                _caches[path] = json.load(f)
+    return _caches[path]
+
+def save_cache(path=CACHE_PATH):
+    """
+    Merge the verdicts into the file, under a lock so concurrent trials don't drop each other's
+    """
+    folder = os.path.dirname(os.path.abspath(path))
+    os.makedirs(folder, exist_ok=True)
+    with open(path + '.lock', 'w') as lock:
+        fcntl.flock(lock, fcntl.LOCK_EX)
+        cache = load_cache(path)
+        if os.path.exists(path):
+            with open(path) as f:
+                cache.update({k: v for k, v in json.load(f).items() if k not in cache})
+        fd, tmp = tempfile.mkstemp(dir=folder, suffix='.tmp')
         try:
-            checker.test()
-        except RuntimeError as e:
-            # Append the failure reason (e.g., "Failed at encoder 1") to the file
-            with open(filename, "a") as file:
-                file.write(str(e) + "\n")
+            with os.fdopen(fd, 'w') as f:
+                json.dump(cache, f, indent=1)
+            os.replace(tmp, path)
+        except BaseException:
+            os.remove(tmp)
+            raise
+
+def cache_key(names, depth, resolution):
+    return f"{depth}|{resolution}|{','.join(names)}"
+
+def is_valid(exported_arch, depth=1, resolution=64, C_in=1, init_features=64, cache_path=CACHE_PATH):
+    """
+    (valid, reason) of one architecture without building it, cached on disk
+
+    Args:
+        exported_arch: label -> op name, labels of CheckValidSearchSpace or UNetSpaceMT
+        cache_path: JSON verdict cache, None to skip it
+    """
+    arch = normalize_arch(exported_arch)
+    layers = architecture_layers(depth, C_in, init_features)
+    missing = [label for label, *_ in layers if label not in arch]
+    if missing:
+        raise ValueError(f"exported_arch has no choice for {missing}")
+    names = [arch[label] for label, *_ in layers]
+
+    key = cache_key(names, depth, resolution)
+    if cache_path is not None and key in load_cache(cache_path):
+        verdict = load_cache(cache_path)[key]
+        return verdict['valid'], verdict['reason']
+
+    state, reason = (C_in, resolution, resolution, ()), None
+    for layer, name in zip(layers, names):
+        if name not in FAMILIES[layer[1]](layer[2], layer[3]):
+            raise ValueError(f"{name} is not a candidate for {layer[0]}")
+        state, error = step(layer, state, name)
+        if error is not None:
+            reason = f"Failed at {layer[0]} due to {name}: {error}"
+            break
+    if reason is None and state[1:3] != (resolution, resolution):
+        reason = f"Output is {state[1]}x{state[2]} instead of {resolution}x{resolution}"
+
+    if cache_path is not None:
+        load_cache(cache_path)[key] = {'valid': reason is None, 'reason': reason}
+        save_cache(cache_path)
+    return reason is None, reason
+
+def generate_list(depth=1, resolution=64, C_in=1, init_features=64, filename="failed_architectures.txt"):
+    """
+    Valid architectures of the space as exported_arch dicts, the failing prefixes (with the
+    number of architectures each one rules out) are written to `filename`
+    """
+    layers = architecture_layers(depth, C_in, init_features)
+    sizes = [len(FAMILIES[family](layer_in, layer_out)) for _, family, layer_in, layer_out in layers]
+    labels = [label for label, *_ in layers]
+
+    valid = []
+    with open(filename, "w") as file:
+        for names, error in search(depth, resolution, C_in, init_features):
+            if error is None:
+                valid.append(dict(zip(labels, names)))
+                continue
+            ruled_out = 1
+            for size in sizes[len(names):]:
+                ruled_out *= size
+            choices = ", ".join(f"{label}={name}" for label, name in zip(labels, names))
+            file.write(f"{error} [{choices}] ({ruled_out} architectures)\n")
+    return valid
@@ -1,9 +1,17 @@
-from collections import OrderedDict
+import os
+import sys
 import nni.retiarii.nn.pytorch as nn
 from nni import trace
 import torch
 import torch.nn.functional as F
 
+try:
+    from ..lazy_ops import LazyOps
+except ImportError:
+    # imported as a plain module from this folder (checkvalid.py)
+    sys.path.insert(1, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', '..'))
+    from search_space.lazy_ops import LazyOps
+
 @trace
 def conv_2d(C_in, C_out, kernel_size=3, dilation=1, padding=1, activation=None):
     return nn.Sequential(
@@ -55,42 +63,42 @@ def seForward(x, fcs):
 
 
 def pools():
-    pool_dict = OrderedDict([
-        ("MaxPool2d", nn.MaxPool2d(kernel_size=2, stride=2, padding=0)),
-        ("AvgPool2d", nn.AvgPool2d(kernel_size=2, stride=2, padding=0)),
-        # ("MaxPool2d_3x3", nn.MaxPool2d(kernel_size=3, stride=2, padding=1)),
-        ("AvgPool2d_3x3", nn.AvgPool2d(kernel_size=3, stride=2, padding=1)),
-        ("MaxPool2d_5x5", nn.MaxPool2d(kernel_size=5, stride=2, padding=2)),
-        # ("AvgPool2d_5x5", nn.AvgPool2d(kernel_size=5, stride=2, padding=2)),
-        # ("MaxPool2d_7x7", nn.MaxPool2d(kernel_size=7, stride=2, padding=3)),
-        # ("AvgPool2d_7x7", nn.AvgPool2d(kernel_size=7, stride=2, padding=3)),
-        # ("MaxPool2d_9x9", nn.MaxPool2d(kernel_size=9, stride=2, padding=4)),
-        # ("AvgPool2d_9x9", nn.AvgPool2d(kernel_size=9, stride=2, padding=4)),
-
-        # ("DepthToSpace", nn.PixelShuffle(2)),
-        # ("AdaMaxPool2d", nn.AdaptiveMaxPool2d(1)),
-        # ("AdaAvgPool2d", nn.AdaptiveAvgPool2d(1)),
+    pool_dict = LazyOps([
+        ("MaxPool2d", lambda: nn.MaxPool2d(kernel_size=2, stride=2, padding=0)),
+        ("AvgPool2d", lambda: nn.AvgPool2d(kernel_size=2, stride=2, padding=0)),
+        # ("MaxPool2d_3x3", lambda: nn.MaxPool2d(kernel_size=3, stride=2, padding=1)),
+        ("AvgPool2d_3x3", lambda: nn.AvgPool2d(kernel_size=3, stride=2, padding=1)),
+        ("MaxPool2d_5x5", lambda: nn.MaxPool2d(kernel_size=5, stride=2, padding=2)),
+        # ("AvgPool2d_5x5", lambda: nn.AvgPool2d(kernel_size=5, stride=2, padding=2)),
+        # ("MaxPool2d_7x7", lambda: nn.MaxPool2d(kernel_size=7, stride=2, padding=3)),
+        # ("AvgPool2d_7x7", lambda: nn.AvgPool2d(kernel_size=7, stride=2, padding=3)),
+        # ("MaxPool2d_9x9", lambda: nn.MaxPool2d(kernel_size=9, stride=2, padding=4)),
+        # ("AvgPool2d_9x9", lambda: nn.AvgPool2d(kernel_size=9, stride=2, padding=4)),
+
+        # ("DepthToSpace", lambda: nn.PixelShuffle(2)),
+        # ("AdaMaxPool2d", lambda: nn.AdaptiveMaxPool2d(1)),
+        # ("AdaAvgPool2d", lambda: nn.AdaptiveAvgPool2d(1)),
     ])
     return pool_dict
 
 def upsamples(C_in, C_out):
-    upsample_dict = OrderedDict([
-        ("Upsample_nearest", nn.Sequential(
+    upsample_dict = LazyOps([
+        ("Upsample_nearest", lambda: nn.Sequential(
             nn.Upsample(scale_factor=2, mode='nearest'),
             nn.Conv2d(C_in, C_out, kernel_size=1)
         )),
-        ("Upsample_bilinear", nn.Sequential(
+        ("Upsample_bilinear", lambda: nn.Sequential(
             nn.Upsample(scale_factor=2, mode='bilinear'),
             nn.Conv2d(C_in, C_out, kernel_size=1)
         )),
         
-        ("TransConv_2x2_RelU", transposed_conv_2d(C_in, C_out, kernel_size=2, stride=2, padding=0)),
-        ("TransConv_2x2_SiLU", transposed_conv_2d(C_in, C_out, kernel_size=2, stride=2, padding=0, activation=nn.SiLU())),
-        # ("TransConv_2x2_Sigmoid", transposed_conv_2d(C_in, C_out, kernel_size=2, stride=2, padding=0, activation=nn.Sigmoid())),
+        ("TransConv_2x2_RelU", lambda: transposed_conv_2d(C_in, C_out, kernel_size=2, stride=2, padding=0)),
+        ("TransConv_2x2_SiLU", lambda: transposed_conv_2d(C_in, C_out, kernel_size=2, stride=2, padding=0, activation=nn.SiLU())),
+        # ("TransConv_2x2_Sigmoid", lambda: transposed_conv_2d(C_in, C_out, kernel_size=2, stride=2, padding=0, activation=nn.Sigmoid())),
 
-        # ("TransConv_4x4_Relu", transposed_conv_2d(C_in, C_out)),
-        # ("TransConv_4x4_SiLU", transposed_conv_2d(C_in, C_out, activation=nn.SiLU())),
-        # ("TransConv_4x4_Sigmoid", transposed_conv_2d(C_in, C_out, activation=nn.Sigmoid())),
+        # ("TransConv_4x4_Relu", lambda: transposed_conv_2d(C_in, C_out)),
+        # ("TransConv_4x4_SiLU", lambda: transposed_conv_2d(C_in, C_out, activation=nn.SiLU())),
+        # ("TransConv_4x4_Sigmoid", lambda: transposed_conv_2d(C_in, C_out, activation=nn.Sigmoid())),
         
     ])
     return upsample_dict
@@ -98,81 +106,81 @@ def upsamples(C_in, C_out):
 def convs(C_in, C_out):
     # all padding should follow this formula:
     # padding = (kernel_size - 1) * dilation // 2
-    conv_dict = OrderedDict([
+    conv_dict = LazyOps([
         
-        # ("Identity", nn.Identity()),
-
-        ("conv2d_1x1_Relu", conv_2d(C_in, C_out, kernel_size=1, padding=0)),
-        ("conv2d_1x1_SiLU", conv_2d(C_in, C_out, kernel_size=1, padding=0, activation=nn.SiLU())),
-        # ("conv2d_1x1_Sigmoid", conv_2d(C_in, C_out, kernel_size=1, padding=0, activation=nn.Sigmoid())),
-        ("conv2d_1x1_Mish", conv_2d(C_in, C_out, kernel_size=1, padding=0, activation=nn.Mish())),
-
-        ("conv2d_3x3_Relu", conv_2d(C_in, C_out, kernel_size=3, padding=1)),
-        ("conv2d_3x3_SiLU", conv_2d(C_in, C_out, kernel_size=3, padding=1, activation=nn.SiLU())),
-        # ("conv2d_3x3_Sigmoid", conv_2d(C_in, C_out, kernel_size=3, padding=1, activation=nn.Sigmoid())),
-        ("conv2d_3x3_Mish", conv_2d(C_in, C_out, kernel_size=3, padding=1, activation=nn.Mish())),
-        # ("conv2d_3x3_Relu_1dil", conv_2d(C_in, C_out, kernel_size=3, padding=2, dilation=2)),
-        ("conv2d_3x3_SiLU_1dil", conv_2d(C_in, C_out, kernel_size=3, padding=2, dilation=2, activation=nn.SiLU())),
-        # ("conv2d_3x3_Sigmoid_1dil", conv_2d(C_in, C_out, kernel_size=3, padding=2, dilation=2, activation=nn.Sigmoid())),
-
-        # ("conv2d_5x5_Relu", conv_2d(C_in, C_out, kernel_size=5, padding=2)),
-        # ("conv2d_5x5_SiLU", conv_2d(C_in, C_out, kernel_size=5, padding=2, activation=nn.SiLU())),
-        # ("conv2d_5x5_Sigmoid", conv_2d(C_in, C_out, kernel_size=5, padding=2, activation=nn.Sigmoid())),
-        # ("conv2d_5x5_Mish", conv_2d(C_in, C_out, kernel_size=5, padding=2, activation=nn.Mish())),
-        # ("conv2d_5x5_Relu_1dil", conv_2d(C_in, C_out, kernel_size=5, padding=4, dilation=2, activation=nn.SiLU())),
-        # ("conv2d_5x5_SiLU_1dil", conv_2d(C_in, C_out, kernel_size=5, padding=4, dilation=2, activation=nn.SiLU())),
-        # ("conv2d_5x5_Sigmoid_1dil", conv_2d(C_in, C_out, kernel_size=5, padding=4, dilation=2, activation=nn.Sigmoid())),
-        # ("conv2d_5x5_Mish_1dil", conv_2d(C_in, C_out, kernel_size=5, padding=4, dilation=2, activation=nn.Mish())),
-
-        # ("conv2d_7x7_Relu", conv_2d(C_in, C_out, kernel_size=7, padding=3)),
-        ("conv2d_7x7_SiLU", conv_2d(C_in, C_out, kernel_size=7, padding=3, activation=nn.SiLU())),
-        # ("conv2d_7x7_Sigmoid", conv_2d(C_in, C_out, kernel_size=7, padding=3, activation=nn.Sigmoid())),
-        # ("conv2d_7x7_Mish", conv_2d(C_in, C_out, kernel_size=7, padding=3, activation=nn.Mish())),
-        # ("conv2d_7x7_Relu_1dil", conv_2d(C_in, C_out, kernel_size=7, padding=6, dilation=2, activation=nn.SiLU())),
-        # ("conv2d_7x7_SiLU_1dil", conv_2d(C_in, C_out, kernel_size=7, padding=6, dilation=2, activation=nn.SiLU())),
-        # ("conv2d_7x7_Sigmoid_1dil", conv_2d(C_in, C_out, kernel_size=7, padding=6, dilation=2, activation=nn.Sigmoid())),
-
-        ("conv2d_9x9_Relu", conv_2d(C_in, C_out, kernel_size=9, padding=4)),
-        # ("conv2d_9x9_SiLU", conv_2d(C_in, C_out, kernel_size=9, padding=4, activation=nn.SiLU())),
-        # ("conv2d_9x9_Sigmoid", conv_2d(C_in, C_out, kernel_size=9, padding=4, activation=nn.Sigmoid())),
-        # ("conv2d_9x9_Mish", conv_2d(C_in, C_out, kernel_size=9, padding=4, activation=nn.Mish())),
-        # ("conv2d_9x9_Relu_1dil", conv_2d(C_in, C_out, kernel_size=9, padding=8, dilation=2, activation=nn.SiLU())),
-        # ("conv2d_9x9_SiLU_1dil", conv_2d(C_in, C_out, kernel_size=9, padding=8, dilation=2, activation=nn.SiLU())),
-        # ("conv2d_9x9_Sigmoid_1dil", conv_2d(C_in, C_out, kernel_size=9, padding=8, dilation=2, activation=nn.Sigmoid())),
-
-        # ("convDS_1x1_Relu", depthwise_separable_conv(C_in, C_out)),
-        # ("convDS_1x1_SiLU", depthwise_separable_conv(C_in, C_out, activation=nn.SiLU())),
-        # ("convDS_1x1_Sigmoid", depthwise_separable_conv(C_in, C_out, activation=nn.Sigmoid())),
-        # ("convDS_1x1_Mish", depthwise_separable_conv(C_in, C_out, activation=nn.Mish())),
-
-        # ("convDS_3x3_Relu", depthwise_separable_conv(C_in, C_out, kernel_size=3, padding=1)),
-        # ("convDS_3x3_SiLU", depthwise_separable_conv(C_in, C_out, kernel_size=3, padding=1, activation=nn.SiLU())),
-        # ("convDS_3x3_Sigmoid", depthwise_separable_conv(C_in, C_out, kernel_size=3, padding=1, activation=nn.Sigmoid())),
-        # ("convDS_3x3_Relu_1dil", depthwise_separable_conv(C_in, C_out, kernel_size=3, padding=2, dilation=2)),
-        ("convDS_3x3_SiLU_1dil", depthwise_separable_conv(C_in, C_out, kernel_size=3, padding=2, dilation=2, activation=nn.SiLU())),
-        # ("convDS_3x3_Sigmoid_1dil", depthwise_separable_conv(C_in, C_out, kernel_size=3, padding=2, dilation=2, activation=nn.Sigmoid())),
-
-        ("convDS_5x5_Relu", depthwise_separable_conv(C_in, C_out, kernel_size=5, padding=2)),
-        # ("convDS_5x5_SiLU", depthwise_separable_conv(C_in, C_out, kernel_size=5, padding=2, activation=nn.SiLU())),
-        # ("convDS_5x5_Sigmoid", depthwise_separable_conv(C_in, C_out, kernel_size=5, padding=2, activation=nn.Sigmoid())),
-        # ("convDS_5x5_Mish", depthwise_separable_conv(C_in, C_out, kernel_size=5, padding=2, activation=nn.Mish())),
-        # ("convDS_5x5_Relu_1dil", depthwise_separable_conv(C_in, C_out, kernel_size=5, padding=4, dilation=2, activation=nn.SiLU())),
-        # ("convDS_5x5_SiLU_1dil", depthwise_separable_conv(C_in, C_out, kernel_size=5, padding=4, dilation=2, activation=nn.SiLU())),
-        # ("convDS_5x5_Sigmoid_1dil", depthwise_separable_conv(C_in, C_out, kernel_size=5, padding=4, dilation=2, activation=nn.Sigmoid())),
-
-        # ("convDS_7x7_Relu", depthwise_separable_conv(C_in, C_out, kernel_size=7, padding=3)),
-        # ("convDS_7x7_SiLU", depthwise_separable_conv(C_in, C_out, kernel_size=7, padding=3, activation=nn.SiLU())),
-        # ("convDS_7x7_Sigmoid", depthwise_separable_conv(C_in, C_out, kernel_size=7, padding=3, activation=nn.Sigmoid())),
-        # ("convDS_7x7_Relu_1dil", depthwise_separable_conv(C_in, C_out, kernel_size=7, padding=6, dilation=2, activation=nn.SiLU())),
-        # ("convDS_7x7_SiLU_1dil", depthwise_separable_conv(C_in, C_out, kernel_size=7, padding=6, dilation=2, activation=nn.SiLU())),
-        # ("convDS_7x7_Sigmoid_1dil", depthwise_separable_conv(C_in, C_out, kernel_size=7, padding=6, dilation=2, activation=nn.Sigmoid())),
-
-        # ("convDS_9x9_Relu", depthwise_separable_conv(C_in, C_out, kernel_size=9, padding=4)),
-        # ("convDS_9x9_SiLU", depthwise_separable_conv(C_in, C_out, kernel_size=9, padding=4, activation=nn.SiLU())),
-        # ("convDS_9x9_Sigmoid", depthwise_separable_conv(C_in, C_out, kernel_size=9, padding=4, activation=nn.Sigmoid())),
-        # ("convDS_9x9_Relu_1dil", depthwise_separable_conv(C_in, C_out, kernel_size=9, padding=8, dilation=2, activation=nn.SiLU())),
-        # ("convDS_9x9_SiLU_1dil", depthwise_separable_conv(C_in, C_out, kernel_size=9, padding=8, dilation=2, activation=nn.SiLU())),
-        # ("convDS_9x9_Sigmoid_1dil", depthwise_separable_conv(C_in, C_out, kernel_size=9, padding=8, dilation=2, activation=nn.Sigmoid())),
+        # ("Identity", lambda: nn.Identity()),
+
+        ("conv2d_1x1_Relu", lambda: conv_2d(C_in, C_out, kernel_size=1, padding=0)),
+        ("conv2d_1x1_SiLU", lambda: conv_2d(C_in, C_out, kernel_size=1, padding=0, activation=nn.SiLU())),
+        # ("conv2d_1x1_Sigmoid", lambda: conv_2d(C_in, C_out, kernel_size=1, padding=0, activation=nn.Sigmoid())),
+        ("conv2d_1x1_Mish", lambda: conv_2d(C_in, C_out, kernel_size=1, padding=0, activation=nn.Mish())),
+
+        ("conv2d_3x3_Relu", lambda: conv_2d(C_in, C_out, kernel_size=3, padding=1)),
+        ("conv2d_3x3_SiLU", lambda: conv_2d(C_in, C_out, kernel_size=3, padding=1, activation=nn.SiLU())),
+        # ("conv2d_3x3_Sigmoid", lambda: conv_2d(C_in, C_out, kernel_size=3, padding=1, activation=nn.Sigmoid())),
+        ("conv2d_3x3_Mish", lambda: conv_2d(C_in, C_out, kernel_size=3, padding=1, activation=nn.Mish())),
+        # ("conv2d_3x3_Relu_1dil", lambda: conv_2d(C_in, C_out, kernel_size=3, padding=2, dilation=2)),
+        ("conv2d_3x3_SiLU_1dil", lambda: conv_2d(C_in, C_out, kernel_size=3, padding=2, dilation=2, activation=nn.SiLU())),
+        # ("conv2d_3x3_Sigmoid_1dil", lambda: conv_2d(C_in, C_out, kernel_size=3, padding=2, dilation=2, activation=nn.Sigmoid())),
+
+        # ("conv2d_5x5_Relu", lambda: conv_2d(C_in, C_out, kernel_size=5, padding=2)),
+        # ("conv2d_5x5_SiLU", lambda: conv_2d(C_in, C_out, kernel_size=5, padding=2, activation=nn.SiLU())),
+        # ("conv2d_5x5_Sigmoid", lambda: conv_2d(C_in, C_out, kernel_size=5, padding=2, activation=nn.Sigmoid())),
+        # ("conv2d_5x5_Mish", lambda: conv_2d(C_in, C_out, kernel_size=5, padding=2, activation=nn.Mish())),
+        # ("conv2d_5x5_Relu_1dil", lambda: conv_2d(C_in, C_out, kernel_size=5, padding=4, dilation=2, activation=nn.SiLU())),
+        # ("conv2d_5x5_SiLU_1dil", lambda: conv_2d(C_in, C_out, kernel_size=5, padding=4, dilation=2, activation=nn.SiLU())),
+        # ("conv2d_5x5_Sigmoid_1dil", lambda: conv_2d(C_in, C_out, kernel_size=5, padding=4, dilation=2, activation=nn.Sigmoid())),
+        # ("conv2d_5x5_Mish_1dil", lambda: conv_2d(C_in, C_out, kernel_size=5, padding=4, dilation=2, activation=nn.Mish())),
+
+        # ("conv2d_7x7_Relu", lambda: conv_2d(C_in, C_out, kernel_size=7, padding=3)),
+        ("conv2d_7x7_SiLU", lambda: conv_2d(C_in, C_out, kernel_size=7, padding=3, activation=nn.SiLU())),
+        # ("conv2d_7x7_Sigmoid", lambda: conv_2d(C_in, C_out, kernel_size=7, padding=3, activation=nn.Sigmoid())),
+        # ("conv2d_7x7_Mish", lambda: conv_2d(C_in, C_out, kernel_size=7, padding=3, activation=nn.Mish())),
+        # ("conv2d_7x7_Relu_1dil", lambda: conv_2d(C_in, C_out, kernel_size=7, padding=6, dilation=2, activation=nn.SiLU())),
+        # ("conv2d_7x7_SiLU_1dil", lambda: conv_2d(C_in, C_out, kernel_size=7, padding=6, dilation=2, activation=nn.SiLU())),
+        # ("conv2d_7x7_Sigmoid_1dil", lambda: conv_2d(C_in, C_out, kernel_size=7, padding=6, dilation=2, activation=nn.Sigmoid())),
+
+        ("conv2d_9x9_Relu", lambda: conv_2d(C_in, C_out, kernel_size=9, padding=4)),
+        # ("conv2d_9x9_SiLU", lambda: conv_2d(C_in, C_out, kernel_size=9, padding=4, activation=nn.SiLU())),
+        # ("conv2d_9x9_Sigmoid", lambda: conv_2d(C_in, C_out, kernel_size=9, padding=4, activation=nn.Sigmoid())),
+        # ("conv2d_9x9_Mish", lambda: conv_2d(C_in, C_out, kernel_size=9, padding=4, activation=nn.Mish())),
+        # ("conv2d_9x9_Relu_1dil", lambda: conv_2d(C_in, C_out, kernel_size=9, padding=8, dilation=2, activation=nn.SiLU())),
+        # ("conv2d_9x9_SiLU_1dil", lambda: conv_2d(C_in, C_out, kernel_size=9, padding=8, dilation=2, activation=nn.SiLU())),
+        # ("conv2d_9x9_Sigmoid_1dil", lambda: conv_2d(C_in, C_out, kernel_size=9, padding=8, dilation=2, activation=nn.Sigmoid())),
+
+        # ("convDS_1x1_Relu", lambda: depthwise_separable_conv(C_in, C_out)),
+        # ("convDS_1x1_SiLU", lambda: depthwise_separable_conv(C_in, C_out, activation=nn.SiLU())),
+        # ("convDS_1x1_Sigmoid", lambda: depthwise_separable_conv(C_in, C_out, activation=nn.Sigmoid())),
+        # ("convDS_1x1_Mish", lambda: depthwise_separable_conv(C_in, C_out, activation=nn.Mish())),
+
+        # ("convDS_3x3_Relu", lambda: depthwise_separable_conv(C_in, C_out, kernel_size=3, padding=1)),
+        # ("convDS_3x3_SiLU", lambda: depthwise_separable_conv(C_in, C_out, kernel_size=3, padding=1, activation=nn.SiLU())),
+        # ("convDS_3x3_Sigmoid", lambda: depthwise_separable_conv(C_in, C_out, kernel_size=3, padding=1, activation=nn.Sigmoid())),
+        # ("convDS_3x3_Relu_1dil", lambda: depthwise_separable_conv(C_in, C_out, kernel_size=3, padding=2, dilation=2)),
+        ("convDS_3x3_SiLU_1dil", lambda: depthwise_separable_conv(C_in, C_out, kernel_size=3, padding=2, dilation=2, activation=nn.SiLU())),
+        # ("convDS_3x3_Sigmoid_1dil", lambda: depthwise_separable_conv(C_in, C_out, kernel_size=3, padding=2, dilation=2, activation=nn.Sigmoid())),
+
+        ("convDS_5x5_Relu", lambda: depthwise_separable_conv(C_in, C_out, kernel_size=5, padding=2)),
+        # ("convDS_5x5_SiLU", lambda: depthwise_separable_conv(C_in, C_out, kernel_size=5, padding=2, activation=nn.SiLU())),
+        # ("convDS_5x5_Sigmoid", lambda: depthwise_separable_conv(C_in, C_out, kernel_size=5, padding=2, activation=nn.Sigmoid())),
+        # ("convDS_5x5_Mish", lambda: depthwise_separable_conv(C_in, C_out, kernel_size=5, padding=2, activation=nn.Mish())),
+        # ("convDS_5x5_Relu_1dil", lambda: depthwise_separable_conv(C_in, C_out, kernel_size=5, padding=4, dilation=2, activation=nn.SiLU())),
+        # ("convDS_5x5_SiLU_1dil", lambda: depthwise_separable_conv(C_in, C_out, kernel_size=5, padding=4, dilation=2, activation=nn.SiLU())),
+        # ("convDS_5x5_Sigmoid_1dil", lambda: depthwise_separable_conv(C_in, C_out, kernel_size=5, padding=4, dilation=2, activation=nn.Sigmoid())),
+
+        # ("convDS_7x7_Relu", lambda: depthwise_separable_conv(C_in, C_out, kernel_size=7, padding=3)),
+        # ("convDS_7x7_SiLU", lambda: depthwise_separable_conv(C_in, C_out, kernel_size=7, padding=3, activation=nn.SiLU())),
+        # ("convDS_7x7_Sigmoid", lambda: depthwise_separable_conv(C_in, C_out, kernel_size=7, padding=3, activation=nn.Sigmoid())),
+        # ("convDS_7x7_Relu_1dil", lambda: depthwise_separable_conv(C_in, C_out, kernel_size=7, padding=6, dilation=2, activation=nn.SiLU())),
+        # ("convDS_7x7_SiLU_1dil", lambda: depthwise_separable_conv(C_in, C_out, kernel_size=7, padding=6, dilation=2, activation=nn.SiLU())),
+        # ("convDS_7x7_Sigmoid_1dil", lambda: depthwise_separable_conv(C_in, C_out, kernel_size=7, padding=6, dilation=2, activation=nn.Sigmoid())),
+
+        # ("convDS_9x9_Relu", lambda: depthwise_separable_conv(C_in, C_out, kernel_size=9, padding=4)),
+        # ("convDS_9x9_SiLU", lambda: depthwise_separable_conv(C_in, C_out, kernel_size=9, padding=4, activation=nn.SiLU())),
+        # ("convDS_9x9_Sigmoid", lambda: depthwise_separable_conv(C_in, C_out, kernel_size=9, padding=4, activation=nn.Sigmoid())),
+        # ("convDS_9x9_Relu_1dil", lambda: depthwise_separable_conv(C_in, C_out, kernel_size=9, padding=8, dilation=2, activation=nn.SiLU())),
+        # ("convDS_9x9_SiLU_1dil", lambda: depthwise_separable_conv(C_in, C_out, kernel_size=9, padding=8, dilation=2, activation=nn.SiLU())),
+        # ("convDS_9x9_Sigmoid_1dil", lambda: depthwise_separable_conv(C_in, C_out, kernel_size=9, padding=8, dilation=2, activation=nn.Sigmoid())),
     ])
     return conv_dict
 
@@ -182,17 +190,17 @@ def convs(C_in, C_out):
         ### 
         ### 
 
-        # ("conv2d_1x1_Relu", conv_2d(C_in, C_out, kernel_size=1, padding=0)),
-        # ("conv2d_1x1_SiLU", conv_2d(C_in, C_out, kernel_size=1, padding=0, activation=nn.SiLU())),
-        # ("conv2d_1x1_Mish", conv_2d(C_in, C_out, kernel_size=1, padding=0, activation=nn.Mish())),
+        # ("conv2d_1x1_Relu", lambda: conv_2d(C_in, C_out, kernel_size=1, padding=0)),
+        # ("conv2d_1x1_SiLU", lambda: conv_2d(C_in, C_out, kernel_size=1, padding=0, activation=nn.SiLU())),
+        # ("conv2d_1x1_Mish", lambda: conv_2d(C_in, C_out, kernel_size=1, padding=0, activation=nn.Mish())),
 
-        # ("conv2d_3x3_Relu", conv_2d(C_in, C_out, kernel_size=3, padding=1)),
-        # ("conv2d_3x3_SiLU", conv_2d(C_in, C_out, kernel_size=3, padding=1, activation=nn.SiLU())),
-        # ("conv2d_3x3_Mish", conv_2d(C_in, C_out, kernel_size=3, padding=1, activation=nn.Mish())),
+        # ("conv2d_3x3_Relu", lambda: conv_2d(C_in, C_out, kernel_size=3, padding=1)),
+        # ("conv2d_3x3_SiLU", lambda: conv_2d(C_in, C_out, kernel_size=3, padding=1, activation=nn.SiLU())),
+        # ("conv2d_3x3_Mish", lambda: conv_2d(C_in, C_out, kernel_size=3, padding=1, activation=nn.Mish())),
         
-        # ("conv2d_3x3_SiLU_1dil", conv_2d(C_in, C_out, kernel_size=3, padding=2, dilation=2, activation=nn.SiLU())),
-        # ("convDS_3x3_SiLU_1dil", depthwise_separable_conv(C_in, C_out, kernel_size=3, padding=2, dilation=2, activation=nn.SiLU())),
+        # ("conv2d_3x3_SiLU_1dil", lambda: conv_2d(C_in, C_out, kernel_size=3, padding=2, dilation=2, activation=nn.SiLU())),
+        # ("convDS_3x3_SiLU_1dil", lambda: depthwise_separable_conv(C_in, C_out, kernel_size=3, padding=2, dilation=2, activation=nn.SiLU())),
         
-        # ("convDS_5x5_Relu", depthwise_separable_conv(C_in, C_out, kernel_size=5, padding=2)),
-        # ("conv2d_7x7_SiLU", conv_2d(C_in, C_out, kernel_size=7, padding=3, activation=nn.SiLU())),
-        # ("conv2d_9x9_Relu", conv_2d(C_in, C_out, kernel_size=9, padding=4)),
\ No newline at end of file
+        # ("convDS_5x5_Relu", lambda: depthwise_separable_conv(C_in, C_out, kernel_size=5, padding=2)),
+        # ("conv2d_7x7_SiLU", lambda: conv_2d(C_in, C_out, kernel_size=7, padding=3, activation=nn.SiLU())),
+        # ("conv2d_9x9_Relu", lambda: conv_2d(C_in, C_out, kernel_size=9, padding=4)),
\ No newline at end of file
@@ -20,17 +20,17 @@ class UNetSpaceMT(torch.nn.Module):
         self.encoders = nn.ModuleList()
 
         # first encoder layer
-        self.encoders.append(LayerChoice(convs(in_channels, features),label='enc1'))
-        self.pools.append(LayerChoice(pools(),label='pool1'))
+        self.encoders.append(LayerChoice(convs(in_channels, features).build_for('enc1'),label='enc1'))
+        self.pools.append(LayerChoice(pools().build_for('pool1'),label='pool1'))
 
         # remaining encoder layers
         for i in range(depth-1):
-            self.encoders.append(LayerChoice(convs(features, features * 2),label=f"enc{i+2}"))
-            self.pools.append(LayerChoice(pools(),label=f"pool{i+2}"))
+            self.encoders.append(LayerChoice(convs(features, features * 2).build_for(f"enc{i+2}"),label=f"enc{i+2}"))
+            self.pools.append(LayerChoice(pools().build_for(f"pool{i+2}"),label=f"pool{i+2}"))
             features *= 2
 
         # bottleneck layer (bottom of unet)
-        self.bottleneck = LayerChoice(convs(features, features * 2),label="bottleneck")
+        self.bottleneck = LayerChoice(convs(features, features * 2).build_for("bottleneck"),label="bottleneck")
 
         # decoder layers initialize
         self.upconvs = nn.ModuleList()
@@ -38,8 +38,8 @@ class UNetSpaceMT(torch.nn.Module):
 
         # all decoder layers
         for i in range(depth):
-            self.upconvs.append(LayerChoice(upsamples(features * 2, features),label=f"upconv{i+1}"))
-            self.decoders.append(LayerChoice(convs(features * 2, features),label=f"dec{i+1}"))
+            self.upconvs.append(LayerChoice(upsamples(features * 2, features).build_for(f"upconv{i+1}"),label=f"upconv{i+1}"))
+            self.decoders.append(LayerChoice(convs(features * 2, features).build_for(f"dec{i+1}"),label=f"dec{i+1}"))
             features //= 2        
 
         # final conv layer
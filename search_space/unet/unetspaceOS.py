@@ -38,7 +38,7 @@ class UNetSpace(nn.Module):
         ### initialize Encoders
         self.enConvList.append(
             Cell(
-                op_candidates=convs(1,filters),
+                op_candidates=convs(1,filters).build_for(f"encoder 1"),
                 num_nodes=1,
                 num_ops_per_node=1,
                 num_predecessors=1,
@@ -46,7 +46,7 @@ class UNetSpace(nn.Module):
                 ))
         self.poolList.append(
             Cell(
-                op_candidates=pools(),
+                op_candidates=pools().build_for(f"pool 1"),
                 num_nodes=1,
                 num_ops_per_node=1,
                 num_predecessors=1,
@@ -58,7 +58,7 @@ class UNetSpace(nn.Module):
         for i in range(depth-1):
             self.poolList.append(
                 Cell(
-                    op_candidates=pools(),
+                    op_candidates=pools().build_for(f"pool {i+2}"),
                     num_nodes=1,
                     num_ops_per_node=1,
                     num_predecessors=1,
@@ -66,7 +66,7 @@ class UNetSpace(nn.Module):
                 ))
             self.enConvList.append(
                 Cell(
-                    op_candidates=convs(filters,filters*2//ennodes),
+                    op_candidates=convs(filters,filters*2//ennodes).build_for(f"encoder {i+2}"),
                     num_nodes=ennodes,
                     num_ops_per_node=1,
                     num_predecessors=1,
@@ -78,7 +78,7 @@ class UNetSpace(nn.Module):
 
         ### initialize Bottleneck
         self.bottleneck = Cell(
-                        op_candidates=convs(filters,filters*2//ennodes),
+                        op_candidates=convs(filters,filters*2//ennodes).build_for(f"bottleneck"),
                         num_nodes=ennodes,
                         num_ops_per_node=1,
                         num_predecessors=1,
@@ -91,7 +91,7 @@ class UNetSpace(nn.Module):
             self.upList.append(nn.ConvTranspose2d(filters * 2, filters, kernel_size=2, stride=2))
             self.decConvList.append(
                 Cell(
-                    op_candidates=convs(filters*2,filters//denodes),
+                    op_candidates=convs(filters*2,filters//denodes).build_for(f"decoder {i+1}"),
                     num_nodes=denodes,
                     num_ops_per_node=1,
                     num_predecessors=1,
@@ -0,0 +1,57 @@
+"""
+R-hat and effective sample size of utils/convergence.py on chains with known answers
+"""
+
+import numpy as np
+import pytest
+
+from search_eval.utils.convergence import rhat, split_rhat, ess, autocovariance
+
+def ar1(chains, n, phi, seed=0):
+    rng = np.random.default_rng(seed)
+    noise = rng.standard_normal((chains, n))
+    x = np.empty((chains, n))
+    x[:, 0] = noise[:, 0] / np.sqrt(1 - phi ** 2)
+    for t in range(1, n):
+        x[:, t] = phi * x[:, t - 1] + noise[:, t]
+    return x
+
+def test_rhat_of_iid_chains_is_one():
+    traces = np.random.default_rng(0).standard_normal((4, 2000))
+    assert abs(rhat(traces) - 1) < 0.01
+    assert abs(split_rhat(traces) - 1) < 0.01
+
+def test_rhat_flags_chains_that_disagree():
+    traces = np.random.default_rng(0).standard_normal((4, 500)) + np.arange(4)[:, None]
+    assert rhat(traces) > 1.5
+
+def test_split_rhat_flags_a_drift_within_the_chains():
+    traces = np.random.default_rng(0).standard_normal((4, 1000)) + np.linspace(0, 3, 1000)
+    assert rhat(traces) < 1.01
+    assert split_rhat(traces) > 1.1
+
+def test_rhat_of_constant_traces():
+    assert rhat(np.ones((3, 10))) == 1.
+    with pytest.raises(ValueError):
+        split_rhat(np.ones((3, 3)))
+
+def test_autocovariance_matches_the_direct_sum():
+    x = np.random.default_rng(0).standard_normal(200)
+    centered = x - x.mean()
+    direct = [np.dot(centered[:len(x) - k], centered[k:]) / len(x) for k in range(len(x))]
+    np.testing.assert_allclose(autocovariance(x), direct, atol=1e-10)
+
+def test_ess_of_iid_chains_is_the_sample_count():
+    traces = np.random.default_rng(0).standard_normal((4, 2000))
+    assert 0.85 < ess(traces) / traces.size < 1.15
+
+@pytest.mark.parametrize('phi', [0.5, 0.9])
+def test_ess_of_ar1_chains(phi):
+    traces = ar1(4, 20000, phi)
+    expected = traces.size * (1 - phi) / (1 + phi)
+    assert 0.8 < ess(traces) / expected < 1.2
+
+def test_ess_of_constant_traces():
+    assert ess(np.ones((2, 8))) == 16.
+    with pytest.raises(ValueError):
+        ess(np.ones((2, 3)))
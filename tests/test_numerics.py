@@ -0,0 +1,151 @@
+"""
+The rewritten numerics against the code they replaced: the ring-buffer ES-WMV against the
+list implementation of the evaluators, the foreach SGLD step against the per-parameter loop
+and the streaming Welford moments against torch.mean / torch.var
+"""
+
+import numpy as np
+import pytest
+import torch
+
+from search_eval.optimizer.early_stopper import ES
+from search_eval.optimizer.SGLD import SGLD
+from search_eval.utils.posterior import Welford
+
+
+class ListES:
+    """
+    ES-WMV as the evaluators had it before optimizer/early_stopper.py
+    """
+    def __init__(self, buffer_size, patience):
+        self.buffer_size = buffer_size
+        self.patience = patience
+        self.img_collection = []
+        self.variance_history = []
+        self.best_score = float('inf')
+        self.wait_count = 0
+        self.burnin_over = False
+
+    def update_burnin(self, out_np, i):
+        # in float64 like the running sums, so near ties can't flip the comparison
+        self.img_collection.append(out_np.reshape(-1).astype(np.float64))
+        if len(self.img_collection) > self.buffer_size:
+            self.img_collection.pop(0)
+        if len(self.img_collection) >= self.buffer_size:
+            ave_img = np.mean(self.img_collection, axis=0)
+            cur_var = np.mean([((ave_img - tmp) ** 2).sum() / ave_img.size for tmp in self.img_collection])
+            self.variance_history.append(cur_var)
+            if cur_var < self.best_score:
+                self.best_score = cur_var
+                self.wait_count = 0
+                self.burnin_over = False
+            else:
+                self.wait_count += 1
+                self.burnin_over = self.wait_count >= self.patience
+        return self.burnin_over
+
+def frames(n, seed, shape=(1, 16, 16)):
+    # a random walk that settles down then drifts again, so the variance has a minimum
+    rng = np.random.default_rng(seed)
+    scale = np.abs(np.linspace(1., -1.5, n)) + 0.05
+    steps = rng.standard_normal((n, *shape)) * scale[:, None, None, None]
+    return np.float32(0.5 + 0.01 * np.cumsum(steps, axis=0))
+
+@pytest.mark.parametrize('seed', range(5))
+@pytest.mark.parametrize('buffer_size, patience', [(10, 5), (20, 1), (7, 0), (15, 30)])
+def test_ring_buffer_es_matches_list_es(seed, buffer_size, patience):
+    reference = ListES(buffer_size, patience)
+    es = ES(buffer_size=buffer_size, patience=patience)
+    stop_reference = stop = None
+    for i, frame in enumerate(frames(400, seed)):
+        if stop_reference is None and reference.update_burnin(frame, i):
+            stop_reference = i
+        if stop is None and es.update_stop(torch.from_numpy(frame), i):
+            stop = i
+        if stop is not None and stop_reference is not None:
+            break
+    es.flush()
+
+    assert stop == stop_reference
+    n = len(es.variance_history)
+    np.testing.assert_allclose(es.variance_history, reference.variance_history[:n], rtol=1e-6, atol=1e-15)
+
+def test_es_checkpoint_resumes_the_same_stop():
+    data = frames(400, 0)
+    reference = ES(buffer_size=10, patience=20)
+    stop_reference = next(i for i, frame in enumerate(data) if reference.update_stop(torch.from_numpy(frame), i))
+
+    es = ES(buffer_size=10, patience=20)
+    for i in range(60):
+        es.update_stop(torch.from_numpy(data[i]), i)
+    resumed = ES(buffer_size=10, patience=20)
+    resumed.load_checkpoint_state(es.checkpoint_state())
+    stop = next(i for i in range(60, len(data)) if resumed.update_stop(torch.from_numpy(data[i]), i))
+    assert stop == stop_reference
+
+
+def reference_sgld_step(params, states, lr, decay, num_pseudo_batches, burn_in, diagonal_bias, noises):
+    """
+    The per-parameter SGLD step before the foreach rewrite, with the normal draws passed in
+    """
+    for parameter, state, noise in zip(params, states, noises):
+        gradient = parameter.grad
+        state['iteration'] += 1
+        momentum = state['momentum']
+        momentum.add_((1.0 - decay) * ((gradient ** 2) - momentum))
+        if state['iteration'] > burn_in:
+            sigma = 1. / torch.sqrt(torch.tensor(lr))
+        else:
+            sigma = torch.zeros_like(parameter)
+        preconditioner = 1. / torch.sqrt(momentum + diagonal_bias)
+        scaled_grad = 0.5 * preconditioner * gradient * num_pseudo_batches + noise * sigma * torch.sqrt(preconditioner)
+        parameter.data.add_(-lr * scaled_grad)
+
+@pytest.mark.parametrize('burn_in', [0, 3, 100])
+def test_foreach_sgld_matches_reference_step(burn_in):
+    torch.manual_seed(0)
+    shapes = [(8, 4, 3, 3), (8,), (1, 8, 1, 1)]
+    params = [torch.randn(shape, dtype=torch.float64, requires_grad=True) for shape in shapes]
+    reference = [p.detach().clone() for p in params]
+    states = [{'iteration': 0, 'momentum': torch.ones_like(p)} for p in reference]
+    lr, decay, num_pseudo_batches, diagonal_bias = 1e-2, 0.95, 2, 1e-8
+    optimizer = SGLD(params, lr=lr, precondition_decay_rate=decay, num_pseudo_batches=num_pseudo_batches,
+                     num_burn_in_steps=burn_in, diagonal_bias=diagonal_bias)
+
+    for step in range(6):
+        grads = [torch.randn_like(p) for p in params]
+        for p, r, g in zip(params, reference, grads):
+            p.grad = g.clone()
+            r.grad = g.clone()
+        # SGLD draws its noise parameter by parameter, in order
+        torch.manual_seed(100 + step)
+        noises = [torch.randn_like(p) for p in params]
+        torch.manual_seed(100 + step)
+        optimizer.step()
+        reference_sgld_step(reference, states, lr, decay, num_pseudo_batches, burn_in, diagonal_bias, noises)
+        for p, r in zip(params, reference):
+            torch.testing.assert_close(p.detach(), r, rtol=1e-10, atol=1e-12)
+
+
+def test_welford_matches_torch_moments():
+    torch.manual_seed(0)
+    samples = torch.randn(50, 2, 8, 8, dtype=torch.float64) * 3 + 1
+    welford = Welford()
+    for sample in samples:
+        welford.update(sample)
+    assert welford.count() == 50
+    torch.testing.assert_close(welford.mean, samples.mean(0))
+    torch.testing.assert_close(welford.variance(), samples.var(0, unbiased=True))
+
+def test_masked_welford_matches_torch_moments_per_problem():
+    torch.manual_seed(0)
+    samples = torch.randn(40, 3, 1, 6, 6, dtype=torch.float64)
+    # problem k joins at sample 10 * k, like the problems of a batched run leaving their burn-in
+    masks = torch.stack([(torch.arange(3) * 10 <= i).double().view(3, 1, 1, 1) for i in range(40)])
+    welford = Welford()
+    for sample, mask in zip(samples, masks):
+        welford.update(sample, mask)
+    for k in range(3):
+        used = samples[10 * k:, k]
+        torch.testing.assert_close(welford.mean[k], used.mean(0))
+        torch.testing.assert_close(welford.variance()[k], used.var(0, unbiased=True))